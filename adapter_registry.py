@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网卡注册表
+按显示名称缓存网卡的索引、MAC地址和状态，网卡列表和应用配置共用同一份缓存。
+各操作系统通过不同的提供者获取网卡信息，缓存在超过有效期或应用配置后失效；
+FakeProvider返回预设的网卡列表，用于在没有对应系统时验证调用方
+"""
+
+import platform
+import threading
+import time
+
+import tracing
+
+# 缓存有效期（秒）
+DEFAULT_TTL = 30.0
+
+
+class Adapter:
+    """网卡信息"""
+
+    __slots__ = ('name', 'index', 'mac', 'up', 'hidden', 'device')
+
+    def __init__(self, name, index=None, mac=None, up=None, hidden=False, device=None):
+        # 显示名称，即网卡下拉框和应用配置使用的名称
+        self.name = name
+        self.index = index
+        self.mac = mac
+        # 是否已启用，未知时为None
+        self.up = up
+        # 不在网卡下拉框中显示（如Windows未连接的网卡、Linux回环网卡）
+        self.hidden = hidden
+        # macOS网络服务对应的设备名，如en0
+        self.device = device
+
+    def __repr__(self):
+        return (f"Adapter({self.name!r}, index={self.index!r}, mac={self.mac!r}, up={self.up!r}, "
+                f"hidden={self.hidden!r})")
+
+
+class WindowsProvider:
+    """通过一次WMI枚举获取全部网卡"""
+
+    def list_adapters(self):
+        import wmi
+        from interface_state import init_com
+        init_com()
+        adapters = []
+        for nic in wmi.WMI().Win32_NetworkAdapter():
+            # 使用NetConnectionID获取显示名称，如"以太网 3"，没有时使用Name属性
+            name = getattr(nic, 'NetConnectionID', None) or nic.Name
+            adapters.append(Adapter(name, nic.Index, nic.MACAddress, bool(nic.NetEnabled),
+                                    hidden=nic.NetConnectionStatus != 2))  # 2为已连接
+        return adapters
+
+
+class LinuxProvider:
+    """通过rtnetlink获取全部网卡"""
+
+    def list_adapters(self):
+        import rtnetlink
+        with rtnetlink.RtNetlink() as netlink:
+            return [Adapter(link.name, link.index, link.mac, link.up, hidden=link.name == 'lo')
+                    for link in netlink.list_links()]
+
+
+class MacProvider:
+    """通过networksetup获取网络服务及其硬件端口"""
+
+    def list_adapters(self):
+        import command_runner
+        # 两条查询互不依赖，并发执行
+        services_result, ports_result = command_runner.run_concurrently(
+            [['networksetup', '-listallnetworkservices'], ['networksetup', '-listallhardwareports']], timeout=10.0)
+        for result in (services_result, ports_result):
+            if isinstance(result, Exception):
+                raise result
+        # 跳过第一行说明文字，停用的服务以*开头
+        services = [line.strip().lstrip('*') for line in services_result.stdout.strip().split('\n')[1:]
+                    if line.strip()]
+
+        # 硬件端口信息按空行分隔，每段包含Hardware Port、Device和Ethernet Address
+        ports = {}
+        port = {}
+        for line in ports_result.stdout.split('\n') + ['']:
+            key, sep, value = line.partition(':')
+            if sep:
+                port[key.strip()] = value.strip()
+            elif port:
+                ports[port.get('Hardware Port')] = port
+                port = {}
+        return [Adapter(service, mac=ports.get(service, {}).get('Ethernet Address'),
+                        device=ports.get(service, {}).get('Device'))
+                for service in services]
+
+
+class FakeProvider:
+    """返回预设网卡列表的提供者，calls记录被调用的次数"""
+
+    def __init__(self, adapters=()):
+        self.adapters = list(adapters)
+        self.calls = 0
+
+    def list_adapters(self):
+        self.calls += 1
+        return list(self.adapters)
+
+
+_PROVIDERS = {
+    'Windows': WindowsProvider,
+    'Linux': LinuxProvider,
+    'Darwin': MacProvider,
+}
+
+
+def default_provider(system=None):
+    """根据操作系统选择网卡信息提供者"""
+    provider = _PROVIDERS.get(system or platform.system())
+    return provider() if provider else FakeProvider()
+
+
+class AdapterRegistry:
+    """网卡注册表，按显示名称查找网卡，可在多个线程中使用"""
+
+    def __init__(self, provider=None, ttl=DEFAULT_TTL):
+        self.provider = provider or default_provider()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._adapters = []
+        self._by_name = {}
+        self._expires = 0.0
+
+    def invalidate(self):
+        """使缓存失效，下次查询时重新获取"""
+        with self._lock:
+            self._expires = 0.0
+
+    def refresh(self):
+        """立即重新获取网卡列表"""
+        with tracing.span("枚举网卡", provider=type(self.provider).__name__):
+            adapters = self.provider.list_adapters()
+        by_name = {}
+        for adapter in adapters:
+            # 与原有查找逻辑一致，同名网卡取第一个
+            by_name.setdefault(adapter.name, adapter)
+        with self._lock:
+            self._adapters = adapters
+            self._by_name = by_name
+            self._expires = time.monotonic() + self.ttl
+        return adapters
+
+    def _current(self):
+        with self._lock:
+            if time.monotonic() < self._expires:
+                return self._adapters, self._by_name
+        self.refresh()
+        with self._lock:
+            return self._adapters, self._by_name
+
+    def adapters(self):
+        """全部网卡"""
+        return list(self._current()[0])
+
+    def card_names(self):
+        """网卡下拉框中显示的网卡名称"""
+        return [adapter.name for adapter in self._current()[0] if not adapter.hidden]
+
+    def get(self, name):
+        """按显示名称查找网卡，不存在时返回None"""
+        return self._current()[1].get(name)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """获取全局共享的网卡注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AdapterRegistry()
+        return _registry
+
+
+def set_registry(registry):
+    """替换全局网卡注册表，如使用FakeProvider"""
+    global _registry
+    with _registry_lock:
+        _registry = registry
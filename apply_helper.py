@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特权助手
+以root身份长期运行，在Unix域套接字上接收界面和命令行
+发来的应用/查询请求，界面和命令行本身无需提权。请求为JSON编码的短消息，
+由单个工作线程按顺序执行；同一网卡排队中的多次应用只执行最后一次。
+请求中的网卡必须是本机存在的网卡，配置字段在执行前重新校验，不信任客户端。
+
+助手只支持Linux和macOS：Windows上的命名管道没有认证，不能限制连接的用户，
+在Windows上界面和命令行直接应用配置。
+
+    sudo python apply_helper.py --group netadmin
+    python apply_helper.py --socket /tmp/ncmtool.sock --fake    # 不修改网络，用于测试
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import re
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+# 默认监听地址，Windows上不支持助手
+SUPPORTED = platform.system() != "Windows"
+DEFAULT_ADDRESS = '/run/ncmtool.sock'
+_FAMILY = 'AF_UNIX'
+
+# 应用配置的字段
+PROFILE_FIELDS = ('ip', 'netmask', 'gateway', 'dns', 's_dns', 'mac', 'mac_name')
+
+# 12位十六进制MAC，可用统一的冒号或连字符分隔
+_MAC_PATTERN = re.compile(r'[0-9A-Fa-f]{12}|[0-9A-Fa-f]{2}([:-])[0-9A-Fa-f]{2}(?:\1[0-9A-Fa-f]{2}){4}', re.ASCII)
+# 网卡高级属性的显示名称，如"Network Address"、"网络地址"
+_MAC_NAME_PATTERN = re.compile(r'[\w .()/-]{0,64}')
+# 网卡名称中不允许出现的换行等控制字符
+_CARD_FORBIDDEN = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def helper_address():
+    """助手监听地址，可通过环境变量NCMTOOL_HELPER修改"""
+    return os.environ.get('NCMTOOL_HELPER', DEFAULT_ADDRESS)
+
+
+class SystemBackend:
+    """通过network_apply修改本机网络配置"""
+
+    def has_card(self, card):
+        """本机是否存在该网卡，缓存中没有时重新枚举一次"""
+        from adapter_registry import get_registry
+
+        registry = get_registry()
+        if registry.get(card) is None:
+            registry.refresh()
+        return registry.get(card) is not None
+
+    def apply(self, card, profile, force, progress):
+        import network_apply
+        from interface_state import FIELDS
+
+        if force:
+            changes = set(FIELDS)
+        else:
+            changes = network_apply.plan_changes(card, profile['ip'], profile['netmask'], profile['gateway'],
+                                                 profile['dns'], profile['s_dns'], profile['mac'])
+        steps = network_apply.build_steps(card, changes=changes, **profile)
+        timings = network_apply.run_steps(steps, progress)
+        return [field for field in FIELDS if field in changes] if steps else [], timings
+
+    def revert(self, card, progress):
+        """恢复到最近一次应用配置前保存的快照，返回(网卡, 各步骤耗时)"""
+        import network_apply
+        import snapshots
+
+        snapshot = snapshots.get_ring().latest(card)
+        if snapshot is None:
+            raise network_apply.ApplyError("没有可恢复的网络配置")
+        steps = snapshots.revert_steps(snapshot.card)
+        return snapshot.card, network_apply.run_steps(steps, progress)
+
+    def query(self, card):
+        from interface_state import read_interface_state
+        state = read_interface_state(card)
+        return {'addresses': state.addresses, 'gateways': state.gateways, 'dns': state.dns, 'mac': state.mac}
+
+
+class FakeBackend:
+    """在内存中记录各网卡配置的后端，不需要权限，calls记录收到的应用请求
+
+    adapters为模拟的网卡名称，为None时接受任意网卡
+    """
+
+    def __init__(self, adapters=None):
+        self.adapters = None if adapters is None else set(adapters)
+        self.cards = {}
+        self.calls = []
+        # 应用前的配置[(网卡, 配置)]，最新的在最后
+        self.history = []
+
+    def has_card(self, card):
+        return self.adapters is None or card in self.adapters
+
+    def apply(self, card, profile, force, progress):
+        from interface_state import FIELDS
+        self.calls.append((card, dict(profile)))
+        current = self.cards.get(card, {})
+        changed = [field for field in FIELDS
+                   if force or any(current.get(key) != profile[key] for key in _FIELD_KEYS[field])]
+        for index, field in enumerate(changed):
+            progress(index, len(changed), field)
+        if changed:
+            self.history.append((card, current))
+        self.cards[card] = dict(profile)
+        if changed:
+            progress(len(changed), len(changed), "完成")
+        return changed, [(field, 0.0) for field in changed]
+
+    def revert(self, card, progress):
+        for index in range(len(self.history) - 1, -1, -1):
+            if card is None or self.history[index][0] == card:
+                card, profile = self.history.pop(index)
+                if profile:
+                    self.cards[card] = profile
+                else:
+                    # 应用前没有配置
+                    self.cards.pop(card, None)
+                progress(1, 1, "完成")
+                return card, [("恢复网络配置", 0.0)]
+        raise ValueError("没有可恢复的网络配置")
+
+    def query(self, card):
+        profile = self.cards.get(card)
+        if profile is None:
+            return {'addresses': None, 'gateways': None, 'dns': None, 'mac': None}
+        return {'addresses': [(profile['ip'], profile['netmask'])], 'gateways': [profile['gateway']],
+                'dns': [s for s in (profile['dns'], profile['s_dns']) if s], 'mac': profile['mac']}
+
+
+# FakeBackend比较字段时对应的配置项
+_FIELD_KEYS = {'ip': ('ip', 'netmask'), 'gateway': ('gateway',), 'dns': ('dns', 's_dns'), 'mac': ('mac',)}
+
+
+def check_profile(profile):
+    """校验客户端发来的配置，返回只包含PROFILE_FIELDS的配置，无效时抛出ValueError
+
+    字段会被拼入resolv.conf和系统命令，除地址格式外还限制MAC和物理地址名称的字符
+    """
+    import validators
+
+    if not isinstance(profile, dict):
+        raise ValueError("配置格式不正确")
+    checked = {}
+    for field in PROFILE_FIELDS:
+        value = profile.get(field)
+        if value is None:
+            value = ''
+        if not isinstance(value, str):
+            raise ValueError(f"配置字段 {field} 应为字符串")
+        checked[field] = value
+    errors = [error for _, error in validators.validate_profile(checked)]
+    for field, title in (('dns', "首选DNS"), ('s_dns', "备用DNS")):
+        if checked[field] and validators.parse_address(checked[field], 'ip')[0] is None:
+            errors.append(f"{title}格式不正确，应为 xxx.xxx.xxx.xxx")
+    if checked['mac'] and not _MAC_PATTERN.fullmatch(checked['mac']):
+        errors.append("MAC地址格式不正确，应为12位十六进制数")
+    if not _MAC_NAME_PATTERN.fullmatch(checked['mac_name']):
+        errors.append("物理地址名称包含不允许的字符")
+    if errors:
+        raise ValueError("；".join(errors))
+    return checked
+
+
+class _Request:
+    """排队中的请求"""
+
+    def __init__(self, message, conn, lock):
+        self.message = message
+        self.conn = conn
+        # 同一连接上的回复需要串行发送
+        self.lock = lock
+
+    def send(self, reply):
+        with self.lock:
+            try:
+                self.conn.send_bytes(json.dumps(reply, ensure_ascii=False).encode('utf-8'))
+            except OSError:
+                # 客户端已断开
+                pass
+
+
+class HelperServer:
+    """特权助手服务端"""
+
+    def __init__(self, backend, address=None):
+        self.backend = backend
+        self.address = address or helper_address()
+        self.requests = queue.Queue()
+        self.listener = None
+        self._stop = threading.Event()
+
+    def serve(self, group=None):
+        """开始监听并处理请求，直到调用stop"""
+        if not SUPPORTED:
+            raise OSError("特权助手不支持Windows")
+        if os.path.exists(self.address):
+            # 上次异常退出遗留的套接字文件
+            os.unlink(self.address)
+        # 套接字文件创建时即只有所有者可以连接，之后再按需开放给指定用户组
+        umask = os.umask(0o177)
+        try:
+            self.listener = Listener(self.address, family=_FAMILY)
+        finally:
+            os.umask(umask)
+        if group is not None:
+            import grp
+            os.chown(self.address, -1, grp.getgrnam(group).gr_gid)
+            os.chmod(self.address, 0o660)
+
+        worker = threading.Thread(target=self._work, daemon=True)
+        worker.start()
+        print(f"特权助手已启动: {self.address}")
+        try:
+            while True:
+                conn = self.listener.accept()
+                if self._stop.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            self.requests.put(None)
+            worker.join()
+
+    def stop(self):
+        """停止监听（可在任意线程调用）"""
+        self._stop.set()
+        # 连接一次以唤醒阻塞在accept中的监听线程
+        try:
+            Client(self.address, family=_FAMILY).close()
+        except OSError:
+            pass
+
+    def _read(self, conn):
+        """读取一个连接上的请求，放入队列"""
+        lock = threading.Lock()
+        with conn:
+            while True:
+                try:
+                    data = conn.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                try:
+                    message = json.loads(data)
+                except ValueError:
+                    message = None
+                # 网卡名称用作排队时的键，只接受字符串
+                if not isinstance(message, dict) or not isinstance(message.get('card', ''), (str, type(None))):
+                    _Request(None, conn, lock).send({'ok': False, 'error': "请求格式不正确"})
+                    continue
+                request = _Request(message, conn, lock)
+                if message.get('op') == 'ping':
+                    request.send({'ok': True, 'id': message.get('id')})
+                else:
+                    self.requests.put(request)
+
+    def _work(self):
+        """按顺序执行排队中的请求"""
+        while True:
+            batch = [self.requests.get()]
+            # 一次取出全部排队中的请求
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            batch = [request for request in batch if request is not None]
+            # 同一网卡只执行最后一次应用请求，之前的请求直接回复已被取代
+            latest = {}
+            for request in batch:
+                if request.message.get('op') == 'apply':
+                    latest[request.message.get('card')] = request
+            for request in batch:
+                message = request.message
+                if message.get('op') == 'apply' and latest[message.get('card')] is not request:
+                    request.send({'ok': False, 'id': message.get('id'), 'superseded': True,
+                                  'error': "已被同一网卡的后续请求取代"})
+                    continue
+                request.send(self._handle(request))
+            if stopping:
+                return
+
+    def _handle(self, request):
+        message = request.message
+        op = message.get('op')
+        reply = {'id': message.get('id')}
+        try:
+            if op == 'apply':
+                card = self._check_card(message.get('card'))
+                profile = check_profile(message.get('profile'))
+
+                def progress(index, total, title):
+                    request.send({'id': message.get('id'), 'progress': [index, total, title]})
+                start = time.perf_counter()
+                changed, timings = self.backend.apply(card, profile, bool(message.get('force')), progress)
+                reply.update(ok=True, changed=changed, timings=timings,
+                             seconds=round(time.perf_counter() - start, 6))
+            elif op == 'revert':
+                def progress(index, total, title):
+                    request.send({'id': message.get('id'), 'progress': [index, total, title]})
+                card = message.get('card')
+                card, timings = self.backend.revert(None if card is None else self._check_card(card), progress)
+                reply.update(ok=True, card=card, timings=timings)
+            elif op == 'query':
+                reply.update(ok=True, state=self.backend.query(self._check_card(message.get('card'))))
+            else:
+                reply.update(ok=False, error=f"未知的请求: {op}")
+        except Exception as e:
+            reply.update(ok=False, error=str(e))
+        return reply
+
+    def _check_card(self, card):
+        """网卡名称须为本机存在的网卡，无效时抛出ValueError"""
+        if not isinstance(card, str) or not card or _CARD_FORBIDDEN.search(card):
+            raise ValueError("网卡名称不正确")
+        if not self.backend.has_card(card):
+            raise ValueError(f"网卡不存在: {card}")
+        return card
+
+
+class HelperError(Exception):
+    """助手返回的错误"""
+
+
+class HelperClient:
+    """特权助手客户端，同一连接可连续发送多个请求"""
+
+    def __init__(self, address=None):
+        self.conn = Client(address or helper_address(), family=_FAMILY)
+        self.seq = 0
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, message, progress=None):
+        """发送请求并等待回复，progress(序号, 总数, 标题)接收执行进度"""
+        self.seq += 1
+        message = dict(message, id=self.seq)
+        self.conn.send_bytes(json.dumps(message, ensure_ascii=False).encode('utf-8'))
+        while True:
+            reply = json.loads(self.conn.recv_bytes())
+            if reply.get('id') != self.seq:
+                continue
+            if 'progress' in reply:
+                if progress:
+                    progress(*reply['progress'])
+                continue
+            if not reply.get('ok'):
+                raise HelperError(reply.get('error', "未知错误"))
+            return reply
+
+    def ping(self):
+        return self.request({'op': 'ping'})
+
+    def apply(self, card, profile, force=False, progress=None):
+        """应用配置，返回(修改的字段, 各步骤耗时)"""
+        reply = self.request({'op': 'apply', 'card': card, 'force': force,
+                              'profile': {field: profile.get(field, '') for field in PROFILE_FIELDS}}, progress)
+        return reply['changed'], [tuple(item) for item in reply['timings']]
+
+    def revert(self, card=None, progress=None):
+        """恢复到最近一次应用配置前的网络配置，card为None时恢复最近修改的网卡，返回(网卡, 各步骤耗时)"""
+        reply = self.request({'op': 'revert', 'card': card}, progress)
+        return reply['card'], [tuple(item) for item in reply['timings']]
+
+    def query(self, card):
+        return self.request({'op': 'query', 'card': card})['state']
+
+
+def connect(address=None):
+    """连接特权助手，助手未运行时返回None"""
+    address = address or helper_address()
+    if not SUPPORTED or not os.path.exists(address):
+        return None
+    try:
+        return HelperClient(address)
+    except OSError:
+        return None
+
+
+def helper_available(address=None):
+    """特权助手是否正在运行"""
+    client = connect(address)
+    if client is None:
+        return False
+    client.close()
+    return True
+
+
+def helper_steps(card, profile, force=False, address=None):
+    """通过特权助手应用配置的步骤，整个应用过程为一次请求，执行后步骤的changed为助手修改的字段"""
+    from network_apply import ApplyStep, ApplyError
+
+    def apply():
+        client = connect(address)
+        if client is None:
+            raise ApplyError("无法连接特权助手")
+        with client:
+            try:
+                changed, timings = client.apply(card, profile, force)
+            except HelperError as e:
+                raise ApplyError(str(e)) from e
+        for title, seconds in timings:
+            print(f"  {title}: {seconds:.3f} 秒")
+        step.changed = changed
+        return changed
+    step = ApplyStep("通过特权助手应用配置", apply)
+    return [step]
+
+
+def helper_revert_steps(card=None, address=None):
+    """通过特权助手恢复上一个网络配置的步骤，快照保存在助手一侧"""
+    from network_apply import ApplyStep, ApplyError
+
+    def revert():
+        client = connect(address)
+        if client is None:
+            raise ApplyError("无法连接特权助手")
+        with client:
+            try:
+                restored, timings = client.revert(card)
+            except HelperError as e:
+                raise ApplyError(str(e)) from e
+        print(f"已恢复网卡 {restored} 的配置")
+        for title, seconds in timings:
+            print(f"  {title}: {seconds:.3f} 秒")
+    return [ApplyStep("通过特权助手恢复配置", revert)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="网络配置管理工具特权助手")
+    parser.add_argument('--socket', default=None, help=f"监听地址，默认 {DEFAULT_ADDRESS}")
+    parser.add_argument('--group', default=None, help="允许连接的用户组（仅Unix）")
+    parser.add_argument('--fake', action='store_true', help="使用内存中的模拟后端，不修改网络配置")
+    args = parser.parse_args(argv)
+    if not SUPPORTED:
+        parser.error("特权助手不支持Windows")
+
+    server = HelperServer(FakeBackend() if args.fake else SystemBackend(), args.socket)
+    # 作为系统服务运行时通过SIGTERM停止
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    try:
+        server.serve(args.group)
+    except KeyboardInterrupt:
+        server.stop()
+    finally:
+        if os.path.exists(server.address):
+            os.unlink(server.address)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台应用配置线程
+在工作线程中读取网卡当前配置并生成步骤，逐步执行并通过信号报告进度，支持在步骤之间取消
+"""
+
+import threading
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from network_apply import run_steps, ApplyCancelled
+import tracing
+
+
+class ApplyWorker(QObject):
+    """应用配置工作对象，需移动到独立的QThread中运行"""
+
+    # 当前步骤序号、步骤总数、步骤标题
+    progress = pyqtSignal(int, int, str)
+    # 各步骤耗时[(标题, 秒)]
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    # 取消提示，已执行的步骤已恢复时包含恢复结果
+    cancelled = pyqtSignal(str)
+    # 网卡当前配置与目标配置一致，没有需要执行的步骤
+    unchanged = pyqtSignal()
+
+    def __init__(self, plan):
+        super().__init__()
+        # 返回步骤列表的函数，在工作线程中调用
+        self.plan = plan
+        self.cancel_event = threading.Event()
+
+    @pyqtSlot()
+    def run(self):
+        """生成并执行全部步骤，生成步骤的耗时也记录在本次应用的耗时区间中"""
+        with tracing.capture() as events:
+            try:
+                self._run()
+            finally:
+                tracing.set_last_apply(events)
+
+    def _run(self):
+        try:
+            self.progress.emit(0, 0, "读取网卡当前配置")
+            with tracing.span("生成步骤", 'apply'):
+                steps = self.plan()
+            if not steps:
+                self.unchanged.emit()
+                return
+            timings = run_steps(steps, self.progress.emit, self.cancel_event)
+        except ApplyCancelled as e:
+            self.cancelled.emit(str(e))
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            # 特权助手比较后没有修改任何字段时与没有步骤一样处理
+            if all(step.changed == [] for step in steps):
+                self.unchanged.emit()
+            else:
+                self.succeeded.emit(timings)
+
+    def cancel(self):
+        """请求取消，当前步骤完成后生效（可在任意线程调用）"""
+        self.cancel_event.set()
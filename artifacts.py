@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量生成部署文件
+将配置文件中的每个用户离线生成为可直接部署的网络配置文件：
+
+    netplan        <部门>/<用户>/netplan.yaml
+    nm             <部门>/<用户>/ncmtool.nmconnection   （NetworkManager keyfile）
+    netsh          <部门>/<用户>/netsh.cmd              （Windows）
+    networksetup   <部门>/<用户>/networksetup.sh        （macOS）
+
+输出到目录或tar归档（.tar/.tar.gz），由进程池按块并行生成。清单文件记录每个用户的内容哈希，
+再次生成时跳过哈希未变化的用户；输出到归档时归档中只包含有变化的用户。
+
+生成的脚本由管理员以特权运行：生成前与命令计划一样校验DNS和MAC地址，网卡名称和参数
+按目标脚本转义，注释行中的部门名和用户名去掉换行等控制字符
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shlex
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import command_plan
+import validators
+import nm_profiles
+from search_index import normalize_mac
+
+FORMATS = ('netplan', 'nm', 'netsh', 'networksetup')
+
+# 各格式生成的文件名
+FILENAMES = {
+    'netplan': 'netplan.yaml',
+    'nm': 'ncmtool.nmconnection',
+    'netsh': 'netsh.cmd',
+    'networksetup': 'networksetup.sh',
+}
+
+# 各系统上的默认网卡名称
+DEFAULT_CARDS = {
+    'linux': 'eth0',
+    'windows': '以太网',
+    'macos': 'Ethernet',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+# 生成格式变化时修改版本号，使已生成的文件全部重新生成
+FORMAT_VERSION = 2
+
+# 每个进程一次处理的用户数
+CHUNK_SIZE = 2000
+
+# 文件名中不允许出现的字符
+_UNSAFE_CHARS = set('\\/:*?"<>|')
+
+
+# 注释行中替换为空格的控制字符
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f]')
+
+# 批处理文件中双引号无法转义，%会被展开为变量
+_CMD_FORBIDDEN = '"%'
+
+
+def _comment(department, user, forbidden=''):
+    """注释行中的"ncmtool 部门/用户名"，forbidden中的字符替换为下划线"""
+    text = _CONTROL_CHARS.sub(' ', f"ncmtool {department}/{user.get('name', '')}")
+    return ''.join('_' if c in forbidden else c for c in text)
+
+
+def check_cards(cards):
+    """检查各系统上的网卡名称，无效时抛出ValueError"""
+    command_plan.check_card(cards['linux'])
+    command_plan.check_card(cards['windows'], _CMD_FORBIDDEN)
+    command_plan.check_card(cards['macos'])
+
+
+def safe_name(name):
+    """将部门名或用户名转换为可用作目录名的字符串"""
+    name = ''.join('_' if c in _UNSAFE_CHARS or ord(c) < 32 else c for c in str(name)).strip(' .')
+    return name or '_'
+
+
+def record_key(department, name):
+    """用户在输出目录或归档中的相对路径"""
+    return f"{safe_name(department)}/{safe_name(name)}"
+
+
+def record_hash(department, user, formats, cards):
+    """用户配置的内容哈希，包含影响生成结果的全部输入"""
+    record = [FORMAT_VERSION, list(formats), cards, department, user.get('name', '')]
+    record.extend(str(user.get(key) or '') for key in ('ip', 'netmask', 'gateway', 'dns', 's_dns', 'mac',
+                                                       'mac_name'))
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _dns_servers(user):
+    return [server.strip() for server in (user.get('dns'), user.get('s_dns')) if server and server.strip()]
+
+
+def render_netplan(department, user, card):
+    """netplan配置"""
+    prefixlen = validators.mask_to_cidr(validators.parse_netmask(user['netmask'])[0])
+    lines = [
+        f"# {_comment(department, user)}",
+        "network:",
+        "  version: 2",
+        "  ethernets:",
+        f"    {json.dumps(card, ensure_ascii=False)}:",
+        "      dhcp4: false",
+    ]
+    if user.get('mac'):
+        lines.append(f"      macaddress: \"{nm_profiles.format_mac(user['mac']).lower()}\"")
+    lines.extend([
+        "      addresses:",
+        f"        - {user['ip']}/{prefixlen}",
+        "      routes:",
+        "        - to: default",
+        f"          via: {user['gateway']}",
+    ])
+    dns = _dns_servers(user)
+    if dns:
+        lines.extend([
+            "      nameservers:",
+            f"        addresses: [{', '.join(dns)}]",
+        ])
+    return '\n'.join(lines) + '\n'
+
+
+def render_netsh(department, user, card):
+    """Windows批处理脚本，命令与界面中应用配置时一致"""
+    netmask = validators.int_to_ip(validators.parse_netmask(user['netmask'])[0])
+    lines = [
+        "@echo off",
+        "chcp 65001 >nul",
+        # rem行末尾的^会把下一行并入注释
+        f"rem {_comment(department, user, _CMD_FORBIDDEN + '^')}",
+        f"netsh interface ip set addr \"{card}\" static {user['ip']} {netmask} {user['gateway']}",
+    ]
+    dns = _dns_servers(user)
+    if dns:
+        lines.append(f"netsh interface ip set dns \"{card}\" static {dns[0]} primary")
+    if len(dns) > 1:
+        lines.append(f"netsh interface ip add dns \"{card}\" {dns[1]} index=2")
+    if user.get('mac'):
+        mac_name = command_plan.ps_quote(user.get('mac_name') or '网络地址')
+        lines.extend([
+            f"netsh interface set interface \"{card}\" admin=disable",
+            f"powershell -ExecutionPolicy Bypass -Command \"Set-NetAdapterAdvancedProperty "
+            f"-Name {command_plan.ps_quote(card)} -DisplayName {mac_name} "
+            f"-DisplayValue {command_plan.ps_quote(normalize_mac(user['mac']))}\"",
+            f"netsh interface set interface \"{card}\" admin=enable",
+        ])
+    # 批处理文件使用CRLF换行
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def render_networksetup(department, user, card):
+    """macOS shell脚本，命令与界面中应用配置时一致"""
+    netmask = validators.int_to_ip(validators.parse_netmask(user['netmask'])[0])
+    service = shlex.quote(card)
+    args = ' '.join(shlex.quote(arg) for arg in (user['ip'], netmask, user['gateway']))
+    lines = [
+        "#!/bin/sh",
+        f"# {_comment(department, user)}",
+        "set -e",
+        f"networksetup -setmanual {service} {args}",
+    ]
+    dns = _dns_servers(user)
+    if dns:
+        lines.append(f"networksetup -setdnsservers {service} {' '.join(shlex.quote(server) for server in dns)}")
+    return '\n'.join(lines) + '\n'
+
+
+def render_record(department, user, formats, cards):
+    """生成一个用户的全部文件，返回[(文件名, 内容)]，配置无效时抛出ValueError"""
+    errors = validators.validate_profile(user)
+    if errors:
+        raise ValueError("; ".join(message for _, message in errors))
+    command_plan.check_fields(user['ip'], user['netmask'], user['gateway'], user.get('dns'), user.get('s_dns'),
+                              user.get('mac'), ('dns', 'mac'))
+    mac_name = user.get('mac_name')
+    if mac_name and (not isinstance(mac_name, str) or _CONTROL_CHARS.search(mac_name)
+                     or any(c in mac_name for c in _CMD_FORBIDDEN)):
+        raise ValueError(f"物理地址名称包含不允许的字符: {mac_name!r}")
+    files = []
+    for fmt in formats:
+        if fmt == 'netplan':
+            text = render_netplan(department, user, cards['linux'])
+        elif fmt == 'nm':
+            text = nm_profiles.render_keyfile(department, user, cards['linux'])
+        elif fmt == 'netsh':
+            text = render_netsh(department, user, cards['windows'])
+        else:
+            text = render_networksetup(department, user, cards['macos'])
+        files.append((FILENAMES[fmt], text))
+    return files
+
+
+def _file_mode(filename):
+    if filename.endswith('.sh'):
+        return 0o755
+    # NetworkManager会忽略权限更宽的连接文件
+    if filename.endswith('.nmconnection'):
+        return 0o600
+    return 0o644
+
+
+def _tar_member(name, data, mtime):
+    """生成归档中一个文件的头部和内容，在子进程中完成以分担主进程的工作
+
+    直接填写GNU格式的头部，比逐个创建TarInfo快得多；名称超过100字节时交给tarfile生成长名称头部
+    """
+    name_bytes = name.encode('utf-8')
+    mode = _file_mode(name)
+    padding = tarfile.NUL * (-len(data) % tarfile.BLOCKSIZE)
+    if len(name_bytes) > 100:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        info.mode = mode
+        return info.tobuf(tarfile.GNU_FORMAT, 'utf-8', 'surrogateescape') + data + padding
+
+    header = bytearray(tarfile.BLOCKSIZE)
+    header[0:len(name_bytes)] = name_bytes
+    header[100:148] = b'%07o\0%07o\0%07o\0%011o\0%011o\0' % (mode, 0, 0, len(data), mtime)
+    header[156] = ord(tarfile.REGTYPE)
+    header[257:265] = tarfile.GNU_MAGIC
+    header[329:345] = b'%07o\0%07o\0' % (0, 0)
+    # 校验和按校验和字段为8个空格时计算
+    header[148:156] = b' ' * 8
+    header[148:156] = b'%06o\0 ' % sum(header)
+    return bytes(header) + data + padding
+
+
+def _render_chunk(records, formats, cards, directory, mtime):
+    """在子进程中生成一块用户，directory不为None时直接写入目录，否则生成归档内容
+
+    返回(归档内容字节, 无效的用户[(部门, 用户名, 错误信息)])，写入目录时归档内容为空
+    """
+    members = []
+    skipped = []
+    for key, department, user in records:
+        try:
+            rendered = render_record(department, user, formats, cards)
+        except ValueError as e:
+            skipped.append((department, user.get('name', ''), str(e)))
+            continue
+        if directory is None:
+            members.extend(_tar_member(f"{key}/{filename}", text.encode('utf-8'), mtime)
+                           for filename, text in rendered)
+            continue
+        record_dir = os.path.join(directory, key)
+        os.makedirs(record_dir, exist_ok=True)
+        for filename, text in rendered:
+            fd = os.open(os.path.join(record_dir, filename), os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         _file_mode(filename))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(text.encode('utf-8'))
+    return b''.join(members), skipped
+
+
+def _render_chunk_args(args):
+    return _render_chunk(*args)
+
+
+class ExportResult:
+    """一次批量生成的结果"""
+
+    def __init__(self):
+        self.total = 0
+        # 重新生成的用户数
+        self.written = 0
+        # 内容未变化而跳过的用户数
+        self.unchanged = 0
+        # 已从配置中删除的用户
+        self.removed = []
+        # 无效的用户[(部门, 用户名, 错误信息)]
+        self.skipped = []
+        self.seconds = 0.0
+
+    @property
+    def records_per_second(self):
+        return self.total / self.seconds if self.seconds else 0.0
+
+
+def is_archive(output):
+    return output.endswith(('.tar', '.tar.gz', '.tgz'))
+
+
+def manifest_path(output):
+    """清单文件路径，输出到归档时位于归档旁边"""
+    if is_archive(output):
+        return output + '.manifest.json'
+    return os.path.join(output, MANIFEST_NAME)
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def export(departments, output, formats=FORMATS, cards=None, jobs=None, full=False):
+    """将全部用户生成为部署文件，output为目录或tar归档路径
+
+    full为True时忽略上次的清单，重新生成全部用户；jobs为进程数，默认为CPU数。
+    网卡名称无效时抛出ValueError
+    """
+    start = time.perf_counter()
+    cards = dict(DEFAULT_CARDS, **(cards or {}))
+    check_cards(cards)
+    formats = tuple(fmt for fmt in FORMATS if fmt in formats)
+    archive = is_archive(output)
+    old_manifest = {} if full else _read_manifest(manifest_path(output))
+    manifest = {}
+    result = ExportResult()
+
+    # 先在主进程中计算哈希，只把有变化的用户交给进程池
+    pending = []
+    for dept in departments:
+        department = dept.get('department', '')
+        for user in dept.get('users') or []:
+            result.total += 1
+            key = record_key(department, user.get('name', ''))
+            if key in manifest:
+                result.skipped.append((department, user.get('name', ''), "与同一部门中的其他用户重名"))
+                continue
+            digest = record_hash(department, user, formats, cards)
+            manifest[key] = digest
+            if old_manifest.get(key) == digest:
+                result.unchanged += 1
+            else:
+                pending.append((key, department, user))
+
+    directory = None if archive else output
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    elif os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    duplicates = len(result.skipped)
+    tasks = [(chunk, formats, cards, directory, int(time.time())) for chunk in _chunks(pending, CHUNK_SIZE)]
+    stream = _open_archive(output) if archive else None
+    try:
+        if len(tasks) <= 1 or jobs == 1:
+            size = _collect(map(_render_chunk_args, tasks), stream, result)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                # 按提交顺序取回结果，归档内容与进程数无关
+                size = _collect(executor.map(_render_chunk_args, tasks), stream, result)
+        if stream is not None:
+            _finish_archive(stream, size)
+    finally:
+        if stream is not None:
+            stream.close()
+
+    # 无效的用户不写入清单，下次重新检查
+    invalid = result.skipped[duplicates:]
+    for department, name, _ in invalid:
+        manifest.pop(record_key(department, name), None)
+    result.written = len(pending) - len(invalid)
+
+    result.removed = [key for key in old_manifest if key not in manifest]
+    if directory is not None:
+        for key in result.removed:
+            _remove_record(directory, key)
+
+    with open(manifest_path(output), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=0, sort_keys=True)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _open_archive(output):
+    if output.endswith(('.gz', '.tgz')):
+        return gzip.open(output, 'wb', compresslevel=6)
+    return open(output, 'wb')
+
+
+def _collect(outputs, stream, result):
+    """收集各块的结果，输出到归档时逐块写入，返回写入归档的字节数"""
+    size = 0
+    for data, skipped in outputs:
+        result.skipped.extend(skipped)
+        if stream is not None:
+            stream.write(data)
+            size += len(data)
+    return size
+
+
+def _finish_archive(stream, size):
+    """写入归档结尾的两个空块，并按记录大小补齐，与tarfile生成的归档一致"""
+    size += tarfile.BLOCKSIZE * 2
+    stream.write(tarfile.NUL * (tarfile.BLOCKSIZE * 2 + -size % tarfile.RECORDSIZE))
+
+
+def _remove_record(directory, key):
+    """删除已从配置中删除的用户的文件"""
+    record_dir = os.path.join(directory, key)
+    for filename in FILENAMES.values():
+        try:
+            os.unlink(os.path.join(record_dir, filename))
+        except FileNotFoundError:
+            pass
+    try:
+        os.rmdir(record_dir)
+        os.rmdir(os.path.dirname(record_dir))
+    except OSError:
+        # 目录中还有其他文件或其他用户
+        pass
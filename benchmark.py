@@ -0,0 +1,1125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能测试脚本
+生成与config.json结构一致的模拟配置，测量各热点路径的耗时和内存
+
+    python benchmark.py                                   # 运行全部测试项
+    python benchmark.py gui apply --sizes 1000 100000 1000000 --output bench.json
+    python benchmark.py gui apply --compare bench.json    # 与上次结果比较，变慢时以非零状态退出
+    python benchmark.py --write-config config.json --users 100000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# 无界面环境下使用offscreen平台运行Qt
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def generate_config(user_count, department_count=None):
+    """生成指定用户数量的模拟配置数据
+
+    每个部门独占若干个/24子网，IP和MAC不重复，网关为所在子网的第一个地址
+    """
+    return list(iter_generated(user_count, department_count))
+
+
+def iter_generated(user_count, department_count=None):
+    """逐个生成模拟配置的部门，写出大型配置时不需要在内存中保存全部用户"""
+    if department_count is None:
+        department_count = max(1, user_count // 100)
+    per_dept = user_count // department_count
+    extra = user_count % department_count
+    serial = 0
+    block = -1
+    for d in range(department_count):
+        users = []
+        for i in range(per_dept + (1 if d < extra else 0)):
+            if i % 253 == 0:
+                block += 1
+            prefix = f"10.{(block >> 8) & 0xFF}.{block & 0xFF}"
+            users.append({
+                "name": f"用户{serial}",
+                "deviceName": f"DESKTOP-{serial:06X}",
+                "ip": f"{prefix}.{i % 253 + 2}",
+                "deviceType": "Windows" if serial % 3 else "LINUX",
+                "netmask": "255.255.255.0",
+                "gateway": f"{prefix}.1",
+                "dns": "192.168.100.40",
+                "s_dns": "",
+                "mac": f"02{serial:010X}",
+                "mac_name": "网络地址"
+            })
+            serial += 1
+        yield {"department": f"部门{d}", "users": users}
+
+
+def rss_kb():
+    """返回当前进程常驻内存（KB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_tree(sizes):
+    """对比逐项创建QTreeWidgetItem与懒加载模型的启动耗时和内存"""
+    from PyQt6.QtWidgets import QApplication, QTreeWidget, QTreeWidgetItem, QTreeView
+    from PyQt6.QtCore import Qt
+    from config_tree_model import ConfigTreeModel
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+
+        # 旧实现：一次性创建全部节点并展开
+        before = rss_kb()
+        start = time.perf_counter()
+        widget = QTreeWidget()
+        for dept in config_data:
+            dept_item = QTreeWidgetItem([dept['department']])
+            for user in dept['users']:
+                user_item = QTreeWidgetItem([user['name']])
+                user_item.setData(0, Qt.ItemDataRole.UserRole, user)
+                dept_item.addChild(user_item)
+            widget.addTopLevelItem(dept_item)
+            dept_item.setExpanded(True)
+        widget.show()
+        app.processEvents()
+        widget_ms = (time.perf_counter() - start) * 1000
+        widget_kb = rss_kb() - before
+        widget.close()
+        widget.deleteLater()
+        app.processEvents()
+
+        # 新实现：模型只创建部门节点
+        before = rss_kb()
+        start = time.perf_counter()
+        model = ConfigTreeModel(config_data)
+        view = QTreeView()
+        view.setUniformRowHeights(True)
+        view.setModel(model)
+        view.show()
+        app.processEvents()
+        model_ms = (time.perf_counter() - start) * 1000
+        model_kb = rss_kb() - before
+        view.close()
+        view.deleteLater()
+        app.processEvents()
+
+        results.append({
+            "bench": "tree", "users": size,
+            "tree_widget_ms": round(widget_ms, 2), "tree_widget_kb": widget_kb,
+            "tree_model_ms": round(model_ms, 2), "tree_model_kb": model_kb,
+        })
+    return results
+
+
+def write_config(path, config_data):
+    """按config.json的格式写出模拟配置，config_data也可以是逐个生成部门的迭代器"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if isinstance(config_data, list):
+            json.dump(config_data, f, ensure_ascii=False, indent=1)
+            return
+        # 逐个部门写出，与json.dump(indent=1)的格式一致
+        f.write('[')
+        index = None
+        for index, dept in enumerate(config_data):
+            f.write(',\n ' if index else '\n ')
+            f.write(json.dumps(dept, ensure_ascii=False, indent=1).replace('\n', '\n '))
+        f.write('\n]' if index is not None else ']')
+
+
+# 在独立进程中测量加载耗时，避免本进程中已有对象影响垃圾回收开销
+_LOAD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import config_loader
+path, mode = sys.argv[2], sys.argv[3]
+start = time.perf_counter()
+if mode == 'json':
+    with open(path, 'r', encoding='utf-8') as f:
+        json.load(f)
+    first = time.perf_counter()
+else:
+    departments = config_loader.iter_departments(path)
+    next(departments)
+    first = time.perf_counter()
+    for _ in departments:
+        pass
+end = time.perf_counter()
+print((first - start) * 1000, (end - start) * 1000)
+"""
+
+
+def _time_load(path, mode):
+    """返回(首个部门可用耗时, 全部加载耗时)，单位毫秒"""
+    result = subprocess.run(
+        [sys.executable, '-c', _LOAD_SCRIPT, os.path.dirname(os.path.abspath(__file__)), path, mode],
+        capture_output=True, text=True, check=True)
+    first_ms, total_ms = (float(v) for v in result.stdout.split())
+    return round(first_ms, 2), round(total_ms, 2)
+
+
+def bench_load(sizes):
+    """对比json.load与流式加载（冷启动/缓存命中）的耗时"""
+    from config_loader import cache_path_for
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f'config_{size}.json')
+            write_config(path, generate_config(size))
+            cache_path = cache_path_for(path)
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+            json_first, json_total = _time_load(path, 'json')
+            cold_first, cold_total = _time_load(path, 'stream')
+            warm_first, warm_total = _time_load(path, 'stream')
+            results.append({
+                "bench": "load", "users": size,
+                "file_mb": round(os.path.getsize(path) / 1e6, 1),
+                "json_load_ms": json_total,
+                "cold_first_ms": cold_first, "cold_total_ms": cold_total,
+                "warm_first_ms": warm_first, "warm_total_ms": warm_total,
+            })
+    return results
+
+
+def bench_search(sizes):
+    """测量搜索索引的建立耗时和各类查询的延迟"""
+    from search_index import SearchIndex
+
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        start = time.perf_counter()
+        index = SearchIndex(config_data)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        last = config_data[-1]['users'][-1]
+        queries = {
+            "ip": last['ip'],
+            "mac": last['mac'],
+            "name": last['name'][:3],
+            "device": last['deviceName'].lower()[:10],
+            "pinyin": "yh",
+            "miss": "zzzz",
+        }
+        row = {"bench": "search", "users": size, "build_ms": round(build_ms, 2)}
+        for kind, query in queries.items():
+            rounds = 200
+            start = time.perf_counter()
+            for _ in range(rounds):
+                index.search(query)
+            row[f"{kind}_us"] = round((time.perf_counter() - start) / rounds * 1e6, 1)
+        results.append(row)
+    return results
+
+
+def bench_records(sizes):
+    """对比原始用户字典与紧凑配置表每个用户占用的内存，以及读取一条记录的耗时"""
+    import tracemalloc
+    from profile_records import ProfileTable
+
+    results = []
+    for size in sizes:
+        # 经过JSON解析，与从配置文件读取时一样每个值都是独立的字符串对象
+        text = json.dumps(generate_config(size), ensure_ascii=False)
+        tracemalloc.start()
+        config_data = json.loads(text)
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del text
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        table = ProfileTable.from_departments(config_data)
+        build_ms = (time.perf_counter() - start) * 1000
+        table_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del config_data
+
+        rows = range(0, size, max(1, size // 1000))
+        start = time.perf_counter()
+        for row in rows:
+            table.record(row)
+        record_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+        results.append({
+            "bench": "records", "users": size,
+            "dict_bytes_per_user": round(dict_bytes / size, 1),
+            "table_bytes_per_user": round(table_bytes / size, 1),
+            "reduction": round(dict_bytes / table_bytes, 1),
+            "build_ms": round(build_ms, 2), "record_us": round(record_us, 2),
+        })
+    return results
+
+
+def bench_db(sizes):
+    """测量SQLite配置库：导入耗时、打开并填充配置树的耗时（与从JSON加载对比）、查找和搜索的延迟"""
+    from PyQt6.QtWidgets import QApplication
+    from config_loader import load_config_file
+    from config_tree_model import ConfigTreeModel
+    from profile_records import ProfileTable
+    import profile_db
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            json_path = os.path.join(tmp, f'config{size}.json')
+            db_path = os.path.join(tmp, f'config{size}.db')
+            write_config(json_path, iter_generated(size))
+            start = time.perf_counter()
+            profile_db.import_json(json_path, db_path)
+            import_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            model = ConfigTreeModel(ProfileTable.from_departments(load_config_file(json_path, use_cache=False)))
+            json_open_ms = (time.perf_counter() - start) * 1000
+            del model
+
+            start = time.perf_counter()
+            database = profile_db.ProfileDatabase(db_path)
+            model = ConfigTreeModel(database)
+            db_open_ms = (time.perf_counter() - start) * 1000
+
+            # 展开最后一个部门并读取显示的姓名
+            start = time.perf_counter()
+            dept_index = model.index(model.rowCount() - 1, 0)
+            model.fetchMore(dept_index)
+            for user_row in range(model.rowCount(dept_index)):
+                model.index(user_row, 0, dept_index).data()
+            expand_ms = (time.perf_counter() - start) * 1000
+            app.processEvents()
+
+            last_dept = size // 100 - 1 if size >= 100 else 0
+            rows = database.department_rows(last_dept)
+            last = database.record(rows.stop - 1)
+            row = {"bench": "db", "users": size, "import_ms": round(import_ms, 2),
+                   "db_kb": os.path.getsize(db_path) // 1024,
+                   "json_open_ms": round(json_open_ms, 2), "db_open_ms": round(db_open_ms, 2),
+                   "expand_department_ms": round(expand_ms, 2)}
+            rounds = 200
+            for kind, call in (("record", lambda: database.record(rows.start)),
+                               ("find", lambda: database.find(last.department, last.name)),
+                               ("search_ip", lambda: database.search(last.ip)),
+                               ("search_name", lambda: database.search(last.name[:3])),
+                               ("search_pinyin", lambda: database.search("yh"))):
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    call()
+                row[f"{kind}_us"] = round((time.perf_counter() - start) / rounds * 1e6, 1)
+            database.close()
+            results.append(row)
+    return results
+
+
+def bench_reload(sizes):
+    """配置文件修改一个用户后重新加载：比较配置的耗时，以及只更新变化的行与重置整个配置树的耗时"""
+    from PyQt6.QtWidgets import QApplication, QTreeView
+    from config_diff import diff_tables
+    from config_tree_model import ConfigTreeModel
+    from profile_records import ProfileTable
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        old = ProfileTable.from_departments(config_data)
+        config_data[-1]['users'][-1]['ip'] = "10.255.255.254"
+        new = ProfileTable.from_departments(config_data)
+
+        row = {"bench": "reload", "users": size}
+        for mode in ('diff', 'reset'):
+            model = ConfigTreeModel(old)
+            view = QTreeView()
+            view.setUniformRowHeights(True)
+            view.setModel(model)
+            # 展开前后各几个部门
+            for dept_row in list(range(min(5, model.rowCount()))) + list(range(max(0, model.rowCount() - 5),
+                                                                              model.rowCount())):
+                view.expand(model.index(dept_row, 0))
+            view.show()
+            app.processEvents()
+            start = time.perf_counter()
+            if mode == 'diff':
+                diff = diff_tables(old, new)
+                row["diff_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                start = time.perf_counter()
+                model.apply_diff(new, diff)
+            else:
+                model.set_config(new)
+            app.processEvents()
+            row[f"{mode}_update_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            row[f"{mode}_expanded"] = sum(view.isExpanded(model.index(r, 0)) for r in range(model.rowCount()))
+            view.close()
+            view.deleteLater()
+            app.processEvents()
+        results.append(row)
+    return results
+
+
+def _legacy_validate_ip(ip):
+    """重构前的IP地址校验，仅用于性能对比"""
+    import re
+    if not ip or not ip.strip():
+        return False, "IP地址不能为空"
+    if not re.match(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', ip):
+        return False, "IP地址格式不正确，应为 xxx.xxx.xxx.xxx"
+    for octet in ip.split('.'):
+        value = int(octet)
+        if value < 0 or value > 255:
+            return False, f"IP地址的每个部分应在 0-255 之间，当前值: {octet}"
+    return True, ""
+
+
+def _legacy_validate_subnet_mask(subnet_mask):
+    """重构前的子网掩码校验，仅用于性能对比"""
+    import re
+    if not subnet_mask or not subnet_mask.strip():
+        return False, "子网掩码不能为空"
+    if subnet_mask.isdigit():
+        cidr = int(subnet_mask)
+        if cidr < 0 or cidr > 32:
+            return False, "CIDR表示法应在 0-32 之间"
+        return True, ""
+    if not re.match(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', subnet_mask):
+        return False, "子网掩码格式不正确，应为 xxx.xxx.xxx.xxx 或 CIDR表示法（如 24）"
+    octets = subnet_mask.split('.')
+    for octet in octets:
+        value = int(octet)
+        if value < 0 or value > 255:
+            return False, f"子网掩码的每个部分应在 0-255 之间，当前值: {octet}"
+    binary_mask = ''.join([bin(int(octet))[2:].zfill(8) for octet in octets])
+    if '01' in binary_mask:
+        return False, "子网掩码格式不正确，应为连续的1后面跟着连续的0"
+    return True, ""
+
+
+def _time_calls(func, args_list, rounds=5):
+    """返回每次调用的平均耗时（纳秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for args in args_list:
+            func(*args)
+    return round((time.perf_counter() - start) / (rounds * len(args_list)) * 1e9, 1)
+
+
+def bench_validate(sizes):
+    """对比重构前后的校验函数，以及整份配置的批量校验耗时"""
+    import validators
+
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        users = [user for dept in config_data for user in dept['users']]
+        ips = [(user['ip'],) for user in users]
+        masks = [(user['netmask'],) for user in users]
+
+        validators.parse_netmask.cache_clear()
+        row = {
+            "bench": "validate", "users": size,
+            "legacy_ip_ns": _time_calls(_legacy_validate_ip, ips),
+            "engine_ip_ns": _time_calls(validators.validate_ip, ips),
+            "engine_parse_ns": _time_calls(validators.parse_address, ips),
+            "legacy_mask_ns": _time_calls(_legacy_validate_subnet_mask, masks),
+            "engine_mask_ns": _time_calls(validators.validate_subnet_mask, masks),
+        }
+        start = time.perf_counter()
+        errors = sum(1 for _ in validators.validate_config(config_data))
+        row["bulk_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        row["bulk_errors"] = errors
+        results.append(row)
+    return results
+
+
+def bench_lint(sizes):
+    """测量整份配置检查的耗时"""
+    import config_lint
+
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        start = time.perf_counter()
+        issues = config_lint.lint_config(config_data)
+        results.append({
+            "bench": "lint", "users": size,
+            "lint_ms": round((time.perf_counter() - start) * 1000, 2),
+            "issues": len(issues),
+        })
+    return results
+
+
+def bench_linkwait(sizes):
+    """模拟网卡在不同延迟后完成禁用/启用，测量链路状态等待的耗时
+
+    使用伪造的sysfs目录，与原先固定等待2秒+3秒对比，sizes参数不使用
+    """
+    import threading
+    import link_state
+
+    results = []
+    with tempfile.TemporaryDirectory() as sysfs_root:
+        card_dir = os.path.join(sysfs_root, 'eth0')
+        os.makedirs(card_dir)
+
+        def set_state(up):
+            with open(os.path.join(card_dir, 'flags'), 'w') as f:
+                f.write('0x1003\n' if up else '0x1002\n')
+            with open(os.path.join(card_dir, 'operstate'), 'w') as f:
+                f.write('up\n' if up else 'down\n')
+
+        for delay_ms in (0, 5, 50, 500):
+            elapsed = 0.0
+            for up in (False, True):
+                set_state(not up)
+                timer = threading.Timer(delay_ms / 1000, set_state, (up,))
+                start = time.perf_counter()
+                timer.start()
+                reached = link_state.wait_for_link('eth0', up=up, timeout=5, system='Linux',
+                                                   sysfs_root=sysfs_root)
+                elapsed += time.perf_counter() - start
+                timer.join()
+                assert reached
+            results.append({
+                "bench": "linkwait", "link_delay_ms": delay_ms,
+                "legacy_ms": 5000,
+                "wait_ms": round(elapsed * 1000, 1),
+            })
+    return results
+
+
+# 在独立的网络命名空间中对比rtnetlink与逐条启动ip命令的应用耗时，
+# 两组配置交替应用，每次都修改MAC地址、IP地址和网关
+_NETLINK_APPLY_SCRIPT = """
+import subprocess, sys, time
+sys.path.insert(0, sys.argv[1])
+import rtnetlink
+rounds = int(sys.argv[2])
+subprocess.run('ip link add nb0 type veth peer name nb1 && ip link set nb1 up && ip link set nb0 up',
+               shell=True, check=True)
+profiles = [('02:00:00:00:01:01', '10.10.1.5', '10.10.1.1'), ('02:00:00:00:01:02', '10.10.2.5', '10.10.2.1')]
+
+def apply_netlink(mac, ip, gateway):
+    with rtnetlink.RtNetlink() as netlink:
+        index = netlink.get_link('nb0').index
+        batch = netlink.batch().set_link_up(index, False).set_hwaddr(index, mac).set_link_up(index, True)
+        for _, address, length in reversed(netlink.list_addresses(index)):
+            batch.delete_address(index, address, length)
+        batch.add_address(index, ip, 24).replace_default_route(index, gateway).execute()
+
+def apply_subprocess(mac, ip, gateway):
+    for cmd in (['ip', 'link', 'set', 'nb0', 'down'], ['ip', 'link', 'set', 'nb0', 'address', mac],
+                ['ip', 'link', 'set', 'nb0', 'up'], ['ip', 'addr', 'flush', 'dev', 'nb0'],
+                ['ip', 'addr', 'add', f'{ip}/24', 'dev', 'nb0'],
+                ['ip', 'route', 'replace', 'default', 'via', gateway, 'dev', 'nb0']):
+        subprocess.run(cmd, check=True)
+
+for apply in (apply_netlink, apply_subprocess):
+    start = time.perf_counter()
+    for i in range(rounds):
+        apply(*profiles[i % 2])
+    print((time.perf_counter() - start) * 1000 / rounds)
+"""
+
+
+def _legacy_read_linux_state(card):
+    """原先通过ip命令读取网卡地址和默认网关的方式"""
+    subprocess.run(['ip', '-o', '-4', 'addr', 'show', 'dev', card], capture_output=True, text=True)
+    subprocess.run(['ip', '-4', 'route', 'show', 'default', 'dev', card], capture_output=True, text=True)
+    subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True)
+
+
+def bench_netlink(sizes):
+    """对比rtnetlink与ip命令读取网卡配置、应用配置的耗时，sizes参数不使用
+
+    应用配置需要root权限和unshare命令，在独立的网络命名空间中进行，不影响本机网络
+    """
+    import shutil
+    import rtnetlink
+    from interface_state import read_linux_state
+
+    with rtnetlink.RtNetlink() as netlink:
+        card = next((link.name for link in netlink.list_links() if link.name != 'lo'), 'lo')
+
+    rounds = 50
+    row = {"bench": "netlink", "card": card,
+           "netlink_read_ms": round(_time_calls(read_linux_state, [(card,)], rounds) / 1e6, 3),
+           "subprocess_read_ms": round(_time_calls(_legacy_read_linux_state, [(card,)], 5) / 1e6, 3)}
+
+    fake = rtnetlink.FakeSocket([rtnetlink.Link(2, 'eth0', 0x1003, '02:00:00:00:00:01', 'up')],
+                                [(2, '10.0.0.5', 24)], [(2, '10.0.0.1')])
+
+    def fake_apply():
+        netlink = rtnetlink.RtNetlink(fake)
+        batch = netlink.batch().set_link_up(2, False).set_hwaddr(2, '02:00:00:00:00:02').set_link_up(2, True)
+        for _, address, length in netlink.list_addresses(2):
+            batch.delete_address(2, address, length)
+        batch.add_address(2, '10.0.1.5', 24).replace_default_route(2, '10.0.1.1').execute()
+    row["fake_apply_us"] = round(_time_calls(fake_apply, [()], rounds) / 1e3, 1)
+
+    if os.geteuid() == 0 and shutil.which('unshare'):
+        result = subprocess.run(
+            ['unshare', '-n', sys.executable, '-c', _NETLINK_APPLY_SCRIPT,
+             os.path.dirname(os.path.abspath(__file__)), str(rounds)],
+            capture_output=True, text=True)
+        if result.returncode == 0:
+            netlink_ms, subprocess_ms = (float(v) for v in result.stdout.split())
+            row["netlink_apply_ms"] = round(netlink_ms, 3)
+            row["subprocess_apply_ms"] = round(subprocess_ms, 3)
+        else:
+            row["apply"] = "failed"
+    else:
+        row["apply"] = "skipped"
+    return [row]
+
+
+# 窗口首次绘制的时间预算（毫秒，从启动Python进程开始计算）
+STARTUP_BUDGET_MS = 300
+
+# 在独立进程中启动主窗口，记录首次绘制的时间点
+_STARTUP_SCRIPT = """
+import os, sys, time
+sys.path.insert(0, sys.argv[1])
+import network_config_tool
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QObject, QEvent, QTimer
+
+app = QApplication([])
+
+class FirstPaint(QObject):
+    painted = None
+
+    def eventFilter(self, obj, event):
+        if self.painted is None and event.type() == QEvent.Type.Paint:
+            self.painted = time.time()
+            QTimer.singleShot(0, app.quit)
+        return False
+
+first_paint = FirstPaint()
+app.installEventFilter(first_paint)
+QTimer.singleShot(10000, app.quit)
+window = network_config_tool.NetworkConfigTool()
+window.show()
+app.exec()
+print(first_paint.painted or 0)
+# 跳过窗口和后台线程的清理，只关心启动耗时
+sys.stdout.flush()
+os._exit(0)
+"""
+
+# 不依赖Qt的模块，命令行和批量处理只应加载这些模块
+_HEADLESS_MODULES = ('config_loader', 'validators', 'search_index', 'network_apply', 'ncmtool')
+
+_HEADLESS_SCRIPT = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+for name in sys.argv[2:]:
+    __import__(name)
+print((time.perf_counter() - start) * 1000, int('PyQt6' in sys.modules))
+"""
+
+
+def _parse_importtime(stderr, count=5):
+    """解析-X importtime的输出，返回自身耗时最长的模块"""
+    entries = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if line.startswith('import time:') and len(parts) == 3 and parts[0].split(':')[1].strip().isdigit():
+            entries.append((int(parts[0].split(':')[1]), parts[2].strip()))
+    entries.sort(reverse=True)
+    return ','.join(f"{name}:{us / 1000:.1f}" for us, name in entries[:count])
+
+
+def bench_startup(sizes):
+    """测量主窗口从启动进程到首次绘制的耗时，并检查是否超出预算
+
+    首次绘制不应随配置规模增长；同时检查不依赖Qt的模块不会加载PyQt6
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            # 主窗口从当前目录读取config.json
+            write_config(os.path.join(tmp, 'config.json'), generate_config(size))
+            samples = []
+            for _ in range(5):
+                start = time.time()
+                result = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, here], cwd=tmp, env=env,
+                                        capture_output=True, text=True, check=True)
+                samples.append((float(result.stdout.split()[-1]) - start) * 1000)
+            result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _STARTUP_SCRIPT, here],
+                                    cwd=tmp, env=env, capture_output=True, text=True, check=True)
+            first_paint_ms = round(sorted(samples)[len(samples) // 2], 1)
+            results.append({
+                "bench": "startup", "users": size,
+                "first_paint_ms": first_paint_ms,
+                "budget_ms": STARTUP_BUDGET_MS,
+                "within_budget": first_paint_ms <= STARTUP_BUDGET_MS,
+                "slowest_imports_ms": _parse_importtime(result.stderr),
+            })
+
+    result = subprocess.run([sys.executable, '-c', _HEADLESS_SCRIPT, here, *_HEADLESS_MODULES],
+                            capture_output=True, text=True, check=True)
+    import_ms, qt_loaded = result.stdout.split()
+    results.append({
+        "bench": "startup", "headless_import_ms": round(float(import_ms), 1),
+        "qt_loaded": bool(int(qt_loaded)), "within_budget": not int(qt_loaded),
+    })
+    return results
+
+
+def bench_nm(sizes):
+    """测量编译NetworkManager连接配置的耗时：首次全部生成、无变化、修改一个用户后的增量生成"""
+    import nm_profiles
+
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        with tempfile.TemporaryDirectory() as directory:
+            timings = {}
+            for phase in ('full', 'unchanged', 'one_changed'):
+                if phase == 'one_changed':
+                    config_data[0]['users'][0]['dns'] = "192.168.100.41"
+                start = time.perf_counter()
+                result = nm_profiles.compile_profiles(config_data, 'eth0', directory)
+                timings[phase] = (round((time.perf_counter() - start) * 1000, 1), len(result.written))
+        results.append({
+            "bench": "nm", "users": size,
+            "full_ms": timings['full'][0],
+            "unchanged_ms": timings['unchanged'][0],
+            "one_changed_ms": timings['one_changed'][0],
+            "rewritten": timings['one_changed'][1],
+        })
+    return results
+
+
+def bench_export(sizes):
+    """测量批量生成部署文件的吞吐量：首次全部生成到目录/归档、修改一个用户后的增量生成"""
+    import artifacts
+
+    results = []
+    for size in sizes:
+        config_data = generate_config(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            row = {"bench": "export", "users": size}
+            for target in ('dir', 'tar.gz'):
+                output = os.path.join(tmp, 'out' if target == 'dir' else 'out.tar.gz')
+                result = artifacts.export(config_data, output)
+                row[f"{target}_s"] = round(result.seconds, 2)
+                row[f"{target}_per_s"] = round(result.records_per_second)
+            config_data[0]['users'][0]['dns'] = "192.168.100.41"
+            result = artifacts.export(config_data, os.path.join(tmp, 'out'))
+            row["incremental_s"] = round(result.seconds, 2)
+            row["rewritten"] = result.written
+        results.append(row)
+    return results
+
+
+# 模拟查询命令：等待指定的毫秒数后输出一行结果
+_STUB_COMMAND = """
+import sys, time
+time.sleep(int(sys.argv[1]) / 1000)
+print("ok")
+"""
+
+
+def bench_runner(sizes):
+    """用注入延迟的模拟命令测量外部命令执行：三条只读查询依次/并发执行，以及超时结束卡住的命令
+
+    sizes参数不使用
+    """
+    import command_runner
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        stub = os.path.join(tmp, 'stub.py')
+        with open(stub, 'w') as f:
+            f.write(_STUB_COMMAND)
+        for latency_ms in (50, 200, 500):
+            commands = [[sys.executable, stub, str(latency_ms)]] * 3
+            start = time.perf_counter()
+            for argv in commands:
+                subprocess.run(argv, capture_output=True)
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            outputs = command_runner.run_concurrently(commands)
+            concurrent = time.perf_counter() - start
+            assert all(output.stdout.strip() == "ok" for output in outputs)
+            results.append({
+                "bench": "runner", "queries": len(commands), "latency_ms": latency_ms,
+                "sequential_ms": round(sequential * 1000, 1),
+                "concurrent_ms": round(concurrent * 1000, 1),
+            })
+
+        # 卡住的命令在超时后被结束
+        start = time.perf_counter()
+        try:
+            command_runner.run([sys.executable, stub, "60000"], timeout=0.5)
+        except command_runner.CommandTimeout:
+            pass
+        results.append({
+            "bench": "runner", "hung_command_timeout_ms": 500,
+            "returned_after_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+    return results
+
+
+def bench_dnsprobe(sizes):
+    """用本机的模拟DNS服务器测量延迟检测：两台延迟不同的服务器依次/并发测量，
+    无应答的服务器按超时计时，以及缓存命中时的耗时
+
+    sizes参数不使用
+    """
+    import dns_probe
+
+    results = []
+    with dns_probe.StandInResolver(delay=0.02) as first:
+        port = first.address[1]
+        with dns_probe.StandInResolver(delay=0.08, host='127.0.0.2', port=port), \
+                dns_probe.StandInResolver(drop=1000, host='127.0.0.3', port=port):
+            servers = ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+            cache = dns_probe.RttCache()
+            start = time.perf_counter()
+            for server in servers:
+                dns_probe.measure([server], port=port, timeout=0.2, cache=dns_probe.RttCache())
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            measured = dns_probe.measure(servers, port=port, timeout=0.2, cache=cache)
+            concurrent = time.perf_counter() - start
+            start = time.perf_counter()
+            dns_probe.measure(servers, port=port, timeout=0.2, cache=cache)
+            cached = time.perf_counter() - start
+            assert dns_probe.rank('127.0.0.2', '127.0.0.1', measured) == ('127.0.0.1', '127.0.0.2')
+            results.append({
+                "bench": "dnsprobe", "servers": len(servers), "attempts": dns_probe.DEFAULT_ATTEMPTS,
+                "rtt_ms": {server: round(result.rtt * 1000, 1) if result.reachable else None
+                           for server, result in measured.items()},
+                "sequential_ms": round(sequential * 1000, 1),
+                "concurrent_ms": round(concurrent * 1000, 1),
+                "cached_ms": round(cached * 1000, 3),
+            })
+    return results
+
+
+# 在独立进程中调用主窗口的方法，窗口不显示，不启动网卡监听和系统托盘
+_GUI_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+import network_config_tool
+from config_loader import cache_path_for
+from profile_records import ProfileTable
+from PyQt6.QtWidgets import QApplication
+
+app = QApplication([])
+window = network_config_tool.NetworkConfigTool()
+row = {}
+
+# 主窗口从当前目录读取config.json，先删除预解析缓存测量冷启动
+if os.path.exists(cache_path_for(window.config_file)):
+    os.remove(cache_path_for(window.config_file))
+for phase in ('cold', 'warm'):
+    start = time.perf_counter()
+    config_data = window.load_config()
+    row[f'load_config_{phase}_ms'] = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+window.profiles = ProfileTable.from_departments(config_data)
+row['build_profiles_ms'] = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+window.populate_tree()
+app.processEvents()
+row['populate_tree_ms'] = (time.perf_counter() - start) * 1000
+
+# 展开前若干个部门并点击其中的用户
+model = window.tree_model
+indexes = []
+start = time.perf_counter()
+for dept_row in range(min(model.rowCount(), 20)):
+    dept_index = model.index(dept_row, 0)
+    while model.canFetchMore(dept_index):
+        model.fetchMore(dept_index)
+    indexes.extend(model.index(user_row, 0, dept_index) for user_row in range(model.rowCount(dept_index)))
+row['expand_department_us'] = (time.perf_counter() - start) / min(model.rowCount(), 20) * 1e6
+start = time.perf_counter()
+for index in indexes:
+    window.on_item_clicked(index)
+row['on_item_clicked_us'] = (time.perf_counter() - start) / len(indexes) * 1e6
+
+# 对全部用户调用界面上的三个校验方法
+users = [user for dept in config_data for user in dept['users']]
+for name, args in (('validate_ip', [(u['ip'],) for u in users]),
+                   ('validate_subnet_mask', [(u['netmask'],) for u in users]),
+                   ('validate_gateway', [(u['gateway'], u['ip'], u['netmask']) for u in users])):
+    method = getattr(window, name)
+    start = time.perf_counter()
+    for call in args:
+        method(*call)
+    elapsed = time.perf_counter() - start
+    row[f'{name}_ns'] = elapsed / len(args) * 1e9
+    row[f'{name}_total_ms'] = elapsed * 1000
+print(json.dumps(row))
+sys.stdout.flush()
+# 跳过窗口和后台线程的清理
+os._exit(0)
+"""
+
+
+def bench_gui(sizes):
+    """在无界面的offscreen平台上测量主窗口的热点方法：load_config、populate_tree、
+    on_item_clicked以及三个validate_*方法"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            write_config(os.path.join(tmp, 'config.json'), iter_generated(size))
+            result = subprocess.run([sys.executable, '-c', _GUI_SCRIPT, here], cwd=tmp, env=env,
+                                    capture_output=True, text=True, check=True)
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            row = {"bench": "gui", "users": size}
+            row.update((key, round(value, 3 if key.endswith('_ms') else 1)) for key, value in timings.items())
+            results.append(row)
+    return results
+
+
+def bench_apply(sizes):
+    """通过模拟后端测量完整的应用流程，sizes参数不使用
+
+    netlink: 读取网卡配置、比较差异、生成并执行步骤，rtnetlink请求由FakeSocket应答；
+    helper: 经特权助手的Unix域套接字发送应用请求，由FakeBackend处理
+    """
+    import contextlib
+    import io
+    import threading
+    import apply_helper
+    import network_apply
+    import rtnetlink
+    from interface_state import diff_state, read_linux_state
+
+    rounds = 200
+    profiles = [('10.0.1.5', '255.255.255.0', '10.0.1.1', '192.168.100.40', '', '02:00:00:00:00:02'),
+                ('10.0.2.5', '255.255.255.0', '10.0.2.1', '192.168.100.40', '', '02:00:00:00:00:03')]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # 网卡始终处于启用状态的sysfs目录，等待网卡启用时立即返回
+        os.makedirs(os.path.join(tmp, 'eth0'))
+        with open(os.path.join(tmp, 'eth0', 'flags'), 'w') as f:
+            f.write('0x1003\n')
+        with open(os.path.join(tmp, 'eth0', 'operstate'), 'w') as f:
+            f.write('up\n')
+        resolv_conf = os.path.join(tmp, 'resolv.conf')
+        with open(resolv_conf, 'w') as f:
+            f.write('nameserver 192.168.100.40\n')
+
+        netlink = rtnetlink.RtNetlink(rtnetlink.FakeSocket(
+            [rtnetlink.Link(2, 'eth0', 0x1003, '02:00:00:00:00:01', 'up')], [(2, '10.0.0.5', 24)], [(2, '10.0.0.1')]))
+        changed = 0
+        start = time.perf_counter()
+        # 应用过程的日志不输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(rounds):
+                ip, netmask, gateway, dns, s_dns, mac = profiles[i % 2]
+                state = read_linux_state('eth0', resolv_conf, netlink)
+                changes = diff_state(state, ip, netmask, gateway, dns, s_dns, mac)
+                steps = network_apply.linux_steps('eth0', ip, netmask, gateway, dns, s_dns, mac, '',
+                                                  sysfs_root=tmp, changes=changes, netlink=netlink)
+                network_apply.run_steps(steps)
+                changed += len(changes)
+        elapsed = time.perf_counter() - start
+        assert changed == rounds * 3
+        results.append({"bench": "apply", "backend": "netlink", "rounds": rounds,
+                        "apply_us": round(elapsed / rounds * 1e6, 1)})
+
+        address = os.path.join(tmp, 'helper.sock')
+        server = apply_helper.HelperServer(apply_helper.FakeBackend(), address)
+        thread = threading.Thread(target=server.serve, daemon=True)
+        # 助手启动时的日志不输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            thread.start()
+            while not os.path.exists(address):
+                time.sleep(0.01)
+            with apply_helper.HelperClient(address) as client:
+                start = time.perf_counter()
+                for i in range(rounds):
+                    ip, netmask, gateway, dns, s_dns, mac = profiles[i % 2]
+                    client.apply('eth0', {'ip': ip, 'netmask': netmask, 'gateway': gateway, 'dns': dns,
+                                          's_dns': s_dns, 'mac': mac, 'mac_name': ''})
+                elapsed = time.perf_counter() - start
+            server.stop()
+            thread.join()
+        results.append({"bench": "apply", "backend": "helper", "rounds": rounds,
+                        "apply_us": round(elapsed / rounds * 1e6, 1)})
+    return results
+
+
+def bench_tracing(sizes):
+    """测量耗时区间的开销：未启用、只在内存中记录、写入跟踪文件，sizes参数不使用"""
+    import tracing
+
+    rounds = 100000
+
+    def spans():
+        start = time.perf_counter()
+        for i in range(rounds):
+            with tracing.span("bench", i=i):
+                pass
+        return round((time.perf_counter() - start) / rounds * 1e9, 1)
+
+    row = {"bench": "tracing", "spans": rounds}
+    tracing.disable()
+    row["disabled_ns"] = spans()
+    with tracing.capture():
+        row["capture_ns"] = spans()
+    with tempfile.TemporaryDirectory() as tmp:
+        tracing.enable(os.path.join(tmp, 'trace.json'))
+        try:
+            row["file_ns"] = spans()
+        finally:
+            tracing.disable()
+    return [row]
+
+
+BENCHES = {
+    'tree': bench_tree,
+    'load': bench_load,
+    'search': bench_search,
+    'records': bench_records,
+    'db': bench_db,
+    'reload': bench_reload,
+    'validate': bench_validate,
+    'lint': bench_lint,
+    'linkwait': bench_linkwait,
+    'netlink': bench_netlink,
+    'startup': bench_startup,
+    'nm': bench_nm,
+    'export': bench_export,
+    'runner': bench_runner,
+    'dnsprobe': bench_dnsprobe,
+    'gui': bench_gui,
+    'apply': bench_apply,
+    'tracing': bench_tracing,
+}
+
+
+# 作为测试参数而不是测量结果的字段，比较时跳过
+_PARAMETER_KEYS = {'latency_ms', 'link_delay_ms', 'budget_ms', 'legacy_ms', 'hung_command_timeout_ms'}
+
+
+def _row_key(row, seen):
+    """用于与上次结果对应的行标识：测试项、用户数量以及同一组中的序号"""
+    group = (row.get('bench'), row.get('users'), row.get('backend'))
+    seen[group] = seen.get(group, -1) + 1
+    return group + (seen[group],)
+
+
+def compare_results(baseline, results, threshold):
+    """与上次的结果比较耗时字段，返回[(测试项, 用户数量, 字段, 上次, 本次, 比值)]中变慢超过threshold的项"""
+    seen = {}
+    previous = {_row_key(row, seen): row for row in baseline}
+    seen = {}
+    regressions = []
+    for row in results:
+        old = previous.get(_row_key(row, seen))
+        if old is None:
+            continue
+        for key, value in row.items():
+            if (key in _PARAMETER_KEYS or not key.endswith(('_ms', '_us', '_ns'))
+                    or not isinstance(value, (int, float)) or not isinstance(old.get(key), (int, float))):
+                continue
+            if old[key] > 0 and value / old[key] > threshold:
+                regressions.append((row['bench'], row.get('users'), key, old[key], value, value / old[key]))
+    return regressions
+
+
+def run_metadata(args):
+    """结果文件中记录的运行环境，比较不同机器上的结果时参考"""
+    import platform
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "benches": args.bench,
+        "sizes": args.sizes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网络配置管理工具性能测试")
+    parser.add_argument('bench', nargs='*', default=list(BENCHES),
+                        help=f"要运行的测试项: {', '.join(BENCHES)}")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help="模拟配置的用户数量")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出全部结果")
+    parser.add_argument('--output', default=None, help="将JSON格式的结果写入文件")
+    parser.add_argument('--compare', default=None, help="与之前保存的JSON结果比较，耗时变长时以非零状态退出")
+    parser.add_argument('--threshold', type=float, default=1.2, help="视为变慢的耗时比值，默认1.2")
+    parser.add_argument('--write-config', default=None, metavar='PATH', help="只生成模拟配置文件，不运行测试")
+    parser.add_argument('--users', type=int, default=1000, help="与 --write-config 一起使用，生成的用户数量")
+    args = parser.parse_args()
+
+    if args.write_config:
+        write_config(args.write_config, iter_generated(args.users))
+        print(f"已生成 {args.users} 个用户: {args.write_config}")
+        return
+
+    unknown = [name for name in args.bench if name not in BENCHES]
+    if unknown:
+        parser.error(f"未知的测试项: {', '.join(unknown)}")
+
+    over_budget = False
+    results = []
+    for name in args.bench:
+        for row in BENCHES[name](args.sizes):
+            results.append(row)
+            if not args.json:
+                print("  ".join(f"{k}={v}" for k, v in row.items()), flush=True)
+            if row.get("within_budget") is False:
+                over_budget = True
+
+    report = {"meta": run_metadata(args), "results": results}
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline.get('results', []), results, args.threshold)
+        for bench, users, key, old, new, ratio in regressions:
+            size = f" users={users}" if users is not None else ""
+            print(f"变慢: {bench}{size} {key} {old} -> {new} ({ratio:.2f}x)", file=sys.stderr)
+        if not regressions:
+            print(f"与 {args.compare} 相比没有超过 {args.threshold:g} 倍的变慢", file=sys.stderr)
+
+    # 超出预算或比上次结果变慢时以非零状态退出，便于在持续集成中检查
+    if over_budget or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
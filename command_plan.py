@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令计划
+先把一份用户配置编译为目标系统上的命令列表，去掉重复和无效的命令，再把相邻的
+同类命令合并为一次执行：Windows上的netsh命令合并为一个netsh -f脚本，PowerShell命令
+合并为一个会话，macOS上的networksetup命令合并为一个shell脚本。Linux通过rtnetlink在
+本进程内修改配置，这里只生成等价的ip -batch命令用于预览。
+
+编译结果与运行环境无关，可在任意系统上用format_plan预览（ncmtool apply --dry-run），
+同一输入总是得到相同的文本。编译前校验地址、DNS和MAC，字段中的换行、引号等字符
+不会进入命令行或脚本
+"""
+
+import locale
+import os
+import re
+import shlex
+import tempfile
+
+import command_runner
+import validators
+from interface_state import FIELDS
+from search_index import normalize_mac
+
+
+class Command:
+    """一条命令"""
+
+    __slots__ = ('tool', 'line', 'title', 'key', 'optional')
+
+    def __init__(self, tool, line, title, key=None, optional=False):
+        # 执行命令的程序：netsh、powershell、sh、ip、resolv.conf
+        self.tool = tool
+        # 在对应程序中执行的一行命令
+        self.line = line
+        self.title = title
+        # key相同的命令只保留最后一条
+        self.key = key
+        # 可选命令失败时只记录日志
+        self.optional = optional
+
+    def __repr__(self):
+        return f"Command({self.tool!r}, {self.line!r})"
+
+
+class Batch:
+    """合并后一次执行的命令"""
+
+    def __init__(self, tool, commands):
+        self.tool = tool
+        self.commands = commands
+
+    @property
+    def lines(self):
+        return [command.line for command in self.commands]
+
+    @property
+    def title(self):
+        titles = []
+        for command in self.commands:
+            if command.title not in titles:
+                titles.append(command.title)
+        return "、".join(titles)
+
+    @property
+    def optional(self):
+        return all(command.optional for command in self.commands)
+
+
+def _dotted_netmask(netmask):
+    """netsh和networksetup只接受点分十进制的子网掩码"""
+    value = validators.parse_netmask(netmask)[0]
+    return validators.int_to_ip(value) if value is not None else netmask
+
+
+def _dns_servers(dns, s_dns):
+    """去掉空值和重复的DNS服务器"""
+    servers = []
+    for server in (dns, s_dns):
+        server = (server or '').strip()
+        if server and server not in servers:
+            servers.append(server)
+    return servers
+
+
+def ps_quote(text):
+    """PowerShell单引号字符串"""
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+# 网卡名称中不允许出现的换行等控制字符
+_CARD_FORBIDDEN = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def check_card(card, forbidden=''):
+    """检查网卡名称，forbidden为目标命令中无法转义的其他字符"""
+    if not card or _CARD_FORBIDDEN.search(card) or any(c in card for c in forbidden):
+        raise ValueError(f"网卡名称包含不允许的字符: {card!r}")
+
+
+def check_fields(ip, netmask, gateway, dns, s_dns, mac, changes):
+    """校验要写入命令的字段，无效时抛出ValueError"""
+    errors = []
+    if 'ip' in changes or 'gateway' in changes:
+        errors.extend(error for _, error in validators.validate_profile(
+            {'ip': ip, 'netmask': netmask, 'gateway': gateway}))
+    if 'dns' in changes:
+        for server, title in ((dns, "首选DNS"), (s_dns, "备用DNS")):
+            if server and not isinstance(server, str):
+                errors.append(f"{title}格式不正确: {server!r}")
+                continue
+            server = (server or '').strip()
+            if server and validators.parse_address(server, 'ip')[0] is None:
+                errors.append(f"{title}格式不正确: {server!r}")
+    if 'mac' in changes and mac:
+        text = normalize_mac(mac) if isinstance(mac, str) else ''
+        if len(text) != 12 or not all(c in '0123456789ABCDEF' for c in text):
+            errors.append(f"MAC地址格式不正确: {mac!r}")
+    if errors:
+        raise ValueError("; ".join(errors))
+
+
+def _windows_dns(card, servers):
+    """按顺序设置DNS服务器，列表为空时清除静态DNS"""
+    if not servers:
+        return [Command('netsh', f"interface ip set dnsservers name=\"{card}\" static none", "设置DNS", key='dns')]
+    commands = [Command('netsh', f"interface ip set dnsservers name=\"{card}\" static {servers[0]} primary",
+                        "设置DNS", key='dns')]
+    for index, server in enumerate(servers[1:], 2):
+        commands.append(Command('netsh', f"interface ip add dnsservers name=\"{card}\" {server} index={index}",
+                                "设置DNS", key=f'dns{index}'))
+    return commands
+
+
+def _macos_dns(service, servers):
+    """设置DNS服务器，列表为空时清除手动设置的DNS"""
+    args = ' '.join(shlex.quote(server) for server in servers) or 'Empty'
+    return Command('sh', f"networksetup -setdnsservers {service} {args}", "设置DNS", key='dns')
+
+
+def compile_windows(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS):
+    """Windows上的命令，验证配置的show命令结果不被使用，不再执行"""
+    # netsh脚本中的网卡名称放在双引号内，无法转义双引号
+    check_card(card, '"')
+    check_fields(ip, netmask, gateway, dns, s_dns, mac, changes)
+    commands = []
+    if 'ip' in changes or 'gateway' in changes:
+        commands.append(Command(
+            'netsh', f"interface ip set address name=\"{card}\" static {ip} {_dotted_netmask(netmask)} {gateway}",
+            "设置IP地址", key='address'))
+    servers = _dns_servers(dns, s_dns)
+    if 'dns' in changes and servers:
+        commands.extend(_windows_dns(card, servers))
+    if 'mac' in changes and mac:
+        # 在同一个PowerShell会话中禁用网卡、修改MAC地址并重新启用，修改失败时也会重新启用
+        name = ps_quote(card)
+        commands.append(Command(
+            'powershell',
+            f"try {{ Disable-NetAdapter -Name {name} -Confirm:$false; "
+            f"Set-NetAdapterAdvancedProperty -Name {name} -DisplayName {ps_quote(mac_name or '网络地址')} "
+            f"-DisplayValue {ps_quote(normalize_mac(mac))} }} "
+            f"finally {{ Enable-NetAdapter -Name {name} -Confirm:$false }}",
+            "修改MAC地址", key='mac', optional=True))
+    return dedupe(commands)
+
+
+def compile_macos(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS):
+    """macOS上的命令，修改MAC地址需要设备名，与原来一样不处理；每个参数都经过shell转义"""
+    check_card(card)
+    check_fields(ip, netmask, gateway, dns, s_dns, mac, changes)
+    commands = []
+    service = shlex.quote(card)
+    if 'ip' in changes or 'gateway' in changes:
+        args = ' '.join(shlex.quote(arg) for arg in (ip, _dotted_netmask(netmask), gateway))
+        commands.append(Command('sh', f"networksetup -setmanual {service} {args}", "设置IP地址", key='address'))
+    servers = _dns_servers(dns, s_dns)
+    if 'dns' in changes and servers:
+        commands.append(_macos_dns(service, servers))
+    return dedupe(commands)
+
+
+def compile_linux(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS, addresses=None):
+    """与linux_steps中rtnetlink请求等价的ip命令，只用于预览
+
+    addresses为网卡当前的IPv4地址[(IP地址, 前缀长度)]，与linux_steps一样在设置新地址前
+    按相反顺序删除其他地址；为None时（未读取网卡当前配置）只输出说明
+    """
+    check_card(card)
+    check_fields(ip, netmask, gateway, dns, s_dns, mac, changes)
+    commands = []
+    if 'mac' in changes and mac:
+        changes = set(changes) | {'gateway'}
+        mac = normalize_mac(mac).lower()
+        mac = ':'.join(mac[i:i + 2] for i in range(0, len(mac), 2))
+        commands.append(Command('ip', f"link set dev {card} down", "修改MAC地址", key='down'))
+        commands.append(Command('ip', f"link set dev {card} address {mac}", "修改MAC地址", key='mac'))
+        commands.append(Command('ip', f"link set dev {card} up", "修改MAC地址", key='up'))
+    if 'ip' in changes:
+        changes = set(changes) | {'gateway'}
+        prefixlen = validators.mask_to_cidr(validators.parse_netmask(netmask)[0])
+        if addresses is None:
+            # ip -batch忽略#之后的内容
+            commands.append(Command('ip', f"# 删除 {card} 上的其他IPv4地址（未读取网卡当前配置）", "设置IP地址"))
+        else:
+            for address, length in reversed(addresses):
+                if (address, length) != (ip, prefixlen):
+                    commands.append(Command('ip', f"address del {address}/{length} dev {card}", "设置IP地址"))
+        commands.append(Command('ip', f"address replace {ip}/{prefixlen} dev {card}", "设置IP地址", key='address'))
+    if 'gateway' in changes:
+        commands.append(Command('ip', f"route replace default via {gateway} dev {card}", "设置网关", key='route'))
+    if 'dns' in changes and (dns or '').strip():
+        # 与原来一样只写入首选和备用DNS
+        for index, server in enumerate(_dns_servers(dns, s_dns)):
+            commands.append(Command('resolv.conf', f"nameserver {server}", "设置DNS", key=f'dns{index}'))
+    return dedupe(commands)
+
+
+def compile_restore(system, card, dhcp, dns, dhcp_dns, reset_mac=False):
+    """恢复地址获取方式和DNS的命令，只用于Windows和macOS上按快照恢复
+
+    dhcp为True时改为通过DHCP获取地址；dhcp_dns为True时改为自动获取DNS，否则按顺序
+    设置dns中的服务器（为空时清除静态DNS），dns为None时不修改DNS；reset_mac为True时
+    清除Windows网卡高级属性中的网络地址，恢复出厂MAC地址
+    """
+    if system == 'Windows':
+        check_card(card, '"')
+    elif system == 'Darwin':
+        check_card(card)
+    else:
+        raise ValueError(f"不支持的操作系统: {system}")
+    servers = []
+    if not dhcp_dns and dns is not None:
+        errors = [f"DNS格式不正确: {server!r}" for server in dns
+                  if not isinstance(server, str) or validators.parse_address(server, 'ip')[0] is None]
+        if errors:
+            raise ValueError("; ".join(errors))
+        servers = list(dict.fromkeys(dns))
+    commands = []
+    service = shlex.quote(card)
+    if dhcp:
+        if system == 'Windows':
+            commands.append(Command('netsh', f"interface ip set address name=\"{card}\" source=dhcp",
+                                    "启用DHCP", key='address'))
+        else:
+            commands.append(Command('sh', f"networksetup -setdhcp {service}", "启用DHCP", key='address'))
+    if dhcp_dns:
+        if system == 'Windows':
+            commands.append(Command('netsh', f"interface ip set dnsservers name=\"{card}\" source=dhcp",
+                                    "设置DNS", key='dns'))
+        else:
+            # macOS上清除手动设置的DNS后使用DHCP提供的DNS
+            commands.append(_macos_dns(service, []))
+    elif dns is not None:
+        commands.extend(_windows_dns(card, servers) if system == 'Windows' else [_macos_dns(service, servers)])
+    if reset_mac and system == 'Windows':
+        name = ps_quote(card)
+        commands.append(Command(
+            'powershell',
+            f"try {{ Disable-NetAdapter -Name {name} -Confirm:$false; "
+            f"Reset-NetAdapterAdvancedProperty -Name {name} -RegistryKeyword 'NetworkAddress' }} "
+            f"finally {{ Enable-NetAdapter -Name {name} -Confirm:$false }}",
+            "恢复MAC地址", key='mac', optional=True))
+    return commands
+
+
+_COMPILERS = {
+    'Windows': compile_windows,
+    'Darwin': compile_macos,
+    'Linux': compile_linux,
+}
+
+
+def compile_plan(system, card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS, addresses=None):
+    """将配置编译为合并后的命令批次，字段无效时抛出ValueError
+
+    addresses为网卡当前的IPv4地址[(IP地址, 前缀长度)]，只用于Linux的预览
+    """
+    compiler = _COMPILERS.get(system)
+    if compiler is None:
+        raise ValueError(f"不支持的操作系统: {system}")
+    if system == 'Linux':
+        return merge(compile_linux(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes, addresses))
+    return merge(compiler(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes))
+
+
+def dedupe(commands):
+    """去掉重复的命令，key相同时只保留最后一条，其余命令保持原有顺序"""
+    last = {}
+    for index, command in enumerate(commands):
+        last[command.key if command.key is not None else (command.tool, command.line)] = index
+    return [command for index, command in enumerate(commands)
+            if last[command.key if command.key is not None else (command.tool, command.line)] == index]
+
+
+def merge(commands):
+    """把相邻的同类命令合并为一个批次"""
+    batches = []
+    for command in commands:
+        if batches and batches[-1].tool == command.tool:
+            batches[-1].commands.append(command)
+        else:
+            batches.append(Batch(command.tool, [command]))
+    return batches
+
+
+# 预览时各批次的执行方式
+_RUNNERS = {
+    'netsh': "netsh -f <脚本>",
+    'powershell': "powershell -NoProfile -Command <脚本>",
+    'sh': "sh -e -c <脚本>",
+    'ip': "ip -batch -",
+    'resolv.conf': "写入 /etc/resolv.conf",
+}
+
+
+def format_plan(batches):
+    """将命令批次格式化为预览文本"""
+    if not batches:
+        return "网卡当前配置与所选配置一致，无需执行任何命令\n"
+    lines = []
+    for index, batch in enumerate(batches, 1):
+        optional = "（可选）" if batch.optional else ""
+        lines.append(f"[{index}] {batch.title}{optional}: {_RUNNERS[batch.tool]}")
+        lines.extend(f"    {line}" for line in batch.lines)
+    return '\n'.join(lines) + '\n'
+
+
+def plan_to_json(batches):
+    return [{'tool': batch.tool, 'title': batch.title, 'optional': batch.optional, 'lines': batch.lines}
+            for batch in batches]
+
+
+def _check(result, title):
+    if result.returncode != 0:
+        raise RuntimeError(f"{title}失败: {(result.stderr or result.stdout or '未知错误').strip()}")
+    return result
+
+
+# 各批次的超时时间（秒），禁用/启用网卡可能需要较长时间
+BATCH_TIMEOUTS = {
+    'netsh': 60.0,
+    'powershell': 120.0,
+    'sh': 60.0,
+}
+
+
+def run_batch(batch):
+    """在一个进程中执行一个批次的全部命令，超时或被取消时结束进程"""
+    timeout = BATCH_TIMEOUTS.get(batch.tool)
+    if batch.tool == 'netsh':
+        # netsh按系统的ANSI代码页读取脚本
+        encoding = locale.getpreferredencoding(False)
+        fd, path = tempfile.mkstemp(suffix='.txt', prefix='ncmtool-netsh-')
+        try:
+            with os.fdopen(fd, 'w', encoding=encoding, errors='replace') as f:
+                f.write('\n'.join(batch.lines) + '\n')
+            return _check(command_runner.run(['netsh', '-f', path], timeout, encoding=encoding), batch.title)
+        finally:
+            os.unlink(path)
+    if batch.tool == 'powershell':
+        script = "$ErrorActionPreference = 'Stop'\n" + '\n'.join(batch.lines)
+        return _check(command_runner.run(['powershell', '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command', script],
+                                         timeout, encoding='utf-8'), batch.title)
+    if batch.tool == 'sh':
+        return _check(command_runner.run(['sh', '-e', '-c', '\n'.join(batch.lines)], timeout, encoding='utf-8'),
+                      batch.title)
+    raise ValueError(f"{batch.tool} 命令只用于预览")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部命令执行模块
+基于asyncio执行外部命令：每条命令都有超时时间，超时或取消时结束进程，
+输出超过上限的部分被丢弃；互不依赖的只读查询可以并发执行。
+对调用方提供同步接口，可在工作线程中直接使用
+"""
+
+import asyncio
+import contextlib
+import locale
+import os
+import signal
+import threading
+import time
+
+import tracing
+
+# 默认超时时间（秒）
+DEFAULT_TIMEOUT = 60.0
+
+# 标准输出和标准错误各自保留的最大字节数
+MAX_OUTPUT = 1024 * 1024
+
+# 检查取消标记的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
+
+_READ_SIZE = 64 * 1024
+
+_local = threading.local()
+
+
+class CommandError(Exception):
+    """命令无法执行、超时或被取消"""
+
+
+class CommandTimeout(CommandError):
+    """命令超过超时时间未结束，进程已被结束"""
+
+
+class CommandCancelled(CommandError):
+    """命令执行期间被取消，进程已被结束"""
+
+
+class CommandResult:
+    """命令执行结果"""
+
+    __slots__ = ('argv', 'returncode', 'stdout', 'stderr', 'truncated', 'seconds')
+
+    def __init__(self, argv, returncode, stdout, stderr, truncated, seconds):
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        # 输出超过上限被截断
+        self.truncated = truncated
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f"CommandResult({self.argv!r}, returncode={self.returncode!r}, seconds={self.seconds:.3f})"
+
+
+@contextlib.contextmanager
+def cancel_scope(event):
+    """在当前线程中执行的命令都使用event作为取消标记"""
+    previous = getattr(_local, 'event', None)
+    _local.event = event
+    try:
+        yield
+    finally:
+        _local.event = previous
+
+
+async def _read_capped(stream, limit):
+    """读取全部输出，只保留前limit字节，返回(内容, 是否截断)"""
+    chunks = []
+    size = 0
+    while True:
+        data = await stream.read(_READ_SIZE)
+        if not data:
+            break
+        if size < limit:
+            chunks.append(data[:limit - size])
+        size += len(data)
+    return b''.join(chunks), size > limit
+
+
+async def run_command(argv, timeout=DEFAULT_TIMEOUT, max_output=MAX_OUTPUT, input=None, encoding=None):
+    """执行一条命令并返回CommandResult，超时时结束进程并抛出CommandTimeout"""
+    encoding = encoding or locale.getpreferredencoding(False)
+    with tracing.span(os.path.basename(argv[0]), 'command', argv=' '.join(argv)[:200]):
+        return await _run_command(argv, timeout, max_output, input, encoding)
+
+
+async def _run_command(argv, timeout, max_output, input, encoding):
+    start = time.perf_counter()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            # 在独立的进程组中运行，超时时连同子进程一起结束
+            **({} if os.name == 'nt' else {'start_new_session': True}))
+    except OSError as e:
+        raise CommandError(f"无法执行 {argv[0]}: {str(e)}") from e
+
+    async def communicate():
+        if input is not None:
+            process.stdin.write(input.encode(encoding))
+            with contextlib.suppress(ConnectionError):
+                await process.stdin.drain()
+            process.stdin.close()
+        stdout, stderr, _ = await asyncio.gather(_read_capped(process.stdout, max_output),
+                                                 _read_capped(process.stderr, max_output),
+                                                 process.wait())
+        return stdout, stderr
+
+    try:
+        (stdout, out_truncated), (stderr, err_truncated) = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise CommandTimeout(f"{argv[0]} 超过 {timeout:g} 秒未结束") from None
+    finally:
+        # 超时或被取消时结束进程
+        if process.returncode is None:
+            _kill(process)
+            await process.wait()
+    return CommandResult(list(argv), process.returncode, stdout.decode(encoding, errors='ignore'),
+                         stderr.decode(encoding, errors='ignore'), out_truncated or err_truncated,
+                         time.perf_counter() - start)
+
+
+def _kill(process):
+    """结束进程及其子进程，子进程仍持有输出管道时读取不会结束"""
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+async def _watch_cancel(coro, event):
+    """执行coro，event被设置时取消并抛出CommandCancelled"""
+    if event is None:
+        return await coro
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        if event.is_set():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            raise CommandCancelled("已取消")
+        await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+    return task.result()
+
+
+def run(argv, timeout=DEFAULT_TIMEOUT, max_output=MAX_OUTPUT, input=None, encoding=None, cancel_event=None):
+    """同步执行一条命令，cancel_event默认为当前cancel_scope中的取消标记"""
+    event = cancel_event or getattr(_local, 'event', None)
+    return asyncio.run(_watch_cancel(run_command(argv, timeout, max_output, input, encoding), event))
+
+
+def run_concurrently(commands, timeout=DEFAULT_TIMEOUT, max_output=MAX_OUTPUT, encoding=None, cancel_event=None):
+    """并发执行多条互不依赖的命令，按顺序返回CommandResult，失败的命令对应CommandError"""
+    event = cancel_event or getattr(_local, 'event', None)
+
+    async def run_all():
+        return await asyncio.gather(*(run_command(argv, timeout, max_output, None, encoding) for argv in commands),
+                                    return_exceptions=True)
+    results = asyncio.run(_watch_cancel(run_all(), event))
+    for result in results:
+        # 只把命令本身的错误作为结果返回，其他异常照常抛出
+        if isinstance(result, BaseException) and not isinstance(result, CommandError):
+            raise result
+    return results
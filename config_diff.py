@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置差异
+比较重新加载前后的两份配置表（ProfileTable或ProfileDatabase），部门按名称、用户按姓名
+匹配（重名时按出现的先后区分），得到删除、插入和内容变化的部门和用户，配置树据此只更新
+变化的行。不依赖Qt
+"""
+
+from difflib import SequenceMatcher
+
+
+class DepartmentDiff:
+    """前后都存在的部门中用户的变化
+
+    removed为旧配置中删除的用户行号，inserted和changed为新配置中插入和内容变化的用户行号，
+    均为部门内的行号并按升序排列
+    """
+
+    __slots__ = ('old_row', 'new_row', 'removed', 'inserted', 'changed')
+
+    def __init__(self, old_row, new_row):
+        self.old_row = old_row
+        self.new_row = new_row
+        self.removed = []
+        self.inserted = []
+        self.changed = []
+
+    def __bool__(self):
+        return bool(self.removed or self.inserted or self.changed)
+
+
+class ConfigDiff:
+    """两份配置的差异，removed为旧配置中删除的部门行号，inserted为新配置中插入的部门行号，
+    kept为前后都存在的部门（按顺序）"""
+
+    def __init__(self):
+        self.removed = []
+        self.inserted = []
+        self.kept = []
+
+    def __bool__(self):
+        return bool(self.removed or self.inserted or any(self.kept))
+
+    def counts(self):
+        """(插入、删除、变化的用户数量)，增删整个部门时计入其中的全部用户"""
+        inserted = sum(len(d.inserted) for d in self.kept)
+        removed = sum(len(d.removed) for d in self.kept)
+        changed = sum(len(d.changed) for d in self.kept)
+        return inserted, removed, changed
+
+    def describe(self, old=None, new=None):
+        inserted, removed, changed = self.counts()
+        if old is not None and new is not None:
+            inserted += sum(len(new.department_rows(row)) for row in self.inserted)
+            removed += sum(len(old.department_rows(row)) for row in self.removed)
+        parts = [f"新增用户 {inserted} 个", f"删除用户 {removed} 个", f"修改用户 {changed} 个"]
+        if self.inserted or self.removed:
+            parts.append(f"新增部门 {len(self.inserted)} 个，删除部门 {len(self.removed)} 个")
+        return "，".join(parts)
+
+
+def _keys(names):
+    """名称加上重名时的序号，作为匹配用的键"""
+    seen = {}
+    keys = []
+    for name in names:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        keys.append((name, count))
+    return keys
+
+
+def _diff_department(old, old_row, new, new_row):
+    diff = DepartmentDiff(old_row, new_row)
+    same = getattr(old, 'same_department', None)
+    if same is not None and type(old) is type(new) and same(old_row, new, new_row):
+        return diff
+
+    old_values = old.department_values(old_row)
+    new_values = new.department_values(new_row)
+    if old_values == new_values:
+        return diff
+    # 姓名是values的第一项
+    matcher = SequenceMatcher(None, _keys(values[0] for values in old_values),
+                              _keys(values[0] for values in new_values), autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            diff.changed.extend(j1 + k for k in range(i2 - i1) if old_values[i1 + k] != new_values[j1 + k])
+        else:
+            diff.removed.extend(range(i1, i2))
+            diff.inserted.extend(range(j1, j2))
+    return diff
+
+
+def diff_tables(old, new):
+    """比较两份配置表，返回ConfigDiff
+
+    ProfileDatabase在每个线程中按路径打开连接，文件被替换后在新线程中读到的是新文件，
+    不能用于比较替换前后的配置库
+    """
+    diff = ConfigDiff()
+    old_keys = _keys(old.department_name(row) for row in range(old.department_count()))
+    new_keys = _keys(new.department_name(row) for row in range(new.department_count()))
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            diff.kept.extend(_diff_department(old, i1 + k, new, j1 + k) for k in range(i2 - i1))
+        else:
+            diff.removed.extend(range(i1, i2))
+            diff.inserted.extend(range(j1, j2))
+    return diff
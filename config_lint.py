@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置检查工具
+将全部用户记录载入NumPy数组，用向量化的排序/去重找出IP/MAC冲突、
+网关不在子网内、使用网络地址/广播地址以及部门子网重叠等问题
+
+用法: python config_lint.py [config.json] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import validators
+from config_loader import load_config_file
+
+# 问题类型及其说明
+ISSUE_TYPES = {
+    'invalid_ip': "IP地址无效",
+    'invalid_netmask': "子网掩码无效",
+    'invalid_gateway': "网关无效",
+    'invalid_mac': "MAC地址无效",
+    'duplicate_ip': "IP地址重复",
+    'duplicate_mac': "MAC地址重复",
+    'gateway_outside_subnet': "网关不在子网内",
+    'network_address': "IP为子网的网络地址",
+    'broadcast_address': "IP为子网的广播地址",
+    'overlapping_subnets': "部门子网重叠",
+}
+
+# MAC地址字符对应的十六进制值：分隔符为-2，记录分隔符为-3，其余非法字符为-1
+_HEX_TABLE = np.full(256, -1, np.int8)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX_TABLE[_c] = _i
+    _HEX_TABLE[bytes([_c]).upper()[0]] = _i
+_HEX_TABLE[list(b':-.')] = -2
+_HEX_TABLE[ord('\n')] = -3
+
+
+def _join_records(strings):
+    """将字符串以换行符连接为一段字节，返回(字节数组, 换行符标记)
+
+    整段处理避免为每条记录创建定长数组，非ASCII字符替换为?后按非法字符处理
+    """
+    try:
+        text = '\n'.join(strings)
+    except TypeError:
+        strings = [str(s) for s in strings]
+        text = '\n'.join(strings)
+    if text.count('\n') != len(strings) - 1:
+        text = '\n'.join(s.replace('\n', ' ') for s in strings)
+    data = np.frombuffer((text + '\n').encode('ascii', 'replace'), np.uint8)
+    return data, data == 10
+
+
+def parse_ipv4_array(strings, allow_cidr=False):
+    """向量化解析点分十进制地址，返回(uint32数组, 有效标记)
+
+    allow_cidr为True时，纯数字的0-32按前缀长度转换为掩码
+    """
+    count = len(strings)
+    if count == 0:
+        return np.zeros(0, np.uint32), np.zeros(0, bool)
+    data, is_sep = _join_records(strings)
+    digit = (data - np.uint8(48)).astype(np.int64)
+    is_digit = digit < 10
+    is_dot = data == 46
+
+    # 以点号或换行结尾的每一段为一个字节，last为每条记录最后一段的序号
+    ends = np.flatnonzero(is_dot | is_sep)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts
+    last = np.flatnonzero(is_sep[ends])
+    segments = np.diff(last, prepend=-1)
+    first = last - segments + 1
+    dots = segments - 1
+
+    # 每段最多3位数字，直接取段尾的3个字符按位权相加
+    octet = np.zeros(len(ends), np.int64)
+    for k, weight in ((1, 1), (2, 10), (3, 100)):
+        octet += np.where(lengths >= k, np.take(digit, ends - k, mode="clip") * weight, 0)
+
+    bad = np.zeros(count, bool)
+    bad_chars = np.flatnonzero(~(is_digit | is_dot | is_sep))
+    bad[np.searchsorted(ends[last], bad_chars)] = True
+    bad_segments = np.flatnonzero((lengths == 0) | (lengths > 3) | (octet > 255))
+    bad[np.searchsorted(last, bad_segments)] = True
+
+    valid = ~bad & (dots == 3)
+    rows = np.flatnonzero(valid)
+    value = np.zeros(count, np.uint32)
+    for k in range(4):
+        value[rows] = (value[rows] << np.uint32(8)) | octet[first[rows] + k].astype(np.uint32)
+
+    if allow_cidr:
+        cidr = octet[first]
+        is_cidr = ~bad & (dots == 0) & (lengths[first] <= 2) & (cidr <= 32)
+        shift = np.uint64(32) - cidr.clip(0, 32).astype(np.uint64)
+        cidr_mask = ((np.uint64(0xFFFFFFFF) << shift) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        value = np.where(is_cidr, cidr_mask, value)
+        valid |= is_cidr
+        # 点分形式的掩码必须是连续的1后面跟着连续的0
+        host_bits = ~value
+        valid &= (host_bits & (host_bits + np.uint32(1))) == 0
+
+    return value, valid
+
+
+def parse_mac_array(strings):
+    """向量化解析MAC地址（允许:-.分隔符），返回(uint64数组, 有效标记)"""
+    count = len(strings)
+    if count == 0:
+        return np.zeros(0, np.uint64), np.zeros(0, bool)
+    data, is_sep = _join_records(strings)
+    nibble = _HEX_TABLE[data]
+    is_hex = nibble >= 0
+    sep_positions = np.flatnonzero(is_sep)
+
+    bad = np.zeros(count, bool)
+    bad[np.searchsorted(sep_positions, np.flatnonzero(nibble == -1))] = True
+    # 每条记录的十六进制字符在压缩后的数组中连续排列，hex_end为其结束位置
+    hex_end = np.cumsum(is_hex, dtype=np.int64)[sep_positions]
+    digits = np.diff(hex_end, prepend=0)
+    valid = ~bad & (digits == 12)
+
+    hex_digits = nibble[is_hex].astype(np.uint64)
+    rows = np.flatnonzero(valid)
+    base = hex_end[rows] - 12
+    value = np.zeros(count, np.uint64)
+    for k in range(12):
+        value[rows] = (value[rows] << np.uint64(4)) | hex_digits[base + k]
+    return value, valid
+
+
+def _is_text(values):
+    """返回各个值是否为字符串的标记"""
+    return np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+
+
+class _Records:
+    """扁平化的用户记录及其字段数组"""
+
+    def __init__(self, config_data):
+        departments = []
+        users = []
+        counts = []
+        for dept in config_data:
+            dept_users = dept.get('users') or []
+            departments.append(dept.get('department', ''))
+            users.extend(dept_users)
+            counts.append(len(dept_users))
+        self.departments = departments
+        self.users = users
+        self.dept = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+
+        self.ip_text = [u.get('ip') or '' for u in users]
+        self.mask_text = [u.get('netmask') or '' for u in users]
+        self.gateway_text = [u.get('gateway') or '' for u in users]
+        self.mac_text = [u.get('mac') or '' for u in users]
+
+        self.ip, self.ip_valid = parse_ipv4_array(self.ip_text)
+        self.mask, self.mask_valid = parse_ipv4_array(self.mask_text, allow_cidr=True)
+        self.gateway, self.gateway_valid = parse_ipv4_array(self.gateway_text)
+        self.mac, self.mac_valid = parse_mac_array(self.mac_text)
+        # 与validators一致，数字等非字符串的值（如子网掩码写成24）视为无效，
+        # 而不是转换为字符串后按CIDR表示法接受
+        self.ip_valid &= _is_text(self.ip_text)
+        self.mask_valid &= _is_text(self.mask_text)
+        self.gateway_valid &= _is_text(self.gateway_text)
+        self.mac_valid &= _is_text(self.mac_text)
+        self.mac_present = np.fromiter(map(bool, self.mac_text), dtype=bool, count=len(users))
+
+    def describe(self, rows):
+        """返回指定行的(部门, 用户名)列表"""
+        return [{"department": self.departments[self.dept[row]],
+                 "name": self.users[row].get('name', '')} for row in rows]
+
+
+def _duplicate_groups(values, valid):
+    """返回取值重复的行号分组"""
+    rows = np.flatnonzero(valid)
+    if len(rows) < 2:
+        return []
+    order = np.argsort(values[rows], kind='stable')
+    sorted_values = values[rows][order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_values[1:] != sorted_values[:-1])))
+    ends = np.append(starts[1:], len(sorted_values))
+    multi = (ends - starts) > 1
+    return [rows[order[start:end]] for start, end in zip(starts[multi], ends[multi])]
+
+
+def _issue(kind, detail, records):
+    return {"type": kind, "message": f"{ISSUE_TYPES[kind]}: {detail}", "records": records}
+
+
+def _overlapping_subnets(rec, ok):
+    """找出不同部门之间相互重叠的子网"""
+    mask = rec.mask[ok]
+    network = (rec.ip[ok] & mask).astype(np.uint64)
+    # 有效掩码的主机位数加1恰为2的幂
+    host_count = (~mask).astype(np.float64) + 1
+    prefix = (32 - np.log2(host_count)).astype(np.uint64)
+    dept = rec.dept[ok].astype(np.uint64)
+    if len(network) == 0:
+        return []
+
+    # 每个部门的不重复子网，打包为一个64位键后去重排序
+    keys = np.unique((network << np.uint64(32)) | (prefix << np.uint64(26)) | dept)
+    start = keys >> np.uint64(32)
+    block_prefix = ((keys >> np.uint64(26)) & np.uint64(0x3F)).astype(np.int64)
+    owner_dept = (keys & np.uint64(0x3FFFFFF)).astype(np.int64)
+    subnet = keys >> np.uint64(26)
+
+    # 相同子网出现在多个部门中：键按子网排序后相同子网相邻，每组内两两配对
+    _, first, counts = np.unique(subnet, return_index=True, return_counts=True)
+    hits = []
+    for start_row, count in zip(first[counts > 1], counts[counts > 1]):
+        run = np.arange(start_row, start_row + count)
+        a, b = np.triu_indices(count, 1)
+        hits.append((run[a], run[b]))
+
+    # CIDR子网之间只有包含和不相交两种关系：对出现过的每个较短前缀，
+    # 计算各子网在该前缀下的上级子网，在有序键中找出等于该上级子网的全部键
+    for q in np.unique(block_prefix):
+        rows = np.flatnonzero(block_prefix > q)
+        if len(rows) == 0:
+            continue
+        q_mask = np.uint64((0xFFFFFFFF << (32 - int(q))) & 0xFFFFFFFF)
+        parent = ((start[rows] & q_mask) << np.uint64(6)) | np.uint64(q)
+        left = np.searchsorted(subnet, parent, side='left')
+        lengths = np.searchsorted(subnet, parent, side='right') - left
+        found = lengths > 0
+        rows, left, lengths = rows[found], left[found], lengths[found]
+        if len(rows) == 0:
+            continue
+        # 展开为(上级子网的键, 子网的键)对
+        children = np.repeat(rows, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        parents = np.repeat(left, lengths) + offsets
+        match = owner_dept[parents] != owner_dept[children]
+        hits.append((parents[match], children[match]))
+
+    pairs = {}
+    for parents, children in hits:
+        for a, b in zip(parents, children):
+            key = tuple(sorted((int(owner_dept[a]), int(owner_dept[b]))))
+            pairs.setdefault(key, (a, b))
+    issues = []
+    for a, b in pairs.values():
+        subnet_a = f"{validators.int_to_ip(int(start[a]))}/{block_prefix[a]}"
+        subnet_b = f"{validators.int_to_ip(int(start[b]))}/{block_prefix[b]}"
+        issues.append(_issue('overlapping_subnets', f"{subnet_a} 与 {subnet_b}", [
+            {"department": rec.departments[owner_dept[a]], "name": ""},
+            {"department": rec.departments[owner_dept[b]], "name": ""},
+        ]))
+    return issues
+
+
+def lint_config(config_data):
+    """检查整个配置，返回问题列表"""
+    rec = _Records(config_data)
+    issues = []
+
+    # 格式错误的字段，具体原因由校验模块给出
+    for kind, field, valid in (('invalid_ip', 'ip', rec.ip_valid),
+                               ('invalid_netmask', 'netmask', rec.mask_valid),
+                               ('invalid_gateway', 'gateway', rec.gateway_valid)):
+        for row in np.flatnonzero(~valid):
+            messages = [error for name, error in validators.validate_profile(rec.users[row])
+                        if name == field]
+            detail = messages[0] if messages else repr(rec.users[row].get(field))
+            issues.append(_issue(kind, detail, rec.describe([row])))
+    for row in np.flatnonzero(rec.mac_present & ~rec.mac_valid):
+        issues.append(_issue('invalid_mac', rec.mac_text[row], rec.describe([row])))
+
+    # 重复的IP和MAC
+    for group in _duplicate_groups(rec.ip, rec.ip_valid):
+        issues.append(_issue('duplicate_ip', rec.ip_text[group[0]], rec.describe(group)))
+    for group in _duplicate_groups(rec.mac, rec.mac_valid):
+        issues.append(_issue('duplicate_mac', rec.mac_text[group[0]], rec.describe(group)))
+
+    # 子网一致性
+    ok = rec.ip_valid & rec.mask_valid
+    network = rec.ip & rec.mask
+    broadcast = rec.ip | ~rec.mask
+    # /31和/32没有网络地址和广播地址
+    has_hosts = (~rec.mask) > 1
+    for row in np.flatnonzero(ok & rec.gateway_valid & ((rec.gateway & rec.mask) != network)):
+        issues.append(_issue('gateway_outside_subnet',
+                             f"{rec.gateway_text[row]} 不在 {rec.ip_text[row]}/{rec.mask_text[row]} 子网内",
+                             rec.describe([row])))
+    for row in np.flatnonzero(ok & has_hosts & (rec.ip == network)):
+        issues.append(_issue('network_address', rec.ip_text[row], rec.describe([row])))
+    for row in np.flatnonzero(ok & has_hosts & (rec.ip == broadcast)):
+        issues.append(_issue('broadcast_address', rec.ip_text[row], rec.describe([row])))
+
+    issues.extend(_overlapping_subnets(rec, ok))
+    return issues
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查配置文件中的IP/MAC冲突和子网一致性")
+    parser.add_argument('config', nargs='?', default='config.json', help="配置文件路径")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    args = parser.parse_args(argv)
+
+    try:
+        config_data = load_config_file(args.config)
+    except Exception as e:
+        print(f"加载配置文件失败: {str(e)}", file=sys.stderr)
+        return 2
+
+    issues = lint_config(config_data)
+    if args.json:
+        json.dump(issues, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for issue in issues:
+            who = ", ".join(f"{r['department']}/{r['name']}" if r['name'] else r['department']
+                            for r in issue['records'])
+            print(f"[{issue['type']}] {issue['message']} ({who})")
+        print(f"共发现 {len(issues)} 个问题")
+    return 1 if issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置加载模块
+流式解析config.json并按部门逐个产出，同时在配置文件旁写入二进制预解析缓存，
+缓存以源文件的修改时间和大小为键，后续启动时通过内存映射读取
+"""
+
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import tracing
+
+# 缓存文件头：魔数、格式标签、源文件修改时间(ns)、源文件大小、部门数量
+CACHE_MAGIC = b'NCMCACHE'
+CACHE_FORMAT = 1
+CACHE_SUFFIX = '.cache'
+_HEADER = struct.Struct('<8s16sqqI')
+_OFFSET = struct.Struct('<Q')
+# 写入缓存时持有，同一时间只有一个线程写入临时文件
+_cache_lock = threading.Lock()
+
+# 流式解析时每次读取的字符数
+CHUNK_SIZE = 1 << 20
+
+
+class ConfigFormatError(ValueError):
+    """配置文件结构不正确"""
+
+
+def cache_path_for(config_path):
+    """返回配置文件对应的缓存文件路径"""
+    return config_path + CACHE_SUFFIX
+
+
+def _cache_tag():
+    """缓存格式标签，marshal格式随解释器版本变化，需一并校验"""
+    tag = f"{CACHE_FORMAT}-{sys.implementation.cache_tag}-{marshal.version}"
+    return tag.encode('ascii')[:16].ljust(16, b'\0')
+
+
+class _JsonArrayReader:
+    """逐块读取顶层JSON数组，逐个解码数组元素"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self, size=None):
+        """读取更多数据，已消费的部分从缓冲区丢弃"""
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(max(size or 0, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """跳过空白并返回下一个字符，文件结束时返回空字符串"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read_more():
+                return ''
+
+    def expect(self, chars):
+        """读取下一个非空白字符并检查是否为期望的字符之一"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """解码下一个数组元素，数据不完整时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # 元素跨越了缓冲区边界，按当前长度加倍读取后重试
+                if not self._read_more(len(self.buf) - self.pos):
+                    raise
+                continue
+            # 数字等标量可能在缓冲区末尾被截断
+            if end == len(self.buf) and self._read_more():
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self):
+        if self.peek() != '[':
+            raise ConfigFormatError("配置文件格式不正确，应为列表格式")
+        self.pos += 1
+        if self.peek() == ']':
+            self.pos += 1
+        else:
+            while True:
+                yield self.decode()
+                if self.expect(',]') == ']':
+                    break
+        if self.peek():
+            raise json.JSONDecodeError("Extra data", self.buf, self.pos)
+
+
+def iter_json_departments(config_path, chunk_size=CHUNK_SIZE):
+    """流式解析配置文件，逐个产出部门字典"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        yield from _JsonArrayReader(f, chunk_size)
+
+
+def read_cache(config_path, stat=None):
+    """读取内存映射缓存，缓存缺失或过期时返回None"""
+    path = cache_path_for(config_path)
+    if stat is None:
+        stat = os.stat(config_path)
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    with f, tracing.span("打开配置缓存", path=path):
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError("缓存文件不完整")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            _remove_cache(path)
+            return None
+    magic, tag, mtime_ns, src_size, count = _HEADER.unpack_from(mm, 0)
+    table_end = _HEADER.size + (count + 1) * _OFFSET.size
+    offsets = None
+    if (magic == CACHE_MAGIC and tag == _cache_tag()
+            and mtime_ns == stat.st_mtime_ns and src_size == stat.st_size
+            and table_end <= len(mm)):
+        offsets = struct.unpack_from(f'<{count + 1}Q', mm, _HEADER.size)
+        # 各部门的数据应紧接在偏移表之后依次排列，恰好到文件末尾
+        if (offsets[0] != table_end or offsets[-1] != len(mm)
+                or any(start > end for start, end in zip(offsets, offsets[1:]))):
+            offsets = None
+    if offsets is None:
+        mm.close()
+        _remove_cache(path)
+        return None
+    return _CachedConfig(mm, offsets, path)
+
+
+class CacheCorruptError(Exception):
+    """缓存中某个部门的数据无法解码"""
+
+
+class _CachedConfig:
+    """内存映射的预解析缓存，按部门逐个解码，用完后通过close或with语句关闭映射"""
+
+    def __init__(self, mm, offsets, path):
+        self.mm = mm
+        self.offsets = offsets
+        self.path = path
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+
+    def __iter__(self):
+        for start, end in zip(self.offsets, self.offsets[1:]):
+            try:
+                dept = marshal.loads(self.mm[start:end])
+            except (EOFError, ValueError, TypeError) as e:
+                raise CacheCorruptError(str(e)) from e
+            if not isinstance(dept, dict):
+                raise CacheCorruptError("缓存中的部门数据不正确")
+            yield dept
+
+
+def write_cache(config_path, config_data, stat):
+    """将已解析的配置写入缓存，写入失败时忽略"""
+    path = cache_path_for(config_path)
+    # 界面和重新加载线程可能同时写入同一个临时文件
+    with _cache_lock, tracing.span("写入配置缓存", path=path, departments=len(config_data)):
+        _write_cache(path, config_data, stat)
+
+
+def _write_cache(path, config_data, stat):
+    blobs = [marshal.dumps(dept) for dept in config_data]
+    offset = _HEADER.size + (len(blobs) + 1) * _OFFSET.size
+    offsets = [offset]
+    for blob in blobs:
+        offset += len(blob)
+        offsets.append(offset)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(CACHE_MAGIC, _cache_tag(), stat.st_mtime_ns,
+                                 stat.st_size, len(blobs)))
+            f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError) as e:
+        print(f"写入配置缓存失败: {str(e)}")
+        _remove_cache(tmp_path)
+
+
+def _remove_cache(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_departments(config_path, use_cache=True, cache_in_background=False):
+    """逐个产出部门字典，优先读取缓存，完整解析源文件后写入缓存；SQLite配置库直接按部门查询
+
+    cache_in_background为True时在后台线程中写入缓存，界面线程分批加载时最后一批不被写入阻塞
+    """
+    from profile_db import is_database, ProfileDatabase
+    if is_database(config_path):
+        database = ProfileDatabase(config_path)
+        try:
+            yield from database.iter_departments()
+        finally:
+            database.close()
+        return
+
+    stat = os.stat(config_path)
+    # 缓存读到一半发现损坏时，已经产出的部门在重新解析源文件时跳过
+    skip = 0
+    if use_cache:
+        cached = read_cache(config_path, stat)
+        if cached is not None:
+            with cached:
+                try:
+                    for dept in cached:
+                        yield dept
+                        skip += 1
+                    return
+                except CacheCorruptError as e:
+                    print(f"配置缓存已损坏，重新解析配置文件: {str(e)}")
+            _remove_cache(cached.path)
+
+    config_data = []
+    for dept in iter_json_departments(config_path):
+        if not isinstance(dept, dict):
+            raise ConfigFormatError("配置文件格式不正确，列表元素应为部门对象")
+        config_data.append(dept)
+        if len(config_data) > skip:
+            yield dept
+
+    if use_cache:
+        if cache_in_background:
+            threading.Thread(target=write_cache, args=(config_path, config_data, stat), daemon=True).start()
+        else:
+            write_cache(config_path, config_data, stat)
+
+
+def load_config_file(config_path, use_cache=True):
+    """一次性加载全部部门配置"""
+    with tracing.span("加载配置", path=config_path):
+        return list(iter_departments(config_path, use_cache))
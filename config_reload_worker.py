@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台重新加载配置线程
+配置文件被修改后在工作线程中重新解析，并与当前配置比较得到差异，解析期间不阻塞界面。
+当前配置为配置库时不比较差异：配置库文件已被替换，本线程新打开的连接读到的是新文件
+"""
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from config_diff import diff_tables
+from config_loader import iter_departments
+from profile_db import ProfileDatabase, is_database
+from profile_records import ProfileTable
+import tracing
+
+
+class ConfigReloadWorker(QObject):
+    """重新加载配置的工作对象，需移动到独立的QThread中运行"""
+
+    # 新的配置表、ConfigDiff（当前配置为配置库时为None，由界面整体替换配置树）
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, config_file, current):
+        """current为界面正在使用的配置表，加载完成后不再修改，可在本线程中读取"""
+        super().__init__()
+        self.config_file = config_file
+        self.current = current
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            with tracing.span("重新加载配置", path=self.config_file):
+                if is_database(self.config_file):
+                    table = ProfileDatabase(self.config_file)
+                else:
+                    table = ProfileTable.from_departments(iter_departments(self.config_file))
+            if isinstance(self.current, ProfileDatabase):
+                diff = None
+            else:
+                with tracing.span("比较配置"):
+                    diff = diff_tables(self.current, table)
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.finished.emit(table, diff)
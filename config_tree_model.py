@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置树模型
+基于QAbstractItemModel的部门/用户树，用户节点在展开时按批次懒加载
+"""
+
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex
+from profile_records import ProfileTable
+
+# 部门节点索引使用的内部指针标记
+_DEPARTMENT = object()
+
+
+def _blocks(rows, reverse=False):
+    """把升序的行号分为连续的区间[start, stop)"""
+    blocks = []
+    for row in rows:
+        if blocks and blocks[-1][1] == row:
+            blocks[-1][1] = row + 1
+        else:
+            blocks.append([row, row + 1])
+    return reversed(blocks) if reverse else blocks
+
+
+class _DepartmentNode:
+    """部门节点，rows为显示的用户在配置表中的行号，fetched为已加载到视图中的用户数量"""
+    __slots__ = ('row', 'name', 'rows', 'fetched')
+
+    def __init__(self, row, name, rows):
+        self.row = row
+        self.name = name
+        self.rows = rows
+        self.fetched = 0
+
+
+class ConfigTreeModel(QAbstractItemModel):
+    """部门/用户两级配置树模型
+
+    数据保存在ProfileTable或SQLite配置库中，用户节点只记录行号，UserRole返回该行号
+    """
+
+    # 每次展开或滚动到底部时加载的用户数量
+    FETCH_BATCH = 256
+
+    def __init__(self, table=None, parent=None):
+        super().__init__(parent)
+        self._table = ProfileTable()
+        self._nodes = []
+        # 搜索过滤条件，None表示显示全部
+        self._filter = None
+        if table is not None:
+            self.set_config(table)
+
+    @property
+    def table(self):
+        return self._table
+
+    def _department_node(self, dept_row, row):
+        return _DepartmentNode(row, self._table.department_name(dept_row), self._table.department_rows(dept_row))
+
+    def set_config(self, table):
+        """重置模型数据，只创建部门节点；table为ProfileTable、ProfileDatabase或配置文件中的部门列表"""
+        if isinstance(table, (list, tuple)):
+            table = ProfileTable.from_departments(table)
+        self.beginResetModel()
+        self._table = table
+        self._filter = None
+        self._nodes = [self._department_node(row, row) for row in range(table.department_count())]
+        self.endResetModel()
+
+    def departments_added(self):
+        """配置表追加部门后调用，在末尾插入新的部门节点，用于配置流式加载"""
+        start = len(self._nodes)
+        count = self._table.department_count() - start
+        if count <= 0 or self._filter is not None:
+            return
+        self.beginInsertRows(QModelIndex(), start, start + count - 1)
+        self._nodes.extend(self._department_node(start + i, start + i) for i in range(count))
+        self.endInsertRows()
+
+    def is_filtered(self):
+        """是否正在显示搜索结果"""
+        return self._filter is not None
+
+    def set_filter(self, matches):
+        """只显示搜索命中的用户，matches为(部门行号, 用户行号)列表，None表示取消过滤"""
+        self.beginResetModel()
+        self._filter = matches
+        if matches is None:
+            self._nodes = [self._department_node(row, row) for row in range(self._table.department_count())]
+        else:
+            grouped = {}
+            for dept_row, user_row in matches:
+                grouped.setdefault(dept_row, []).append(user_row)
+            self._nodes = []
+            for dept_row in sorted(grouped):
+                node = _DepartmentNode(len(self._nodes), self._table.department_name(dept_row),
+                                       [self._table.row_of(dept_row, user_row) for user_row in grouped[dept_row]])
+                # 命中结果数量有限，直接全部加载
+                node.fetched = len(node.rows)
+                self._nodes.append(node)
+        self.endResetModel()
+
+    def apply_diff(self, table, diff):
+        """切换到重新加载的配置表，只删除、插入和刷新有变化的行，展开和选中状态保持不变
+
+        diff为config_diff.diff_tables(当前配置表, table)的结果。显示搜索结果时直接重置，
+        由调用方重新搜索
+        """
+        if self._filter is not None:
+            self.set_config(table)
+            return
+        root = QModelIndex()
+        old_nodes = list(self._nodes)
+        kept = [(old_nodes[d.old_row], d) for d in diff.kept]
+
+        # 先在旧配置表上删除行
+        for start, stop in _blocks(diff.removed, reverse=True):
+            self.beginRemoveRows(root, start, stop - 1)
+            del self._nodes[start:stop]
+            self._renumber(start)
+            self.endRemoveRows()
+        for node, d in kept:
+            if d.removed:
+                node.rows = list(node.rows)
+            for start, stop in _blocks(d.removed, reverse=True):
+                # 尚未加载到视图中的用户直接删除
+                visible = min(stop, node.fetched)
+                if start < visible:
+                    self.beginRemoveRows(self.createIndex(node.row, 0, _DEPARTMENT), start, visible - 1)
+                del node.rows[start:stop]
+                if start < visible:
+                    node.fetched -= visible - start
+                    self.endRemoveRows()
+
+        # 保留的用户换成新配置表中的行号，顺序不变
+        self._table = table
+        for node, d in kept:
+            rows = table.department_rows(d.new_row)
+            if d.inserted:
+                inserted = set(d.inserted)
+                node.rows = [rows[i] for i in range(len(rows)) if i not in inserted]
+            else:
+                node.rows = rows
+
+        # 再按新配置表中的位置插入行
+        for start, stop in _blocks(diff.inserted):
+            self.beginInsertRows(root, start, stop - 1)
+            self._nodes[start:start] = [self._department_node(row, row) for row in range(start, stop)]
+            self._renumber(start)
+            self.endInsertRows()
+        for node, d in kept:
+            rows = table.department_rows(d.new_row)
+            for start, stop in _blocks(d.inserted):
+                # 插入到已加载的用户之间，或部门已全部加载时才通知视图
+                visible = start < node.fetched or node.fetched == len(node.rows)
+                if visible:
+                    self.beginInsertRows(self.createIndex(node.row, 0, _DEPARTMENT), start, stop - 1)
+                node.rows[start:start] = rows[start:stop]
+                if visible:
+                    node.fetched += stop - start
+                    self.endInsertRows()
+            node.rows = rows
+            for start, stop in _blocks(d.changed):
+                stop = min(stop, node.fetched)
+                if start < stop:
+                    parent = self.createIndex(node.row, 0, _DEPARTMENT)
+                    self.dataChanged.emit(self.index(start, 0, parent), self.index(stop - 1, 0, parent))
+
+    def _renumber(self, start):
+        for row in range(start, len(self._nodes)):
+            self._nodes[row].row = row
+
+    def _node(self, index):
+        """返回索引对应的部门节点，用户索引返回其所属部门"""
+        pointer = index.internalPointer()
+        if pointer is _DEPARTMENT:
+            return self._nodes[index.row()]
+        return pointer
+
+    def is_department(self, index):
+        """判断索引是否为部门节点"""
+        return index.isValid() and index.internalPointer() is _DEPARTMENT
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, _DEPARTMENT)
+        if self.is_department(parent):
+            return self.createIndex(row, column, self._nodes[parent.row()])
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or self.is_department(index):
+            return QModelIndex()
+        node = index.internalPointer()
+        return self.createIndex(node.row, 0, _DEPARTMENT)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._nodes)
+        if self.is_department(parent):
+            return self._nodes[parent.row()].fetched
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._nodes) > 0
+        if self.is_department(parent):
+            return len(self._nodes[parent.row()].rows) > 0
+        return False
+
+    def canFetchMore(self, parent):
+        if not self.is_department(parent):
+            return False
+        node = self._nodes[parent.row()]
+        return node.fetched < len(node.rows)
+
+    def fetchMore(self, parent):
+        if not self.is_department(parent):
+            return
+        node = self._nodes[parent.row()]
+        remaining = len(node.rows) - node.fetched
+        count = min(self.FETCH_BATCH, remaining)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, node.fetched, node.fetched + count - 1)
+        node.fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if self.is_department(index):
+            if role == Qt.ItemDataRole.DisplayRole:
+                return self._nodes[index.row()].name
+            return None
+        row = self._node(index).rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._table.name(row)
+        if role == Qt.ItemDataRole.UserRole:
+            return row
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return "配置列表"
+        return None
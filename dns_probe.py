@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DNS服务器延迟检测
+同时向全部候选DNS服务器发送UDP查询（asyncio），测量每台服务器的往返时间，
+用于在应用配置前发现响应慢或无法访问的首选DNS，必要时与备用DNS交换顺序。
+测量结果按服务器缓存一段时间，界面和命令行重复检测时不再发送查询。
+
+StandInResolver是在本机UDP端口上应答的模拟DNS服务器，可设置应答延迟和丢弃的查询，
+不需要网络即可测试
+"""
+
+import asyncio
+import contextlib
+import os
+import random
+import socket
+import statistics
+import struct
+import threading
+import time
+
+DNS_PORT = 53
+
+# 默认查询的域名，可通过环境变量NCMTOOL_DNS_PROBE_NAME修改
+DEFAULT_QUERY_NAME = os.environ.get('NCMTOOL_DNS_PROBE_NAME', 'example.com')
+
+# 每台服务器的查询次数和单次查询的超时时间（秒）
+DEFAULT_ATTEMPTS = 3
+DEFAULT_TIMEOUT = 1.0
+
+# 测量结果的缓存时间（秒）
+CACHE_TTL = 300.0
+
+# 备用DNS的延迟低于首选DNS的该比例时才建议交换，避免测量误差导致顺序来回变化
+RANK_RATIO = 0.8
+
+_QTYPE_A = 1
+_QCLASS_IN = 1
+# 视为服务器正常应答的返回码：NOERROR、NXDOMAIN
+_OK_RCODES = (0, 3)
+
+
+def build_query(name, query_id):
+    """构造查询A记录的DNS请求报文（递归查询）"""
+    labels = b''.join(bytes([len(label)]) + label for label in
+                      (part.encode('idna') for part in name.strip('.').split('.') if part))
+    return struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + labels + b'\0' + struct.pack('!HH', _QTYPE_A,
+                                                                                              _QCLASS_IN)
+
+
+def check_response(data, query):
+    """应答是否对应query且服务器正常处理了查询"""
+    if len(data) < len(query) or data[:2] != query[:2]:
+        return False
+    flags = struct.unpack_from('!H', data, 2)[0]
+    # 必须是应答报文，且问题部分与查询一致
+    if not flags & 0x8000 or data[12:len(query)] != query[12:]:
+        return False
+    return flags & 0x000f in _OK_RCODES
+
+
+class ProbeResult:
+    """一台DNS服务器的测量结果"""
+
+    __slots__ = ('server', 'rtts', 'failures', 'error', 'measured_at')
+
+    def __init__(self, server, rtts=None, failures=0, error=None, measured_at=None):
+        self.server = server
+        # 各次成功查询的往返时间（秒）
+        self.rtts = rtts or []
+        # 超时或应答无效的查询次数
+        self.failures = failures
+        # 无法发送查询时的错误信息
+        self.error = error
+        self.measured_at = measured_at if measured_at is not None else time.monotonic()
+
+    @property
+    def reachable(self):
+        return bool(self.rtts)
+
+    @property
+    def rtt(self):
+        """往返时间的中位数（秒），无法访问时为None"""
+        return statistics.median(self.rtts) if self.rtts else None
+
+    def describe(self):
+        if self.error:
+            return f"{self.server}: {self.error}"
+        if not self.rtts:
+            return f"{self.server}: 无应答"
+        loss = f"，丢失 {self.failures} 次" if self.failures else ""
+        return f"{self.server}: {self.rtt * 1000:.1f} ms{loss}"
+
+    def __repr__(self):
+        return f"ProbeResult({self.server!r}, rtts={self.rtts!r}, failures={self.failures!r})"
+
+
+class _ProbeProtocol(asyncio.DatagramProtocol):
+    """把收到的应答交给等待中的查询"""
+
+    def __init__(self):
+        self.waiter = None
+        self.query = None
+
+    def datagram_received(self, data, addr):
+        if self.waiter is not None and not self.waiter.done() and check_response(data, self.query):
+            self.waiter.set_result(time.perf_counter())
+
+    def error_received(self, exc):
+        # ICMP端口不可达等错误，等待超时即可
+        pass
+
+
+async def probe_server(server, name=DEFAULT_QUERY_NAME, attempts=DEFAULT_ATTEMPTS, timeout=DEFAULT_TIMEOUT,
+                       port=DNS_PORT):
+    """向一台服务器依次发送attempts次查询，返回ProbeResult"""
+    loop = asyncio.get_running_loop()
+    result = ProbeResult(server)
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(_ProbeProtocol, remote_addr=(server, port))
+    except (OSError, ValueError) as e:
+        result.error = f"无法发送查询: {str(e)}"
+        result.failures = attempts
+        return result
+    try:
+        for _ in range(attempts):
+            protocol.query = build_query(name, random.getrandbits(16))
+            protocol.waiter = loop.create_future()
+            start = time.perf_counter()
+            transport.sendto(protocol.query)
+            try:
+                received = await asyncio.wait_for(protocol.waiter, timeout)
+            except asyncio.TimeoutError:
+                result.failures += 1
+            else:
+                result.rtts.append(received - start)
+    finally:
+        transport.close()
+    result.measured_at = time.monotonic()
+    return result
+
+
+async def probe_all(servers, name=DEFAULT_QUERY_NAME, attempts=DEFAULT_ATTEMPTS, timeout=DEFAULT_TIMEOUT,
+                    port=DNS_PORT):
+    """同时测量多台服务器，按输入顺序返回ProbeResult"""
+    return await asyncio.gather(*(probe_server(server, name, attempts, timeout, port) for server in servers))
+
+
+class RttCache:
+    """按服务器缓存测量结果，超过ttl后重新测量"""
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def get(self, server, port=DNS_PORT):
+        """未过期的测量结果，没有时返回None"""
+        with self._lock:
+            result = self._results.get((server, port))
+        if result is None or time.monotonic() - result.measured_at > self.ttl:
+            return None
+        return result
+
+    def put(self, result, port=DNS_PORT):
+        with self._lock:
+            self._results[(result.server, port)] = result
+
+    def invalidate(self):
+        with self._lock:
+            self._results.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """获取全局共享的测量结果缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RttCache()
+        return _cache
+
+
+def _servers(servers):
+    """去掉空值和重复的服务器，保持原有顺序"""
+    result = []
+    for server in servers:
+        server = (server or '').strip()
+        if server and server not in result:
+            result.append(server)
+    return result
+
+
+def measure(servers, name=DEFAULT_QUERY_NAME, attempts=DEFAULT_ATTEMPTS, timeout=DEFAULT_TIMEOUT, port=DNS_PORT,
+            cache=None, refresh=False):
+    """测量多台服务器的延迟，返回{服务器: ProbeResult}；缓存中未过期的结果不再测量"""
+    cache = cache or get_cache()
+    servers = _servers(servers)
+    results = {}
+    pending = []
+    for server in servers:
+        cached = None if refresh else cache.get(server, port)
+        if cached is not None:
+            results[server] = cached
+        else:
+            pending.append(server)
+    if pending:
+        for result in asyncio.run(probe_all(pending, name, attempts, timeout, port)):
+            cache.put(result, port)
+            results[result.server] = result
+    return {server: results[server] for server in servers}
+
+
+def should_swap(primary, backup):
+    """根据测量结果判断是否应把备用DNS作为首选"""
+    if backup is None or not backup.reachable:
+        return False
+    if primary is None or not primary.reachable:
+        return True
+    return backup.rtt < primary.rtt * RANK_RATIO
+
+
+def rank(dns, s_dns, results):
+    """按测量结果调整首选和备用DNS的顺序，返回(首选, 备用)"""
+    primary = results.get((dns or '').strip())
+    backup = results.get((s_dns or '').strip())
+    if (s_dns or '').strip() and should_swap(primary, backup):
+        return s_dns, dns
+    return dns, s_dns
+
+
+def warnings(dns, s_dns, results):
+    """根据测量结果生成提示信息，没有问题时返回空列表"""
+    messages = []
+    primary = results.get((dns or '').strip())
+    backup = results.get((s_dns or '').strip())
+    if primary is not None and not primary.reachable:
+        messages.append(f"首选DNS {dns} 无应答")
+    if backup is not None and not backup.reachable:
+        messages.append(f"备用DNS {s_dns} 无应答")
+    if primary is not None and primary.reachable and should_swap(primary, backup):
+        messages.append(f"备用DNS {s_dns}（{backup.rtt * 1000:.1f} ms）比首选DNS {dns}"
+                        f"（{primary.rtt * 1000:.1f} ms）响应更快")
+    return messages
+
+
+def _build_answer(query):
+    """对查询返回一条A记录"""
+    question_end = 12
+    while query[question_end]:
+        question_end += query[question_end] + 1
+    question_end += 5
+    header = query[:2] + struct.pack('!HHHHH', 0x8180, 1, 1, 0, 0)
+    answer = struct.pack('!HHHIH', 0xc00c, _QTYPE_A, _QCLASS_IN, 60, 4) + socket.inet_aton('127.0.0.1')
+    return header + query[12:question_end] + answer
+
+
+class StandInResolver:
+    """在本机UDP端口上应答的模拟DNS服务器，用于测试
+
+    delay为每次应答前的延迟（秒），drop为开头丢弃不应答的查询数量，
+    queries记录收到的查询数量
+    """
+
+    def __init__(self, delay=0.0, drop=0, host='127.0.0.1', port=0):
+        self.delay = delay
+        self.drop = drop
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                query, addr = self.sock.recvfrom(512)
+            except OSError:
+                # 套接字已关闭
+                return
+            if addr is None:
+                # shutdown后recvfrom不再阻塞，返回没有来源地址的空数据
+                return
+            self.queries += 1
+            if self.queries <= self.drop or len(query) < 17:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                self.sock.sendto(_build_answer(query), addr)
+            except (OSError, IndexError):
+                continue
+
+    def close(self):
+        # 关闭套接字后recvfrom出错，服务线程随之结束
+        with contextlib.suppress(OSError):
+            self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+        self._thread.join(1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台DNS延迟检测线程
+在工作线程中测量DNS服务器的延迟，测量期间不阻塞界面
+"""
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+import dns_probe
+
+
+class DnsProbeWorker(QObject):
+    """DNS延迟检测工作对象，需移动到独立的QThread中运行"""
+
+    # {服务器: ProbeResult}
+    finished = pyqtSignal(object)
+
+    def __init__(self, servers):
+        super().__init__()
+        self.servers = servers
+
+    @pyqtSlot()
+    def run(self):
+        """测量全部服务器，界面上主动检测时总是重新测量"""
+        self.finished.emit(dns_probe.measure(self.servers, refresh=True))
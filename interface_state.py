@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网卡当前配置读取模块
+读取网卡当前的地址、默认网关、DNS和MAC地址，并与选中的配置比较，
+得到需要修改的最小字段集合，用于只执行实际发生变化的步骤
+"""
+
+import contextlib
+import platform
+
+from adapter_registry import get_registry
+from search_index import normalize_mac
+import command_runner
+import rtnetlink
+import validators
+import tracing
+
+# 可单独修改的字段：IP地址和子网掩码、网关、DNS、MAC地址
+FIELDS = ('ip', 'gateway', 'dns', 'mac')
+
+
+class InterfaceState:
+    """网卡当前配置，未能读取的字段为None"""
+
+    def __init__(self, addresses=None, gateways=None, dns=None, mac=None, dhcp=None, dhcp_dns=None,
+                 mac_override=None):
+        # [(IP地址, 子网掩码)]，均为点分十进制字符串
+        self.addresses = addresses
+        # 默认网关列表
+        self.gateways = gateways
+        # DNS服务器列表，按优先级排列
+        self.dns = dns
+        self.mac = mac
+        # 地址和DNS是否通过DHCP获取，只在Windows和macOS上读取
+        self.dhcp = dhcp
+        self.dhcp_dns = dhcp_dns
+        # Windows网卡高级属性中设置的网络地址，未设置时为空字符串
+        self.mac_override = mac_override
+
+    def __repr__(self):
+        return (f"InterfaceState(addresses={self.addresses!r}, gateways={self.gateways!r}, "
+                f"dns={self.dns!r}, mac={self.mac!r}, dhcp={self.dhcp!r}, dhcp_dns={self.dhcp_dns!r}, "
+                f"mac_override={self.mac_override!r})")
+
+
+def init_com():
+    """在工作线程中使用WMI需要先初始化COM"""
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+    except ImportError:
+        pass
+
+
+def _windows_static_dns(setting_id):
+    """网卡是否设置了静态DNS，静态DNS保存在注册表的NameServer中，读取失败时返回None"""
+    import winreg
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                            rf"SYSTEM\CurrentControlSet\Services\Tcpip\Parameters\Interfaces\{setting_id}") as key:
+            return bool(winreg.QueryValueEx(key, 'NameServer')[0].strip())
+    except OSError:
+        return None
+
+
+# 网络适配器设备类的注册表项，每个子项对应一个网卡
+_ADAPTER_CLASS = r"SYSTEM\CurrentControlSet\Control\Class\{4d36e972-e325-11ce-bfc1-08002be10318}"
+
+
+def _windows_mac_override(setting_id):
+    """网卡高级属性中设置的网络地址（NetworkAddress），未设置时返回空字符串，读取失败时返回None"""
+    import winreg
+    try:
+        adapters = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, _ADAPTER_CLASS)
+    except OSError:
+        return None
+    with adapters:
+        index = 0
+        while True:
+            try:
+                name = winreg.EnumKey(adapters, index)
+            except OSError:
+                return None
+            index += 1
+            try:
+                with winreg.OpenKey(adapters, name) as key:
+                    if winreg.QueryValueEx(key, 'NetCfgInstanceId')[0].lower() != setting_id.lower():
+                        continue
+                    try:
+                        return str(winreg.QueryValueEx(key, 'NetworkAddress')[0]).strip()
+                    except FileNotFoundError:
+                        return ''
+            except OSError:
+                # Properties等没有权限读取或不是网卡的子项
+                continue
+
+
+def read_windows_state(card):
+    """通过WMI读取Windows网卡当前配置"""
+    import wmi
+    adapter = get_registry().get(card)
+    if adapter is None:
+        return InterfaceState()
+    init_com()
+    for config in wmi.WMI().Win32_NetworkAdapterConfiguration(Index=adapter.index):
+        addresses = []
+        # IPAddress和IPSubnet按位置一一对应，其中包含IPv6地址
+        for address, subnet in zip(config.IPAddress or (), config.IPSubnet or ()):
+            if '.' in address:
+                addresses.append((address, subnet))
+        dhcp = bool(config.DHCPEnabled)
+        static_dns = _windows_static_dns(config.SettingID) if config.SettingID else None
+        return InterfaceState(addresses=addresses,
+                              gateways=[g for g in config.DefaultIPGateway or () if '.' in g],
+                              dns=list(config.DNSServerSearchOrder or ()),
+                              mac=config.MACAddress or adapter.mac,
+                              dhcp=dhcp,
+                              # 没有静态DNS时，启用DHCP的网卡使用DHCP提供的DNS
+                              dhcp_dns=None if static_dns is None else dhcp and not static_dns,
+                              mac_override=_windows_mac_override(config.SettingID) if config.SettingID else None)
+    return InterfaceState(mac=adapter.mac)
+
+
+def read_resolv_conf(path='/etc/resolv.conf'):
+    """读取resolv.conf中的DNS服务器"""
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    servers.append(parts[1])
+    except OSError:
+        return None
+    return servers
+
+
+def read_linux_state(card, resolv_conf='/etc/resolv.conf', netlink=None):
+    """通过rtnetlink读取Linux网卡当前配置"""
+    state = InterfaceState(dns=read_resolv_conf(resolv_conf))
+    with contextlib.nullcontext(netlink) if netlink is not None else rtnetlink.RtNetlink() as netlink:
+        link = netlink.get_link(card)
+        if link is None:
+            return state
+        state.mac = link.mac
+        state.addresses = [(ip, validators.int_to_ip(validators.cidr_to_mask(prefixlen)))
+                           for _, ip, prefixlen in netlink.list_addresses(link.index)]
+        state.gateways = [gateway for _, gateway in netlink.default_gateways(link.index)]
+    return state
+
+
+def read_macos_state(card):
+    """通过networksetup读取macOS网络服务当前配置，地址和DNS两条查询并发执行"""
+    state = InterfaceState()
+    info_result, dns_result = command_runner.run_concurrently(
+        [['networksetup', '-getinfo', card], ['networksetup', '-getdnsservers', card]], timeout=10.0)
+    result = info_result
+    if not isinstance(result, Exception) and result.returncode == 0:
+        info = {}
+        for line in result.stdout.splitlines():
+            key, sep, value = line.partition(':')
+            if sep:
+                info[key.strip()] = value.strip()
+        if info.get('IP address') and info.get('Subnet mask'):
+            state.addresses = [(info['IP address'], info['Subnet mask'])]
+        else:
+            state.addresses = []
+        state.gateways = [info['Router']] if info.get('Router') else []
+        state.mac = info.get('Ethernet Address') or info.get('Wi-Fi ID')
+        # 第一行为"DHCP Configuration"或"Manual Configuration"等
+        lines = result.stdout.strip().splitlines()
+        state.dhcp = bool(lines) and lines[0].strip() == 'DHCP Configuration'
+
+    result = dns_result
+    if not isinstance(result, Exception) and result.returncode == 0:
+        # 未设置DNS时输出一行提示文字
+        state.dns = [line.strip() for line in result.stdout.splitlines()
+                     if validators.parse_address(line.strip(), 'ip')[0] is not None]
+        # 没有手动设置DNS时使用DHCP提供的DNS
+        state.dhcp_dns = not state.dns
+    return state
+
+
+def read_interface_state(card, system=None):
+    """读取网卡当前配置，读取失败时返回所有字段为None的状态"""
+    system = system or platform.system()
+    with tracing.span("读取网卡配置", card=card):
+        return _read_interface_state(card, system)
+
+
+def _read_interface_state(card, system):
+    try:
+        if system == "Windows":
+            return read_windows_state(card)
+        elif system == "Darwin":
+            return read_macos_state(card)
+        elif system == "Linux":
+            return read_linux_state(card)
+    except Exception as e:
+        print(f"读取网卡当前配置失败: {str(e)}")
+    return InterfaceState()
+
+
+def _same_address(a, b):
+    """比较两个地址是否相同，无法解析时按字符串比较"""
+    value_a = validators.parse_address(a, 'ip')[0]
+    value_b = validators.parse_address(b, 'ip')[0]
+    if value_a is None or value_b is None:
+        return a == b
+    return value_a == value_b
+
+
+def diff_state(state, ip, netmask, gateway, dns, s_dns, mac):
+    """比较网卡当前配置与目标配置，返回需要修改的字段集合
+
+    未能读取的字段视为需要修改；目标配置中为空的DNS和MAC地址不修改
+    """
+    changes = set()
+
+    mask_value = validators.parse_netmask(netmask)[0]
+    if state.addresses is None or not any(
+            _same_address(address, ip) and validators.parse_netmask(subnet)[0] == mask_value
+            for address, subnet in state.addresses):
+        changes.add('ip')
+
+    if state.gateways is None or not state.gateways or not _same_address(state.gateways[0], gateway):
+        changes.add('gateway')
+
+    servers = [server.strip() for server in (dns, s_dns) if server and server.strip()]
+    # 与原有逻辑一致，未填写首选DNS时不修改DNS
+    if dns and dns.strip():
+        current = state.dns
+        if current is None or len(current) < len(servers) or not all(
+                _same_address(a, b) for a, b in zip(current, servers)):
+            changes.add('dns')
+
+    if mac:
+        if state.mac is None or normalize_mac(state.mac) != normalize_mac(mac):
+            changes.add('mac')
+
+    return changes
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网卡链路状态等待模块
+禁用/启用网卡后轮询链路状态，到达目标状态立即返回，超时返回False，
+代替原先固定时长的等待。Linux读取sysfs（可指定根目录以便用伪造的目录测试），
+其他平台按指数退避轮询系统接口
+"""
+
+import os
+import platform
+import time
+
+import tracing
+
+# Linux下网卡状态所在目录
+SYSFS_NET = '/sys/class/net'
+
+# 等待链路状态的默认超时时间（秒）
+DEFAULT_TIMEOUT = 10.0
+
+# IFF_UP标志，对应ip link中的管理状态
+_IFF_UP = 0x1
+
+# 各平台轮询间隔（初始值, 最大值），读取sysfs开销很小可以更频繁
+_POLL_INTERVALS = {
+    'Linux': (0.005, 0.1),
+    'Windows': (0.05, 0.5),
+    'Darwin': (0.05, 0.5),
+}
+
+
+def _read_sysfs(card, name, sysfs_root):
+    """读取网卡的sysfs属性，网卡不存在时返回None"""
+    try:
+        with open(os.path.join(sysfs_root, card, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def linux_admin_up(card, sysfs_root=SYSFS_NET):
+    """读取Linux网卡的管理状态（flags中的IFF_UP），与是否连接网线无关，未知时返回None"""
+    flags = _read_sysfs(card, 'flags', sysfs_root)
+    if flags is None:
+        return None
+    try:
+        return bool(int(flags, 16) & _IFF_UP)
+    except ValueError:
+        return None
+
+
+def linux_link_up(card, sysfs_root=SYSFS_NET):
+    """读取Linux网卡状态，返回True（已启用且就绪）、False（已禁用或没有载波）或None（未知）"""
+    flags = _read_sysfs(card, 'flags', sysfs_root)
+    if flags is not None:
+        try:
+            if not int(flags, 16) & _IFF_UP:
+                return False
+        except ValueError:
+            pass
+    operstate = _read_sysfs(card, 'operstate', sysfs_root)
+    if operstate is None:
+        return None
+    # 部分驱动（如虚拟网卡）不报告载波状态，operstate始终为unknown
+    if operstate in ('up', 'unknown'):
+        return True
+    if operstate in ('down', 'notpresent', 'lowerlayerdown'):
+        return False
+    return None
+
+
+def windows_link_up(card):
+    """通过WMI读取Windows网卡是否已启用"""
+    import wmi
+    from interface_state import init_com
+    init_com()
+    for nic in wmi.WMI().Win32_NetworkAdapter(NetConnectionID=card):
+        return bool(nic.NetEnabled)
+    return None
+
+
+def macos_link_up(card):
+    """通过ifconfig读取macOS网卡状态"""
+    import command_runner
+    try:
+        result = command_runner.run(['ifconfig', card], timeout=5.0)
+    except command_runner.CommandTimeout:
+        return None
+    if result.returncode != 0:
+        return None
+    header = result.stdout.split('\n', 1)[0]
+    return 'UP' in header.split('<', 1)[-1].split('>', 1)[0].split(',')
+
+
+def link_up(card, system=None, sysfs_root=SYSFS_NET, admin=False):
+    """读取网卡当前状态，返回True、False或None
+
+    admin为True时Linux上只读取管理状态，没有连接网线的网卡启用后同样返回True
+    """
+    system = system or platform.system()
+    if system == "Linux":
+        return linux_admin_up(card, sysfs_root) if admin else linux_link_up(card, sysfs_root)
+    elif system == "Windows":
+        return windows_link_up(card)
+    elif system == "Darwin":
+        return macos_link_up(card)
+    return None
+
+
+def wait_for_link(card, up=True, timeout=DEFAULT_TIMEOUT, system=None, sysfs_root=SYSFS_NET, admin=False):
+    """等待网卡到达目标状态，到达后立即返回True，超时返回False；admin的含义与link_up相同"""
+    system = system or platform.system()
+    with tracing.span("等待网卡" + ("启用" if up else "禁用"), card=card):
+        return _wait_for_link(card, up, timeout, system, sysfs_root, admin)
+
+
+def _wait_for_link(card, up, timeout, system, sysfs_root, admin):
+    interval, max_interval = _POLL_INTERVALS.get(system, (0.05, 0.5))
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if link_up(card, system, sysfs_root, admin) == up:
+                return True
+        except Exception as e:
+            print(f"读取网卡状态失败: {str(e)}")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
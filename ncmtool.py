@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络配置管理工具命令行版本
+不加载PyQt6，可在登录脚本或批量操作中直接应用配置：
+
+    python ncmtool.py list
+    python ncmtool.py show --department 信息中心 --user yyw备用1
+    python ncmtool.py validate
+    python ncmtool.py apply --department 信息中心 --user yyw备用1 --card eth0
+    python ncmtool.py revert                     # 恢复到上一次应用配置前的网络配置
+    python ncmtool.py probe-dns --servers 223.5.5.5,114.114.114.114
+    python ncmtool.py nm-compile --card eth0     # 编译为NetworkManager连接配置
+    python ncmtool.py export --output out.tar.gz # 批量生成各系统的部署文件
+    python ncmtool.py db-import --output config.db               # 导入为SQLite配置库
+    python ncmtool.py --config config.db db-export --output config.json
+
+--config 为 .db 文件时从SQLite配置库读取，查找用户使用索引，不读取其他部门。
+
+加上 --json 时以JSON格式输出结果。退出码：
+    0  成功（网卡配置已一致时也为0）
+    1  配置校验发现问题
+    2  参数错误或配置文件加载失败
+    3  找不到指定的部门或用户
+    4  应用配置失败
+    130  被用户中断
+"""
+
+import argparse
+import contextlib
+import json
+import sqlite3
+import sys
+
+import validators
+from config_loader import iter_departments
+
+EXIT_OK = 0
+EXIT_INVALID = 1
+EXIT_CONFIG = 2
+EXIT_NOT_FOUND = 3
+EXIT_APPLY_FAILED = 4
+EXIT_INTERRUPTED = 130
+
+# 用户配置中应用时使用的字段
+PROFILE_FIELDS = ('ip', 'netmask', 'gateway', 'dns', 's_dns', 'mac', 'mac_name')
+
+
+class CommandError(Exception):
+    """命令执行失败，携带退出码"""
+
+    def __init__(self, message, exit_code):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def _departments(config_path):
+    """流式读取配置文件中的部门"""
+    try:
+        yield from iter_departments(config_path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise CommandError(f"加载配置文件失败: {str(e)}", EXIT_CONFIG) from e
+
+
+def find_profile(config_path, department, user):
+    """查找部门中的用户配置，找到后立即返回，不读取其余部门"""
+    from profile_db import is_database
+    if is_database(config_path):
+        return _find_in_database(config_path, department, user)
+    for dept in _departments(config_path):
+        if dept.get('department') != department:
+            continue
+        for item in dept.get('users') or []:
+            if item.get('name') == user:
+                return item
+        raise CommandError(f"部门 {department} 中找不到用户: {user}", EXIT_NOT_FOUND)
+    raise CommandError(f"找不到部门: {department}", EXIT_NOT_FOUND)
+
+
+def _find_in_database(config_path, department, user):
+    from profile_db import ProfileDatabase
+    try:
+        database = ProfileDatabase(config_path)
+        try:
+            found_department, item = database.find(department, user)
+        finally:
+            database.close()
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise CommandError(f"加载配置文件失败: {str(e)}", EXIT_CONFIG) from e
+    if not found_department:
+        raise CommandError(f"找不到部门: {department}", EXIT_NOT_FOUND)
+    if item is None:
+        raise CommandError(f"部门 {department} 中找不到用户: {user}", EXIT_NOT_FOUND)
+    return item
+
+
+def profile_fields(user):
+    """取出应用配置使用的字段，缺少的字段为空字符串"""
+    return {field: str(user.get(field) or '') for field in PROFILE_FIELDS}
+
+
+def cmd_list(args, out):
+    departments = []
+    for dept in _departments(args.config):
+        if args.department and dept.get('department') != args.department:
+            continue
+        departments.append({
+            'department': dept.get('department', ''),
+            'users': [{'name': u.get('name', ''), 'ip': u.get('ip', ''), 'mac': u.get('mac', '')}
+                      for u in dept.get('users') or []],
+        })
+    if args.department and not departments:
+        raise CommandError(f"找不到部门: {args.department}", EXIT_NOT_FOUND)
+
+    if args.json:
+        out({'ok': True, 'departments': departments})
+    else:
+        for dept in departments:
+            print(dept['department'])
+            for user in dept['users']:
+                print(f"  {user['name']}\t{user['ip']}\t{user['mac']}")
+    return EXIT_OK
+
+
+def cmd_show(args, out):
+    user = find_profile(args.config, args.department, args.user)
+    errors = validators.validate_profile(user)
+    if args.json:
+        out({'ok': True, 'department': args.department, 'profile': user,
+             'errors': [{'field': f, 'message': m} for f, m in errors]})
+    else:
+        for key, value in user.items():
+            print(f"{key}: {value}")
+        for field, message in errors:
+            print(f"[{field}] {message}")
+    return EXIT_OK
+
+
+def cmd_validate(args, out):
+    issues = []
+    for dept in _departments(args.config):
+        if args.department and dept.get('department') != args.department:
+            continue
+        for department, name, field, message in validators.validate_config([dept]):
+            issues.append({'department': department, 'name': name, 'field': field, 'message': message})
+
+    if args.json:
+        out({'ok': not issues, 'issues': issues})
+    else:
+        for issue in issues:
+            print(f"{issue['department']}/{issue['name']} [{issue['field']}] {issue['message']}")
+        print(f"共发现 {len(issues)} 个问题")
+    return EXIT_INVALID if issues else EXIT_OK
+
+
+def cmd_apply(args, out):
+    if not args.trace:
+        return _apply(args, out)
+    import tracing
+    # 把本次应用的耗时区间写为Chrome trace文件，失败时也写入
+    with tracing.capture() as events:
+        try:
+            return _apply(args, out)
+        finally:
+            tracing.write_trace(args.trace, events)
+
+
+def _apply(args, out):
+    user = find_profile(args.config, args.department, args.user)
+    errors = validators.validate_profile(user)
+    if errors:
+        raise CommandError("; ".join(message for _, message in errors), EXIT_INVALID)
+    fields = profile_fields(user)
+    if args.dns_check:
+        _check_dns(args, fields)
+
+    import network_apply
+    import apply_helper
+    from interface_state import FIELDS
+
+    def progress(index, total, title):
+        if index < total:
+            print(f"[{index + 1}/{total}] {title}", file=sys.stderr)
+
+    if args.dry_run:
+        return _dry_run(args, out, fields)
+    if args.nm:
+        return _apply_nm(args, out, user)
+
+    # 特权助手运行时通过助手应用配置，本进程不需要提权
+    client = None if args.no_helper else apply_helper.connect()
+    if client is not None:
+        with client:
+            try:
+                changed, timings = client.apply(args.card, fields, args.force, progress)
+            except apply_helper.HelperError as e:
+                raise CommandError(str(e), EXIT_APPLY_FAILED) from e
+        return _report_apply(args, out, changed, timings)
+
+    if not network_apply.is_admin():
+        print("警告: 当前不是管理员/root权限，网络配置可能无法生效", file=sys.stderr)
+
+    # 应用过程中的日志输出到标准错误，标准输出只保留结果
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if args.force:
+                changes = set(FIELDS)
+            else:
+                changes = network_apply.plan_changes(args.card, fields['ip'], fields['netmask'], fields['gateway'],
+                                                     fields['dns'], fields['s_dns'], fields['mac'])
+            steps = network_apply.build_steps(args.card, changes=changes, **fields)
+            timings = network_apply.run_steps(steps, progress)
+        except ValueError as e:
+            # DNS、MAC地址或网卡名称无效，生成步骤前拒绝
+            raise CommandError(str(e), EXIT_INVALID) from e
+        except network_apply.ApplyError as e:
+            raise CommandError(str(e), EXIT_APPLY_FAILED) from e
+
+    changed = [field for field in FIELDS if field in changes] if steps else []
+    return _report_apply(args, out, changed, timings)
+
+
+def _check_dns(args, fields):
+    """应用前测量首选和备用DNS的延迟，提示问题，reorder时按延迟调整顺序"""
+    import dns_probe
+
+    results = dns_probe.measure([fields['dns'], fields['s_dns']])
+    for message in dns_probe.warnings(fields['dns'], fields['s_dns'], results):
+        print(f"警告: {message}", file=sys.stderr)
+    if args.dns_check == 'reorder':
+        dns, s_dns = dns_probe.rank(fields['dns'], fields['s_dns'], results)
+        if dns != fields['dns']:
+            print(f"按延迟交换首选和备用DNS: {dns}, {s_dns}", file=sys.stderr)
+            fields['dns'], fields['s_dns'] = dns, s_dns
+
+
+def cmd_probe_dns(args, out):
+    """测量DNS服务器的延迟"""
+    import dns_probe
+
+    if args.servers:
+        servers = args.servers.split(',')
+    elif args.department and args.user:
+        user = find_profile(args.config, args.department, args.user)
+        servers = [user.get('dns'), user.get('s_dns')]
+    else:
+        raise CommandError("需要指定 --servers，或同时指定 --department 和 --user", EXIT_CONFIG)
+    name = args.name or dns_probe.DEFAULT_QUERY_NAME
+    results = dns_probe.measure(servers, name, args.attempts or dns_probe.DEFAULT_ATTEMPTS,
+                                args.timeout or dns_probe.DEFAULT_TIMEOUT, args.port or dns_probe.DNS_PORT,
+                                refresh=True)
+    if not results:
+        raise CommandError("没有需要测量的DNS服务器", EXIT_CONFIG)
+
+    ranked = sorted(results.values(), key=lambda r: (not r.reachable, r.rtt or 0.0))
+    if args.json:
+        out({'ok': True, 'name': name,
+             'servers': [{'server': r.server, 'reachable': r.reachable,
+                          'rtt_ms': round(r.rtt * 1000, 3) if r.reachable else None,
+                          'rtts_ms': [round(rtt * 1000, 3) for rtt in r.rtts], 'failures': r.failures,
+                          'error': r.error} for r in ranked]})
+    else:
+        for result in ranked:
+            print(result.describe())
+    return EXIT_OK if any(r.reachable for r in ranked) else EXIT_APPLY_FAILED
+
+
+def _dry_run(args, out, fields):
+    """只输出将要执行的命令，不修改网络配置"""
+    import platform
+    import command_plan
+    import network_apply
+    from interface_state import FIELDS, read_interface_state
+
+    system = args.system or platform.system()
+    # Linux上设置IP前会删除网卡的其他地址，预览中列出这些地址
+    addresses = None
+    if system != platform.system():
+        # 预览其他系统的命令时无法读取网卡当前配置，按全部字段生成
+        changes = set(FIELDS)
+    else:
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                state = read_interface_state(args.card, system)
+            except Exception as e:
+                if not args.force:
+                    raise CommandError(f"读取网卡当前配置失败: {str(e)}", EXIT_APPLY_FAILED) from e
+                state = None
+            changes = set(FIELDS) if args.force else network_apply.plan_changes(
+                args.card, fields['ip'], fields['netmask'], fields['gateway'], fields['dns'], fields['s_dns'],
+                fields['mac'], system, state)
+        if system == 'Linux' and state is not None and state.addresses is not None:
+            addresses = [(ip, validators.mask_to_cidr(validators.parse_netmask(subnet)[0]))
+                         for ip, subnet in state.addresses]
+    try:
+        batches = command_plan.compile_plan(system, args.card, changes=changes, addresses=addresses, **fields)
+    except ValueError as e:
+        raise CommandError(str(e), EXIT_INVALID) from e
+
+    if args.json:
+        out({'ok': True, 'dry_run': True, 'system': system, 'card': args.card,
+             'changed': [field for field in FIELDS if field in changes],
+             'plan': command_plan.plan_to_json(batches)})
+    else:
+        sys.stdout.write(command_plan.format_plan(batches))
+    return EXIT_OK
+
+
+def _apply_nm(args, out, user):
+    """激活预先编译的NetworkManager连接，NetworkManager会重新设置全部字段"""
+    import network_apply
+    import nm_profiles
+    from interface_state import FIELDS
+
+    def progress(index, total, title):
+        if index < total:
+            print(f"[{index + 1}/{total}] {title}", file=sys.stderr)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            steps = nm_profiles.activation_steps(args.department, user, args.card,
+                                                  args.output or nm_profiles.SYSTEM_CONNECTIONS)
+            timings = network_apply.run_steps(steps, progress)
+        except (ValueError, network_apply.ApplyError) as e:
+            raise CommandError(str(e), EXIT_APPLY_FAILED) from e
+    return _report_apply(args, out, list(FIELDS), timings)
+
+
+def cmd_revert(args, out):
+    """恢复到最近一次应用配置前保存的网络配置"""
+    import network_apply
+    import apply_helper
+    import snapshots
+
+    def progress(index, total, title):
+        if index < total:
+            print(f"[{index + 1}/{total}] {title}", file=sys.stderr)
+
+    # 通过特权助手应用的配置，快照保存在助手一侧
+    client = None if args.no_helper else apply_helper.connect()
+    if client is not None:
+        with client:
+            try:
+                card, timings = client.revert(args.card, progress)
+            except apply_helper.HelperError as e:
+                raise CommandError(str(e), EXIT_APPLY_FAILED) from e
+    else:
+        snapshot = snapshots.get_ring().latest(args.card)
+        if snapshot is None:
+            raise CommandError("没有可恢复的网络配置", EXIT_NOT_FOUND)
+        card = snapshot.card
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                timings = network_apply.run_steps(snapshots.revert_steps(card), progress)
+            except network_apply.ApplyError as e:
+                raise CommandError(str(e), EXIT_APPLY_FAILED) from e
+
+    if args.json:
+        out({'ok': True, 'card': card,
+             'steps': [{'title': title, 'seconds': round(seconds, 6)} for title, seconds in timings]})
+    elif not timings:
+        print(f"网卡 {card} 当前配置与保存的配置一致，无需恢复")
+    else:
+        print(f"网卡 {card} 已恢复到上一个网络配置（耗时 {sum(s for _, s in timings):.1f} 秒）")
+    return EXIT_OK
+
+
+def cmd_nm_compile(args, out):
+    import nm_profiles
+
+    try:
+        result = nm_profiles.compile_profiles(_departments(args.config), args.card,
+                                              args.output or nm_profiles.SYSTEM_CONNECTIONS)
+    except OSError as e:
+        raise CommandError(f"生成连接配置失败: {str(e)}", EXIT_APPLY_FAILED) from e
+    if not args.no_reload and result.changed:
+        try:
+            nm_profiles.reload_connections(result)
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f"NetworkManager加载连接配置失败: {str(e)}", EXIT_APPLY_FAILED) from e
+
+    if args.json:
+        out({'ok': True, 'card': args.card, 'written': result.written, 'removed': result.removed,
+             'unchanged': result.unchanged,
+             'skipped': [{'department': d, 'name': n, 'message': m} for d, n, m in result.skipped]})
+    else:
+        for department, name, message in result.skipped:
+            print(f"跳过 {department}/{name}: {message}", file=sys.stderr)
+        print(f"生成 {len(result.written)} 个，删除 {len(result.removed)} 个，"
+              f"未变化 {result.unchanged} 个连接配置")
+    return EXIT_OK
+
+
+def cmd_export(args, out):
+    import artifacts
+
+    formats = args.formats.split(',') if args.formats else artifacts.FORMATS
+    unknown = [fmt for fmt in formats if fmt not in artifacts.FORMATS]
+    if unknown:
+        raise CommandError(f"未知的格式: {', '.join(unknown)}", EXIT_CONFIG)
+    cards = {key: value for key, value in (('linux', args.card), ('windows', args.windows_card),
+                                           ('macos', args.mac_service)) if value}
+    try:
+        result = artifacts.export(_departments(args.config), args.output, formats, cards, args.jobs, args.full)
+    except ValueError as e:
+        raise CommandError(str(e), EXIT_INVALID) from e
+    except OSError as e:
+        raise CommandError(f"生成部署文件失败: {str(e)}", EXIT_APPLY_FAILED) from e
+
+    if args.json:
+        out({'ok': True, 'output': args.output, 'total': result.total, 'written': result.written,
+             'unchanged': result.unchanged, 'removed': result.removed,
+             'skipped': [{'department': d, 'name': n, 'message': m} for d, n, m in result.skipped],
+             'seconds': round(result.seconds, 3), 'records_per_second': round(result.records_per_second)})
+    else:
+        for department, name, message in result.skipped:
+            print(f"跳过 {department}/{name}: {message}", file=sys.stderr)
+        print(f"共 {result.total} 个用户：生成 {result.written} 个，未变化 {result.unchanged} 个，"
+              f"删除 {len(result.removed)} 个，跳过 {len(result.skipped)} 个；"
+              f"耗时 {result.seconds:.2f} 秒（{result.records_per_second:.0f} 个/秒）")
+    return EXIT_OK
+
+
+def cmd_db_import(args, out):
+    import profile_db
+
+    if profile_db.is_database(args.config):
+        raise CommandError(f"{args.config} 已经是配置库，请用 --config 指定JSON配置文件", EXIT_CONFIG)
+    try:
+        count = profile_db.import_json(args.config, args.output)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise CommandError(f"导入配置库失败: {str(e)}", EXIT_CONFIG) from e
+    if args.json:
+        out({'ok': True, 'output': args.output, 'users': count})
+    else:
+        print(f"已导入 {count} 个用户到 {args.output}")
+    return EXIT_OK
+
+
+def cmd_db_export(args, out):
+    import profile_db
+
+    if not profile_db.is_database(args.config):
+        raise CommandError(f"{args.config} 不是配置库，请用 --config 指定 .db 文件", EXIT_CONFIG)
+    try:
+        count = profile_db.export_json(args.config, args.output)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise CommandError(f"导出配置失败: {str(e)}", EXIT_CONFIG) from e
+    if args.json:
+        out({'ok': True, 'output': args.output, 'users': count})
+    else:
+        print(f"已导出 {count} 个用户到 {args.output}")
+    return EXIT_OK
+
+
+def _report_apply(args, out, changed, timings):
+    """输出应用配置的结果"""
+    if args.json:
+        out({'ok': True, 'card': args.card, 'department': args.department, 'user': args.user,
+             'changed': changed,
+             'steps': [{'title': title, 'seconds': round(seconds, 6)} for title, seconds in timings]})
+    elif not changed:
+        print("网卡当前配置与所选配置一致，无需修改")
+    else:
+        print(f"网络配置修改成功（耗时 {sum(s for _, s in timings):.1f} 秒）")
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ncmtool', description="网络配置管理工具命令行版本")
+    parser.add_argument('--config', default='config.json', help="配置文件路径")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help="列出部门和用户")
+    list_parser.add_argument('--department', help="只列出指定部门")
+    list_parser.set_defaults(func=cmd_list)
+
+    show_parser = commands.add_parser('show', help="显示用户配置")
+    show_parser.add_argument('--department', required=True)
+    show_parser.add_argument('--user', required=True)
+    show_parser.set_defaults(func=cmd_show)
+
+    validate_parser = commands.add_parser('validate', help="校验配置文件")
+    validate_parser.add_argument('--department', help="只校验指定部门")
+    validate_parser.set_defaults(func=cmd_validate)
+
+    apply_parser = commands.add_parser('apply', help="将用户配置应用到网卡")
+    apply_parser.add_argument('--department', required=True)
+    apply_parser.add_argument('--user', required=True)
+    apply_parser.add_argument('--card', required=True, help="网卡名称")
+    apply_parser.add_argument('--force', action='store_true', help="不比较网卡当前配置，修改全部字段")
+    apply_parser.add_argument('--no-helper', action='store_true', help="不使用特权助手，直接在本进程中应用配置")
+    apply_parser.add_argument('--dry-run', action='store_true', help="只显示将要执行的命令，不修改网络配置")
+    apply_parser.add_argument('--system', choices=('Windows', 'Linux', 'Darwin'), default=None,
+                              help="与 --dry-run 一起使用，预览其他系统上的命令")
+    apply_parser.add_argument('--nm', action='store_true', help="激活NetworkManager连接配置（Linux）")
+    apply_parser.add_argument('--output', default=None, help="连接配置目录，用于 --nm")
+    apply_parser.add_argument('--trace', default=None, metavar='FILE',
+                              help="把各步骤和外部命令的耗时写为Chrome trace文件")
+    apply_parser.add_argument('--dns-check', choices=('warn', 'reorder'), default=None,
+                              help="应用前测量DNS延迟：warn只提示，reorder在备用DNS更快时交换顺序")
+    apply_parser.set_defaults(func=cmd_apply)
+
+    revert_parser = commands.add_parser('revert', help="恢复到最近一次应用配置前的网络配置")
+    revert_parser.add_argument('--card', default=None, help="网卡名称，默认为最近修改的网卡")
+    revert_parser.add_argument('--no-helper', action='store_true', help="不使用特权助手，直接在本进程中恢复")
+    revert_parser.set_defaults(func=cmd_revert)
+
+    probe_parser = commands.add_parser('probe-dns', help="测量DNS服务器的延迟")
+    probe_parser.add_argument('--servers', default=None, help="逗号分隔的DNS服务器")
+    probe_parser.add_argument('--department', default=None, help="与 --user 一起使用，测量用户配置中的DNS")
+    probe_parser.add_argument('--user', default=None)
+    probe_parser.add_argument('--name', default=None, help="查询的域名")
+    probe_parser.add_argument('--attempts', type=int, default=None, help="每台服务器的查询次数")
+    probe_parser.add_argument('--timeout', type=float, default=None, help="单次查询的超时时间（秒）")
+    probe_parser.add_argument('--port', type=int, default=None, help=argparse.SUPPRESS)
+    probe_parser.set_defaults(func=cmd_probe_dns)
+
+    nm_parser = commands.add_parser('nm-compile', help="将全部用户配置编译为NetworkManager连接配置（Linux）")
+    nm_parser.add_argument('--card', required=True, help="连接绑定的网卡名称")
+    nm_parser.add_argument('--output', default=None, help="连接配置目录，默认为NetworkManager的系统连接目录")
+    nm_parser.add_argument('--no-reload', action='store_true', help="生成后不通知NetworkManager重新加载")
+    nm_parser.set_defaults(func=cmd_nm_compile)
+
+    export_parser = commands.add_parser('export', help="批量生成各系统的部署文件")
+    export_parser.add_argument('--output', required=True, help="输出目录，或以 .tar/.tar.gz 结尾的归档文件")
+    export_parser.add_argument('--formats', default=None, help="逗号分隔的格式：netplan,nm,netsh,networksetup")
+    export_parser.add_argument('--card', default=None, help="Linux网卡名称，默认 eth0")
+    export_parser.add_argument('--windows-card', default=None, help="Windows网卡名称，默认 以太网")
+    export_parser.add_argument('--mac-service', default=None, help="macOS网络服务名称，默认 Ethernet")
+    export_parser.add_argument('--jobs', type=int, default=None, help="进程数，默认为CPU数")
+    export_parser.add_argument('--full', action='store_true', help="忽略上次的清单，重新生成全部用户")
+    export_parser.set_defaults(func=cmd_export)
+
+    db_import_parser = commands.add_parser('db-import', help="把JSON配置导入为SQLite配置库")
+    db_import_parser.add_argument('--output', required=True, help="配置库路径，如 config.db")
+    db_import_parser.set_defaults(func=cmd_db_import)
+
+    db_export_parser = commands.add_parser('db-export', help="把SQLite配置库导出为JSON配置文件")
+    db_export_parser.add_argument('--output', required=True, help="JSON配置文件路径")
+    db_export_parser.set_defaults(func=cmd_db_export)
+    return parser
+
+
+def main(argv=None):
+    # 子命令和选项的顺序不限，--json和--config也可以写在子命令之后
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = build_parser()
+    global_args = argparse.ArgumentParser(add_help=False)
+    global_args.add_argument('--config')
+    global_args.add_argument('--json', action='store_true')
+    extra, argv = global_args.parse_known_args(argv)
+    args = parser.parse_args(argv)
+    args.config = extra.config or args.config
+    args.json = extra.json or args.json
+
+    def out(result):
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    try:
+        return args.func(args, out)
+    except CommandError as e:
+        if args.json:
+            out({'ok': False, 'error': str(e), 'exit_code': e.exit_code})
+        else:
+            print(str(e), file=sys.stderr)
+        return e.exit_code
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络配置应用模块
+将各操作系统修改网络配置的命令拆分为有序的步骤，不依赖Qt，
+可在工作线程中逐步执行并报告进度，步骤之间支持取消
+"""
+
+import contextlib
+import functools
+import platform
+import time
+
+import command_plan
+import command_runner
+import rtnetlink
+import tracing
+import validators
+from link_state import linux_link_up, wait_for_link, SYSFS_NET
+from adapter_registry import get_registry
+from interface_state import FIELDS, read_interface_state, diff_state
+
+# 禁用/启用网卡后等待链路状态变化的超时时间（秒）
+LINK_DOWN_TIMEOUT = 5.0
+LINK_UP_TIMEOUT = 10.0
+
+
+class ApplyError(Exception):
+    """应用配置失败"""
+
+
+class ApplyCancelled(Exception):
+    """应用配置被取消"""
+
+
+class ApplyStep:
+    """应用配置的一个步骤"""
+
+    def __init__(self, title, action, optional=False, cancellable=True, undo=None):
+        self.title = title
+        self.action = action
+        # 可选步骤失败时只记录日志，不影响其他配置
+        self.optional = optional
+        # 网卡处于关闭状态等中间状态时不允许在此步骤前取消
+        self.cancellable = cancellable
+        # 之后的步骤失败或被取消时调用，撤销已执行步骤的效果
+        self.undo = undo
+        # 由特权助手等一次完成多项修改的步骤在执行后填入实际修改的字段，None表示未知
+        self.changed = None
+
+
+def is_admin():
+    """检查当前进程是否具有管理员/root权限"""
+    try:
+        if platform.system() == "Windows":
+            import ctypes
+            return ctypes.windll.shell32.IsUserAnAdmin() != 0
+        import os
+        return os.geteuid() == 0
+    except Exception:
+        return False
+
+
+def find_windows_nic_index(card):
+    """通过网卡注册表查找网卡索引"""
+    adapter = get_registry().get(card)
+    return adapter.index if adapter is not None else None
+
+
+def batch_steps(batches):
+    """每个命令批次为一个步骤，在一个进程中执行"""
+    return [ApplyStep(batch.title, functools.partial(command_plan.run_batch, batch), optional=batch.optional)
+            for batch in batches]
+
+
+def windows_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS):
+    """Windows上应用配置的步骤，只包含changes中的字段
+
+    netsh命令合并为一个netsh -f脚本，修改MAC地址在一个PowerShell会话中完成
+    """
+    steps = []
+    if not changes:
+        return steps
+
+    def check_card():
+        if find_windows_nic_index(card) is None:
+            raise ApplyError(f"找不到网卡: {card}")
+    steps.append(ApplyStep("查找网卡", check_card))
+
+    steps.extend(batch_steps(command_plan.compile_plan("Windows", card, ip, netmask, gateway, dns, s_dns,
+                                                        mac, mac_name, changes)))
+
+    if 'mac' in changes and mac:
+        # 等待网卡完全启用
+        def wait_enabled():
+            if not wait_for_link(card, up=True, timeout=LINK_UP_TIMEOUT, system="Windows"):
+                print(f"等待网卡启用超时: {card}")
+        steps.append(ApplyStep("等待网卡启用", wait_enabled, optional=True))
+    elif not mac:
+        print("MAC地址为空，跳过修改")
+
+    return steps
+
+
+def macos_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=FIELDS):
+    """macOS上应用配置的步骤，只包含changes中的字段，networksetup命令合并为一个shell脚本"""
+    # 注意：macOS下修改MAC地址需要root权限
+    return batch_steps(command_plan.compile_plan("Darwin", card, ip, netmask, gateway, dns, s_dns,
+                                                  mac, mac_name, changes))
+
+
+def _wait_linux_link(card, up, sysfs_root):
+    """等待Linux网卡的管理状态到达目标状态，超时只记录日志
+
+    没有连接网线的网卡启用后operstate仍为down，只用于提示网卡尚未就绪，不再等待
+    """
+    timeout = LINK_UP_TIMEOUT if up else LINK_DOWN_TIMEOUT
+    if not wait_for_link(card, up=up, timeout=timeout, system="Linux", sysfs_root=sysfs_root, admin=True):
+        print(f"等待网卡{'启用' if up else '禁用'}超时: {card}")
+    elif up and linux_link_up(card, sysfs_root) is False:
+        print(f"网卡已启用，但尚未连接（没有载波）: {card}")
+
+
+def _netlink_session(netlink):
+    """使用传入的rtnetlink连接，未传入时新建连接并在使用后关闭"""
+    return contextlib.nullcontext(netlink) if netlink is not None else rtnetlink.RtNetlink()
+
+
+def _linux_link_index(netlink, card, use_registry):
+    """查找网卡索引，使用网卡注册表时不需要重新列出全部网卡"""
+    link = get_registry().get(card) if use_registry else netlink.get_link(card)
+    if link is None:
+        raise ApplyError(f"找不到网卡: {card}")
+    return link.index
+
+
+def linux_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, sysfs_root=SYSFS_NET, changes=FIELDS,
+                netlink=None):
+    """Linux上应用配置的步骤，只包含changes中的字段
+
+    通过rtnetlink在本进程内修改配置，每个步骤的请求合并为一次发送；
+    只有修改MAC地址时才禁用网卡，其余配置在网卡启用状态下修改。与预览一样先校验字段，
+    无效时抛出ValueError
+    """
+    command_plan.check_card(card)
+    command_plan.check_fields(ip, netmask, gateway, dns, s_dns, mac, changes)
+    steps = []
+
+    if 'mac' in changes and mac:
+        # 禁用网卡会删除经过该网卡的路由，重新启用后需要重新设置网关
+        changes = set(changes) | {'gateway'}
+
+        # 禁用网卡、设置MAC地址、启用网卡在同一批请求中完成，
+        # 内核依次处理，设置MAC地址失败时网卡仍会重新启用
+        def change_mac():
+            with _netlink_session(netlink) as session:
+                index = _linux_link_index(session, card, netlink is None)
+                session.batch().set_link_up(index, False).set_hwaddr(index, mac).set_link_up(index, True).execute()
+        steps.append(ApplyStep("修改MAC地址", change_mac))
+
+        # 等待网卡完全启用
+        steps.append(ApplyStep("等待网卡启用", lambda: _wait_linux_link(card, True, sysfs_root)))
+
+    if 'ip' in changes:
+        # 删除原有地址时内核会删除经过该地址的路由，需要重新设置网关
+        changes = set(changes) | {'gateway'}
+
+    # 设置IP地址、子网掩码和网关
+    if 'ip' in changes or 'gateway' in changes:
+        def set_address():
+            with _netlink_session(netlink) as session:
+                index = _linux_link_index(session, card, netlink is None)
+                batch = session.batch()
+                if 'ip' in changes:
+                    prefixlen = validators.mask_to_cidr(validators.parse_netmask(netmask)[0])
+                    # 先删除其他IPv4地址再添加新地址；删除主地址会连带删除同网段的从地址，
+                    # 因此按相反顺序先删除排在后面的从地址
+                    for _, address, length in reversed(session.list_addresses(index)):
+                        if (address, length) != (ip, prefixlen):
+                            batch.delete_address(index, address, length)
+                    batch.add_address(index, ip, prefixlen)
+                batch.replace_default_route(index, gateway)
+                batch.execute()
+        title = "设置IP地址" if 'ip' in changes else "设置网关"
+        steps.append(ApplyStep(title, set_address))
+
+    # 设置DNS
+    if 'dns' in changes and dns and dns.strip():
+        def write_resolv_conf():
+            with open('/etc/resolv.conf', 'w') as f:
+                f.write(f'nameserver {dns.strip()}\n')
+                if s_dns and s_dns.strip():
+                    f.write(f'nameserver {s_dns.strip()}\n')
+        steps.append(ApplyStep("设置DNS", write_resolv_conf))
+
+    return steps
+
+
+def verify_step(card, ip, netmask, gateway, dns, s_dns, mac, system=None, changes=FIELDS):
+    """重新读取网卡配置并与目标配置比较的步骤，只检查本次修改的字段"""
+    def verify():
+        state = read_interface_state(card, system)
+        failed = diff_state(state, ip, netmask, gateway, dns, s_dns, mac) & set(changes)
+        if failed:
+            raise ApplyError(f"以下配置未生效: {', '.join(f for f in FIELDS if f in failed)}")
+    # 验证失败只记录日志，MAC地址等可选步骤失败时也会反映在这里
+    return ApplyStep("验证配置", verify, optional=True)
+
+
+def build_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, system=None, changes=FIELDS):
+    """根据操作系统生成应用配置的步骤，changes为需要修改的字段，默认全部修改"""
+    system = system or platform.system()
+    if system == "Windows":
+        steps = windows_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=changes)
+    elif system == "Darwin":
+        steps = macos_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=changes)
+    elif system == "Linux":
+        steps = linux_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, changes=changes)
+    else:
+        raise ApplyError(f"不支持的操作系统: {system}")
+    if steps:
+        from snapshots import snapshot_step
+        # 先保存网卡当前配置，之后的步骤失败时一次性恢复
+        steps.insert(0, snapshot_step(card, system))
+        steps.append(verify_step(card, ip, netmask, gateway, dns, s_dns, mac, system, changes))
+    return steps
+
+
+def plan_changes(card, ip, netmask, gateway, dns, s_dns, mac, system=None, state=None):
+    """读取网卡当前配置，返回需要修改的字段集合，state为已读取的网卡配置"""
+    if state is None:
+        state = read_interface_state(card, system)
+    changes = diff_state(state, ip, netmask, gateway, dns, s_dns, mac)
+    print(f"网卡 {card} 需要修改的配置: {', '.join(f for f in FIELDS if f in changes) or '无'}")
+    return changes
+
+
+def plan_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, system=None):
+    """读取网卡当前配置，只为发生变化的字段生成步骤，配置一致时返回空列表"""
+    system = system or platform.system()
+    changes = plan_changes(card, ip, netmask, gateway, dns, s_dns, mac, system)
+    return build_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, system, changes)
+
+
+def format_timings(timings):
+    """将步骤耗时格式化为日志文本"""
+    total = sum(elapsed for _, elapsed in timings)
+    lines = [f"应用配置总耗时 {total:.3f} 秒"]
+    lines.extend(f"  {title}: {elapsed:.3f} 秒" for title, elapsed in timings)
+    return '\n'.join(lines)
+
+
+def _rollback(done):
+    """按相反顺序撤销已执行的步骤，撤销过程不可取消，全部成功时返回True"""
+    restored = True
+    for step in reversed(done):
+        start = time.perf_counter()
+        try:
+            with command_runner.cancel_scope(None), tracing.span(f"撤销{step.title}", 'step'):
+                step.undo()
+        except Exception as e:
+            print(f"撤销{step.title}失败: {str(e)}")
+            restored = False
+        print(f"撤销{step.title}: {time.perf_counter() - start:.3f} 秒")
+    return restored
+
+
+def run_steps(steps, progress=None, cancel_event=None):
+    """依次执行步骤，返回各步骤耗时[(标题, 秒)]
+
+    progress(序号, 总数, 标题)在每个步骤开始前调用；cancel_event被设置后，
+    在下一个可取消的步骤之前抛出ApplyCancelled。失败或被取消时，
+    按相反顺序调用已执行步骤的undo恢复原配置
+    """
+    # 本次应用的耗时区间保存在内存中，供托盘菜单查看
+    with tracing.capture() as events:
+        try:
+            with tracing.span("应用配置", 'apply', steps=len(steps)):
+                return _run_steps(steps, progress, cancel_event)
+        finally:
+            tracing.set_last_apply(events)
+
+
+def _run_steps(steps, progress, cancel_event):
+    total = len(steps)
+    timings = []
+    done = []
+    try:
+        for index, step in enumerate(steps):
+            if step.cancellable and cancel_event is not None and cancel_event.is_set():
+                raise ApplyCancelled("已取消应用配置")
+            if progress:
+                progress(index, total, step.title)
+            start = time.perf_counter()
+            try:
+                # 可取消的步骤中正在执行的外部命令也会在取消时结束
+                with command_runner.cancel_scope(cancel_event if step.cancellable else None), \
+                        tracing.span(step.title, 'step', optional=step.optional):
+                    step.action()
+            except command_runner.CommandCancelled:
+                raise ApplyCancelled("已取消应用配置") from None
+            except Exception as e:
+                if step.optional:
+                    print(f"{step.title}失败: {str(e)}")
+                    continue
+                if isinstance(e, ApplyError):
+                    raise
+                raise ApplyError(f"{step.title}失败: {str(e)}") from e
+            finally:
+                timings.append((step.title, time.perf_counter() - start))
+            if step.undo is not None:
+                done.append(step)
+    except (ApplyError, ApplyCancelled) as e:
+        if done and _rollback(done):
+            e.args = (f"{e}，已恢复原配置",)
+        raise
+    except BaseException:
+        # Ctrl-C等中断同样恢复原配置，不让网卡停留在修改了一半的状态
+        if done:
+            _rollback(done)
+        raise
+    finally:
+        if timings:
+            # 执行过步骤后网卡的MAC地址、状态等可能已变化
+            get_registry().invalidate()
+            print(format_timings(timings))
+    if progress:
+        progress(total, total, "完成")
+    return timings
+
+
+def apply_config(card, ip, netmask, gateway, dns, s_dns, mac, mac_name, progress=None, cancel_event=None):
+    """同步应用网络配置，只修改发生变化的字段，返回各步骤耗时，失败时抛出ApplyError"""
+    steps = plan_steps(card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
+    return run_steps(steps, progress, cancel_event)
@@ -5,20 +5,32 @@
 使用PyQt6开发的图形界面工具，用于管理和切换网络配置
 """
 
+import functools
 import json
 import os
 import platform
-import subprocess
-import re
+import time
 from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QTreeWidget, QTreeWidgetItem, QWidget,
+    QApplication, QMainWindow, QTreeView, QWidget,
     QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox, QPushButton,
-    QMessageBox, QDialog, QDialogButtonBox, QSystemTrayIcon, QMenu
+    QMessageBox, QDialog, QDialogButtonBox, QSystemTrayIcon, QMenu, QProgressDialog,
+    QPlainTextEdit, QFileDialog
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QEvent, QTimer, QThread, QFileSystemWatcher, pyqtSignal
 from PyQt6.QtGui import QIcon, QAction
+from config_tree_model import ConfigTreeModel
+from profile_records import ProfileTable
+from profile_db import ProfileDatabase, is_database
+from config_loader import iter_departments, load_config_file, ConfigFormatError
+from search_worker import SearchWorker
+import tracing
+import validators
 
 class NetworkConfigTool(QMainWindow):
+    # 发往搜索线程的信号
+    search_requested = pyqtSignal(int, str)
+    index_requested = pyqtSignal(object)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("网络配置管理工具")
@@ -53,6 +65,11 @@ class NetworkConfigTool(QMainWindow):
                 # 未打包：获取当前工作目录
                 exe_dir = os.path.abspath('.')
             
+            # 程序所在目录存在SQLite配置库config.db时优先使用
+            config_path = os.path.join(exe_dir, 'config.db')
+            if os.path.exists(config_path):
+                return config_path
+            
             # 检查程序所在目录是否存在config.json
             config_path = os.path.join(exe_dir, 'config.json')
             if os.path.exists(config_path):
@@ -68,18 +85,41 @@ class NetworkConfigTool(QMainWindow):
         # 配置文件路径
         self.config_file = get_config_path()
         
-        # 加载配置数据
-        self.config_data = self.load_config()
+        # 配置数据在窗口显示后流式加载
+        self.profiles = ProfileTable()
+        self._config_iter = None
+        
+        # 配置文件被修改后在后台重新加载，_config_stat为当前配置对应的(修改时间, 大小)
+        self.config_watcher = None
+        self.config_reload_thread = None
+        self.config_reload_worker = None
+        self._config_stat = None
+        self._reload_pending = False
+        
+        # 后台应用配置的线程
+        self.apply_thread = None
+        self.apply_worker = None
+        
+        # 后台检测DNS延迟的线程
+        self.dns_probe_thread = None
+        self.dns_probe_worker = None
         
         # 创建主布局
         main_widget = QWidget()
         main_layout = QHBoxLayout(main_widget)
         
-        # 左侧树形结构
-        self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderLabel("配置列表")
-        self.tree_widget.itemClicked.connect(self.on_item_clicked)
-        main_layout.addWidget(self.tree_widget, 1)
+        # 左侧搜索框和树形结构（用户节点在展开部门时懒加载）
+        tree_panel = QWidget()
+        self.tree_layout = QVBoxLayout(tree_panel)
+        self.tree_layout.setContentsMargins(0, 0, 0, 0)
+        self.add_search_box()
+        self.tree_model = ConfigTreeModel(parent=self)
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setUniformRowHeights(True)
+        self.tree_view.clicked.connect(self.on_item_clicked)
+        self.tree_layout.addWidget(self.tree_view)
+        main_layout.addWidget(tree_panel, 1)
         
         # 右侧配置面板
         self.config_panel = QWidget()
@@ -101,136 +141,280 @@ class NetworkConfigTool(QMainWindow):
         # 添加确定按钮
         self.add_confirm_button()
         
-        # 填充树形结构
-        self.populate_tree()
-        
         # 设置主窗口
         self.setCentralWidget(main_widget)
         
+        # 配置加载、网卡监听和系统托盘在窗口首次绘制后再初始化，不推迟窗口显示
+        self.tray_icon = None
+        self.revert_action = None
+        self.nic_thread = None
+        self.startup_finished = False
+        self.config_group.installEventFilter(self)
+    
+    def eventFilter(self, obj, event):
+        """窗口首次绘制后继续初始化"""
+        if obj is self.config_group and event.type() == QEvent.Type.Paint and not self.startup_finished:
+            self.startup_finished = True
+            self.config_group.removeEventFilter(self)
+            QTimer.singleShot(0, self.finish_startup)
+        return super().eventFilter(obj, event)
+    
+    def finish_startup(self):
+        """窗口显示后初始化的部分"""
+        # 填充树形结构（配置流式加载，首批部门在解析完成前即可显示）
+        self.start_config_loading()
+        self.watch_config_file()
+        
+        # 加载网卡信息
+        self.load_network_cards()
+        
         # 初始化系统托盘
         self.init_tray()
     
+    def check_config_file(self):
+        """检查配置文件是否存在且可读"""
+        # 检查文件是否存在
+        if not os.path.exists(self.config_file):
+            QMessageBox.warning(self, "警告", f"配置文件不存在: {self.config_file}\n将使用默认空配置")
+            return False
+        
+        # 检查文件是否可读
+        if not os.access(self.config_file, os.R_OK):
+            QMessageBox.warning(self, "警告", f"配置文件不可读: {self.config_file}\n将使用默认空配置")
+            return False
+        
+        return True
+    
+    def config_load_failed(self, error):
+        """提示配置加载失败"""
+        if isinstance(error, ConfigFormatError):
+            QMessageBox.warning(self, "警告", f"{str(error)}\n将使用默认空配置")
+        elif isinstance(error, json.JSONDecodeError):
+            QMessageBox.warning(self, "警告", f"配置文件格式错误: {str(error)}\n将使用默认空配置")
+        else:
+            QMessageBox.warning(self, "警告", f"加载配置文件失败: {str(error)}\n将使用默认空配置")
+    
     def load_config(self):
         """加载配置文件"""
         try:
-            # 检查文件是否存在
-            if not os.path.exists(self.config_file):
-                QMessageBox.warning(self, "警告", f"配置文件不存在: {self.config_file}\n将使用默认空配置")
+            if not self.check_config_file():
                 return []
             
-            # 检查文件是否可读
-            if not os.access(self.config_file, os.R_OK):
-                QMessageBox.warning(self, "警告", f"配置文件不可读: {self.config_file}\n将使用默认空配置")
-                return []
-            
-            # 读取配置文件
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
-            
-            # 验证配置文件格式
-            if not isinstance(config_data, list):
-                QMessageBox.warning(self, "警告", "配置文件格式不正确，应为列表格式\n将使用默认空配置")
-                return []
-            
-            return config_data
-        except json.JSONDecodeError as e:
-            QMessageBox.warning(self, "警告", f"配置文件格式错误: {str(e)}\n将使用默认空配置")
-            return []
+            # 读取配置文件（有效的预解析缓存优先）
+            return load_config_file(self.config_file)
         except Exception as e:
-            QMessageBox.warning(self, "警告", f"加载配置文件失败: {str(e)}\n将使用默认空配置")
+            self.config_load_failed(e)
             return []
     
-    def validate_ip(self, ip):
-        """验证IPv4地址格式"""
-        if not ip or not ip.strip():
-            return False, "IP地址不能为空"
-        
-        # 正则表达式验证IPv4地址格式
-        ip_pattern = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-        if not re.match(ip_pattern, ip):
-            return False, "IP地址格式不正确，应为 xxx.xxx.xxx.xxx"
-        
-        # 验证每个 octet 是否在 0-255 之间
-        octets = ip.split('.')
-        for octet in octets:
+    def start_config_loading(self):
+        """开始分批加载配置，每批在事件循环中执行一小段时间"""
+        self.profiles = ProfileTable()
+        self.populate_tree()
+        self._config_stat = self.config_file_stat()
+        if not self.check_config_file():
+            return
+        if is_database(self.config_file):
+            # 配置库只读取部门列表，用户在展开、点击和搜索时按需查询
             try:
-                value = int(octet)
-                if value < 0 or value > 255:
-                    return False, f"IP地址的每个部分应在 0-255 之间，当前值: {octet}"
-            except ValueError:
-                return False, f"IP地址的每个部分应为数字，当前值: {octet}"
+                with tracing.span("打开配置库", path=self.config_file):
+                    self.profiles = ProfileDatabase(self.config_file)
+            except Exception as e:
+                self.profiles = ProfileTable()
+                self.config_load_failed(e)
+            self.populate_tree()
+            self.index_requested.emit(self.profiles)
+            return
+        self._config_iter = iter_departments(self.config_file, cache_in_background=True)
+        QTimer.singleShot(0, self.load_config_batch)
+    
+    def load_config_batch(self):
+        """加载一批部门并追加到树形结构，解析和转换共用每批10毫秒的时间"""
+        finished = True
+        deadline = time.perf_counter() + 0.01
+        try:
+            with tracing.span("加载配置", path=self.config_file):
+                for dept in self._config_iter:
+                    # 转换为紧凑的配置表，不保留原始的用户字典
+                    self.profiles.append_department(dept)
+                    if time.perf_counter() >= deadline:
+                        finished = False
+                        break
+        except Exception as e:
+            # 与一次性加载保持一致，加载失败时使用空配置
+            self._config_iter = None
+            self.profiles = ProfileTable()
+            self.populate_tree()
+            self.index_requested.emit(self.profiles)
+            self.config_load_failed(e)
+            self.run_pending_reload()
+            return
+        
+        self.tree_model.departments_added()
+        if finished:
+            self._config_iter = None
+            # 配置加载完成后在搜索线程中建立索引，之后配置表不再修改
+            self.index_requested.emit(self.profiles)
+            self.run_pending_reload()
+        else:
+            QTimer.singleShot(0, self.load_config_batch)
+    
+    def config_file_stat(self):
+        """配置文件的(修改时间, 大小)，文件不存在时为None"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def watch_config_file(self):
+        """监视配置文件，被修改或替换后自动重新加载"""
+        self.config_watcher = QFileSystemWatcher(self)
+        # 同时监视所在目录：编辑器保存或管理员替换文件后原文件不再被监视
+        self.config_watcher.addPath(os.path.dirname(os.path.abspath(self.config_file)))
+        if os.path.exists(self.config_file):
+            self.config_watcher.addPath(self.config_file)
+        self.config_watcher.fileChanged.connect(self.on_config_file_changed)
+        self.config_watcher.directoryChanged.connect(self.on_config_file_changed)
+        
+        # 写入过程中会连续收到多次通知，停顿后再加载
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(500)
+        self.reload_timer.timeout.connect(self.reload_config)
+    
+    def on_config_file_changed(self, path):
+        """配置文件或所在目录变化，写入预解析缓存等其他文件的变化不触发加载"""
+        if os.path.exists(self.config_file) and self.config_file not in self.config_watcher.files():
+            self.config_watcher.addPath(self.config_file)
+        if self.config_file_stat() != self._config_stat:
+            self.reload_timer.start()
+    
+    def reload_config(self):
+        """在后台线程中重新加载配置并与当前配置比较，正在加载时等加载完成后再执行"""
+        from config_reload_worker import ConfigReloadWorker
         
-        return True, ""
+        if self._config_iter is not None or self.config_reload_thread is not None:
+            self._reload_pending = True
+            return
+        stat = self.config_file_stat()
+        # 文件被删除时保留当前配置
+        if stat is None or stat == self._config_stat:
+            return
+        self._config_stat = stat
+        
+        self.config_reload_thread = QThread(self)
+        self.config_reload_worker = ConfigReloadWorker(self.config_file, self.profiles)
+        self.config_reload_worker.moveToThread(self.config_reload_thread)
+        self.config_reload_thread.started.connect(self.config_reload_worker.run)
+        self.config_reload_worker.finished.connect(self.on_config_reloaded)
+        self.config_reload_worker.failed.connect(self.on_config_reload_failed)
+        self.config_reload_worker.finished.connect(self.config_reload_thread.quit)
+        self.config_reload_worker.failed.connect(self.config_reload_thread.quit)
+        self.config_reload_thread.finished.connect(self.config_reload_worker.deleteLater)
+        self.config_reload_thread.finished.connect(self.on_config_reload_finished)
+        self.config_reload_thread.start()
+    
+    def on_config_reloaded(self, table, diff):
+        """只更新配置树中变化的行，展开和选中的节点保持不变"""
+        if diff is None:
+            # 无法与替换前的配置库比较，重新创建配置树
+            self.profiles = table
+            self.populate_tree()
+            self.index_requested.emit(self.profiles)
+            print(f"配置库已更新，共 {len(table)} 个用户")
+            return
+        if not diff:
+            print("配置文件已更新，内容没有变化")
+            return
+        old = self.profiles
+        with tracing.span("更新配置树"):
+            self.tree_model.apply_diff(table, diff)
+        self.profiles = table
+        self.index_requested.emit(self.profiles)
+        print(f"配置文件已更新，{diff.describe(old, table)}")
+        
+        # 正在查看的用户被修改时刷新右侧面板
+        index = self.tree_view.currentIndex()
+        row = index.data(Qt.ItemDataRole.UserRole) if index.isValid() else None
+        if row is not None and any(row in (table.row_of(d.new_row, p) for p in d.changed) for d in diff.kept):
+            self.on_item_clicked(index)
+    
+    def on_config_reload_failed(self, error):
+        """重新加载失败时继续使用当前配置，文件修正后再次加载"""
+        print(f"重新加载配置失败: {str(error)}")
+    
+    def on_config_reload_finished(self):
+        self.config_reload_thread.deleteLater()
+        self.config_reload_thread = None
+        self.config_reload_worker = None
+        self.run_pending_reload()
+    
+    def run_pending_reload(self):
+        """加载期间配置文件又被修改过时再加载一次"""
+        if self._reload_pending:
+            self._reload_pending = False
+            self.reload_timer.start()
+    
+    def validate_ip(self, ip):
+        """验证IPv4地址格式"""
+        return validators.validate_ip(ip)
     
     def validate_subnet_mask(self, subnet_mask):
         """验证子网掩码格式（支持CIDR表示法）"""
-        if not subnet_mask or not subnet_mask.strip():
-            return False, "子网掩码不能为空"
-        
-        # 检查是否为 CIDR 表示法（如 24）
-        if subnet_mask.isdigit():
-            cidr = int(subnet_mask)
-            if cidr < 0 or cidr > 32:
-                return False, "CIDR表示法应在 0-32 之间"
-            return True, ""
-        
-        # 正则表达式验证子网掩码格式
-        mask_pattern = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-        if not re.match(mask_pattern, subnet_mask):
-            return False, "子网掩码格式不正确，应为 xxx.xxx.xxx.xxx 或 CIDR表示法（如 24）"
-        
-        # 验证每个 octet 是否在 0-255 之间
-        octets = subnet_mask.split('.')
-        for octet in octets:
-            try:
-                value = int(octet)
-                if value < 0 or value > 255:
-                    return False, f"子网掩码的每个部分应在 0-255 之间，当前值: {octet}"
-            except ValueError:
-                return False, f"子网掩码的每个部分应为数字，当前值: {octet}"
-        
-        # 验证是否为有效的子网掩码
-        # 将子网掩码转换为二进制
-        binary_mask = ''.join([bin(int(octet))[2:].zfill(8) for octet in octets])
-        # 有效的子网掩码应该是连续的1后面跟着连续的0
-        if '01' in binary_mask:
-            return False, "子网掩码格式不正确，应为连续的1后面跟着连续的0"
-        
-        return True, ""
-    
-    def validate_gateway(self, gateway):
-        """验证网关地址格式"""
-        if not gateway or not gateway.strip():
-            return False, "网关不能为空"
-        
-        # 正则表达式验证IPv4地址格式
-        ip_pattern = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-        if not re.match(ip_pattern, gateway):
-            return False, "网关地址格式不正确，应为 xxx.xxx.xxx.xxx"
-        
-        # 验证每个 octet 是否在 0-255 之间
-        octets = gateway.split('.')
-        for octet in octets:
-            try:
-                value = int(octet)
-                if value < 0 or value > 255:
-                    return False, f"网关地址的每个部分应在 0-255 之间，当前值: {octet}"
-            except ValueError:
-                return False, f"网关地址的每个部分应为数字，当前值: {octet}"
-        
-        return True, ""
+        return validators.validate_subnet_mask(subnet_mask)
+    
+    def validate_gateway(self, gateway, ip=None, netmask=None):
+        """验证网关地址格式，给出IP和子网掩码时检查网关是否在子网内"""
+        return validators.validate_gateway(gateway, ip, netmask)
+    
+    def add_search_box(self):
+        """添加搜索框，输入停顿后在后台线程中查询"""
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索姓名/IP/MAC/设备名称/拼音首字母")
+        self.search_edit.setClearButtonEnabled(True)
+        self.tree_layout.addWidget(self.search_edit)
+        
+        # 输入防抖
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        
+        # 搜索线程
+        self._search_seq = 0
+        self.search_thread = QThread(self)
+        self.search_worker = SearchWorker()
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_requested.connect(self.search_worker.search)
+        self.index_requested.connect(self.search_worker.build_index)
+        self.search_worker.results_ready.connect(self.on_search_results)
+        self.search_worker.index_ready.connect(lambda count: self.run_search())
+        self.search_thread.finished.connect(self.search_worker.deleteLater)
+        self.search_thread.start()
+    
+    def run_search(self):
+        """提交当前搜索框内容"""
+        self._search_seq += 1
+        self.search_worker.latest_seq = self._search_seq
+        query = self.search_edit.text().strip()
+        if not query:
+            if self.tree_model.is_filtered():
+                self.tree_model.set_filter(None)
+            return
+        self.search_requested.emit(self._search_seq, query)
+    
+    def on_search_results(self, seq, matches):
+        """显示搜索结果，过期的结果直接丢弃"""
+        if seq != self._search_seq:
+            return
+        self.tree_model.set_filter(matches)
+        self.tree_view.expandAll()
     
     def populate_tree(self):
         """填充树形结构"""
-        for dept in self.config_data:
-            dept_item = QTreeWidgetItem([dept['department']])
-            for user in dept['users']:
-                user_item = QTreeWidgetItem([user['name']])
-                # 存储用户配置数据
-                user_item.setData(0, Qt.ItemDataRole.UserRole, user)
-                dept_item.addChild(user_item)
-            self.tree_widget.addTopLevelItem(dept_item)
-            dept_item.setExpanded(True)
+        # 只创建部门节点，部门默认折叠，用户节点在展开时由模型分批加载
+        self.tree_model.set_config(self.profiles)
     
     def create_config_fields(self):
         """创建配置字段"""
@@ -299,8 +483,13 @@ class NetworkConfigTool(QMainWindow):
         self.dns_label.setFixedWidth(80)
         self.dns_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
         self.dns_edit = QLineEdit()
+        # 同时测量首选和备用DNS的延迟
+        self.dns_probe_button = QPushButton("测速")
+        self.dns_probe_button.setToolTip("测量首选和备用DNS的响应延迟")
+        self.dns_probe_button.clicked.connect(self.probe_dns)
         dns_layout.addWidget(self.dns_label)
         dns_layout.addWidget(self.dns_edit)
+        dns_layout.addWidget(self.dns_probe_button)
         form_layout.addLayout(dns_layout)
         
         # 备用DNS
@@ -313,6 +502,11 @@ class NetworkConfigTool(QMainWindow):
         s_dns_layout.addWidget(self.s_dns_edit)
         form_layout.addLayout(s_dns_layout)
         
+        # DNS测速结果
+        self.dns_probe_label = QLabel()
+        self.dns_probe_label.setVisible(False)
+        form_layout.addWidget(self.dns_probe_label)
+        
         # MAC地址
         mac_layout = QHBoxLayout()
         self.mac_label = QLabel("MAC地址:")
@@ -346,46 +540,46 @@ class NetworkConfigTool(QMainWindow):
         self.card_layout.addWidget(self.card_label)
         self.card_layout.addWidget(self.card_combo)
         self.config_group_layout.addLayout(self.card_layout)
-        
-        # 加载网卡信息
-        self.load_network_cards()
     
     def load_network_cards(self):
-        """加载本地网卡信息"""
-        cards = self.get_network_cards()
-        for card in cards:
+        """在后台线程中加载本地网卡信息，并持续监听网卡的增删和改名"""
+        from adapter_registry import get_registry
+        from nic_watcher import NicWatcher
+        
+        self.nic_thread = QThread(self)
+        self.nic_watcher = NicWatcher(get_registry())
+        self.nic_watcher.moveToThread(self.nic_thread)
+        self.nic_watcher.card_added.connect(self.on_card_added)
+        self.nic_watcher.card_removed.connect(self.on_card_removed)
+        self.nic_watcher.card_renamed.connect(self.on_card_renamed)
+        self.nic_thread.started.connect(self.nic_watcher.run)
+        self.nic_thread.start()
+    
+    def on_card_added(self, card):
+        """新增网卡，已选中的网卡保持不变"""
+        if self.card_combo.findText(card) < 0:
             self.card_combo.addItem(card)
     
+    def on_card_removed(self, card):
+        """移除网卡"""
+        index = self.card_combo.findText(card)
+        if index >= 0:
+            self.card_combo.removeItem(index)
+    
+    def on_card_renamed(self, old_name, new_name):
+        """网卡改名，原位置更新名称，选中状态不变"""
+        index = self.card_combo.findText(old_name)
+        if index >= 0:
+            self.card_combo.setItemText(index, new_name)
+        else:
+            self.on_card_added(new_name)
+    
     def get_network_cards(self):
         """跨平台获取网卡信息"""
-        system = platform.system()
         cards = []
-        
         try:
-            if system == "Windows":
-                import wmi
-                w = wmi.WMI()
-                for nic in w.Win32_NetworkAdapter():
-                    if nic.NetConnectionStatus == 2:  # 已连接
-                        # 使用NetConnectionID获取显示名称，如"以太网 3"
-                        if hasattr(nic, 'NetConnectionID') and nic.NetConnectionID:
-                            cards.append(nic.NetConnectionID)
-                        else:
-                            # 如果没有NetConnectionID属性，使用Name属性
-                            cards.append(nic.Name)
-            elif system == "Darwin":  # macOS
-                result = subprocess.run(['networksetup', '-listallnetworkservices'], 
-                                       capture_output=True, text=True)
-                lines = result.stdout.strip().split('\n')[1:]  # 跳过第一行标题
-                cards = [line.strip() for line in lines]
-            elif system == "Linux":
-                result = subprocess.run(['ip', 'link', 'show'], 
-                                       capture_output=True, text=True)
-                lines = result.stdout.strip().split('\n')
-                for line in lines:
-                    if ': <' in line and not line.strip().startswith('lo:'):
-                        card_name = line.split(':')[1].strip().split(' ')[0]
-                        cards.append(card_name)
+            from adapter_registry import get_registry
+            cards = get_registry().card_names()
         except Exception as e:
             print(f"获取网卡信息失败: {str(e)}")
         
@@ -400,36 +594,71 @@ class NetworkConfigTool(QMainWindow):
         self.button_layout.addWidget(self.confirm_button)
         self.config_layout.addLayout(self.button_layout)
     
-    def on_item_clicked(self, item, column):
+    def on_item_clicked(self, index):
         """树形节点点击事件"""
         # 检查是否是用户节点
-        user_data = item.data(0, Qt.ItemDataRole.UserRole)
-        if user_data:
-            # 更新右侧面板
-            # 检查是否有设备类型
-            if 'deviceType' in user_data:
-                self.device_edit.setText(user_data['deviceType'])
-            else:
-                self.device_edit.setText('')
-            if 'deviceName' in user_data:
-                self.deviceName_edit.setText(user_data['deviceName'])
-            else:
-                self.deviceName_edit.setText('')
-            self.ip_edit.setText(user_data['ip'])
-            self.netmask_edit.setText(user_data['netmask'])
-            self.gateway_edit.setText(user_data['gateway'])
-            self.dns_edit.setText(user_data['dns'])
-            # 检查是否有备用DNS
-            if 's_dns' in user_data:
-                self.s_dns_edit.setText(user_data['s_dns'])
-            else:
-                self.s_dns_edit.setText('')
-            self.mac_edit.setText(user_data['mac'])
-            # 检查是否有物理地址名称
-            if 'mac_name' in user_data:
-                self.mac_name_edit.setText(user_data['mac_name'])
-            else:
-                self.mac_name_edit.setText('Network Address')
+        row = index.data(Qt.ItemDataRole.UserRole)
+        if row is not None:
+            # 更新右侧面板，缺少的字段在加载时已填入默认值
+            user = self.profiles.record(row)
+            self.device_edit.setText(user.deviceType)
+            self.deviceName_edit.setText(user.deviceName)
+            self.ip_edit.setText(user.ip)
+            self.netmask_edit.setText(user.netmask)
+            self.gateway_edit.setText(user.gateway)
+            self.dns_edit.setText(user.dns)
+            self.s_dns_edit.setText(user.s_dns)
+            self.mac_edit.setText(user.mac)
+            self.mac_name_edit.setText(user.mac_name)
+            # 上一个用户的测速结果不再适用
+            self.dns_probe_label.setVisible(False)
+    
+    def probe_dns(self):
+        """在后台线程中测量首选和备用DNS的延迟"""
+        from dns_probe_worker import DnsProbeWorker
+        
+        servers = [self.dns_edit.text().strip(), self.s_dns_edit.text().strip()]
+        if not any(servers):
+            QMessageBox.information(self, "提示", "请先填写DNS服务器")
+            return
+        if self.dns_probe_thread is not None:
+            return
+        
+        self.dns_probe_button.setEnabled(False)
+        self.dns_probe_label.setText("正在测量DNS延迟...")
+        self.dns_probe_label.setVisible(True)
+        
+        self.dns_probe_thread = QThread(self)
+        self.dns_probe_worker = DnsProbeWorker(servers)
+        self.dns_probe_worker.moveToThread(self.dns_probe_thread)
+        self.dns_probe_thread.started.connect(self.dns_probe_worker.run)
+        self.dns_probe_worker.finished.connect(self.on_dns_probed)
+        self.dns_probe_worker.finished.connect(self.dns_probe_thread.quit)
+        self.dns_probe_thread.finished.connect(self.dns_probe_worker.deleteLater)
+        self.dns_probe_thread.finished.connect(self.on_dns_probe_finished)
+        self.dns_probe_thread.start()
+    
+    def on_dns_probed(self, results):
+        """显示测速结果，备用DNS明显更快或首选DNS无应答时询问是否交换"""
+        import dns_probe
+        
+        self.dns_probe_label.setText("；".join(result.describe() for result in results.values()))
+        dns = self.dns_edit.text().strip()
+        s_dns = self.s_dns_edit.text().strip()
+        if dns_probe.rank(dns, s_dns, results) != (dns, s_dns):
+            message = "\n".join(dns_probe.warnings(dns, s_dns, results))
+            reply = QMessageBox.question(self, "DNS测速", f"{message}\n\n是否交换首选和备用DNS？",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.Yes:
+                self.dns_edit.setText(s_dns)
+                self.s_dns_edit.setText(dns)
+    
+    def on_dns_probe_finished(self):
+        """测速线程结束后恢复按钮"""
+        self.dns_probe_thread.deleteLater()
+        self.dns_probe_thread = None
+        self.dns_probe_worker = None
+        self.dns_probe_button.setEnabled(True)
     
     def on_confirm(self):
         """确定按钮点击事件"""
@@ -457,7 +686,7 @@ class NetworkConfigTool(QMainWindow):
             return
         
         # 验证网关
-        gateway_valid, gateway_error = self.validate_gateway(gateway)
+        gateway_valid, gateway_error = self.validate_gateway(gateway, ip, netmask)
         if not gateway_valid:
             QMessageBox.warning(self, "警告", gateway_error)
             return
@@ -475,6 +704,14 @@ class NetworkConfigTool(QMainWindow):
             layout.addWidget(QLabel(f"备用DNS: {s_dns}"))
         layout.addWidget(QLabel(f"MAC地址: {mac}"))
         layout.addWidget(QLabel(f"物理地址名称: {mac_name}"))
+        # 已测速时提示DNS的问题，只使用缓存中的结果，不在界面线程中发送查询
+        import dns_probe
+        cache = dns_probe.get_cache()
+        results = {server: cache.get(server) for server in (dns.strip(), s_dns.strip()) if cache.get(server)}
+        for message in dns_probe.warnings(dns.strip(), s_dns.strip(), results):
+            warning = QLabel(f"<span style='color:red'>注意: {message}</span>")
+            warning.setTextFormat(Qt.TextFormat.RichText)
+            layout.addWidget(warning)
         
         buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | 
                                   QDialogButtonBox.StandardButton.Cancel, dialog)
@@ -483,209 +720,170 @@ class NetworkConfigTool(QMainWindow):
         layout.addWidget(buttons)
         
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            # 应用配置
-            success = self.apply_config(selected_card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
-            if success:
-                QMessageBox.information(self, "成功", "网络配置修改成功")
-            else:
-                QMessageBox.critical(self, "失败", "网络配置修改失败")
+            # 在后台线程中应用配置，结果通过信号返回
+            self.apply_config(selected_card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
     
     def apply_config(self, card, ip, netmask, gateway, dns, s_dns, mac, mac_name):
-        """应用网络配置"""
+        """应用网络配置，各步骤在工作线程中执行"""
+        # 首次应用配置时才加载
+        import network_apply
+        import apply_helper
+        
         system = platform.system()
         
-        try:
-            if system == "Windows":
-                return self.apply_config_windows(card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
-            elif system == "Darwin":
-                return self.apply_config_macos(card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
-            elif system == "Linux":
-                return self.apply_config_linux(card, ip, netmask, gateway, dns, s_dns, mac, mac_name)
-            else:
-                QMessageBox.warning(self, "警告", f"不支持的操作系统: {system}")
-                return False
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"应用配置失败: {str(e)}")
-            return False
-    
-    def apply_config_windows(self, card, ip, netmask, gateway, dns, s_dns, mac, mac_name):
-        """在Windows上应用配置"""
-        try:
+        # 特权助手运行时由助手应用配置，界面本身不需要提权
+        if apply_helper.helper_available():
+            profile = {'ip': ip, 'netmask': netmask, 'gateway': gateway, 'dns': dns,
+                       's_dns': s_dns, 'mac': mac, 'mac_name': mac_name}
+            plan = functools.partial(apply_helper.helper_steps, card, profile)
+        else:
             # 检查是否以管理员身份运行
-            import ctypes
-            is_admin = ctypes.windll.shell32.IsUserAnAdmin() != 0
-            if not is_admin:
+            if system == "Windows" and not network_apply.is_admin():
                 QMessageBox.warning(self, "权限提示", "请以管理员身份运行程序，否则网络配置可能无法生效")
-            
-            # 获取网卡索引
-            import wmi
-            w = wmi.WMI()
-            nic_index = None
-            for nic in w.Win32_NetworkAdapter():
-                # 检查NetConnectionID是否匹配（显示名称，如"以太网 3"）
-                if hasattr(nic, 'NetConnectionID') and nic.NetConnectionID == card:
-                    nic_index = nic.Index
-                    break
-                # 如果NetConnectionID不匹配，检查Name属性
-                elif nic.Name == card:
-                    nic_index = nic.Index
-                    break
-            
-            if not nic_index:
-                QMessageBox.critical(self, "错误", f"找不到网卡: {card}")
-                return False
-            
-            # 打印网卡信息
-
-            
-            # 设置IP地址、子网掩码和网关
-            cmd = f"netsh interface ip set addr \"{card}\" static {ip} {netmask} {gateway}"
-            # 使用正确的编码处理输出
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if result.returncode != 0:
-                error_msg = result.stderr if result.stderr else "未知错误"
-                QMessageBox.critical(self, "错误", f"设置IP地址失败: {error_msg}")
-                return False
-            
-            # 设置DNS
-            if dns and dns.strip():
-                cmd = f"netsh interface ip set dns \"{card}\" static {dns} primary"
-                # 使用正确的编码处理输出
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                
-                if result.returncode != 0:
-                    error_msg = result.stderr if result.stderr else "未知错误"
-                    QMessageBox.critical(self, "错误", f"设置DNS失败: {error_msg}")
-                    return False
-            
-            # 设置备用DNS
-            if s_dns and s_dns.strip():
-                cmd = f"netsh interface ip add dns \"{card}\" {s_dns} index=2"
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-                
-                if result.returncode != 0:
-                    error_msg = result.stderr if result.stderr else "未知错误"
-                    print(f"设置备用DNS失败: {error_msg}")
-                    # 备用DNS设置失败不影响其他配置
-            
-            # 验证配置是否生效
-            cmd = f"netsh interface ip show addresses \"{card}\""
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            cmd = f"netsh interface ip show dnsservers \"{card}\""
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # 尝试修改MAC地址
-            if mac:
-                try:
-                    # 禁用网卡
-                    cmd = f"netsh interface set interface \"{card}\" admin=disable"
-                    subprocess.run(cmd, shell=True, check=True)
-                    
-                    # 等待网卡完全禁用
-                    import time
-                    time.sleep(2)
-                    
-                    # 修改MAC地址（使用PowerShell）
-                    # 使用用户提供的PowerShell代码格式
-                    ps_mac_script = f"$adapter = Get-NetAdapter -Name '{card}'; if ($adapter) {{ Set-NetAdapterAdvancedProperty -Name '{card}' -DisplayName '{mac_name}' -DisplayValue '{mac}'; Write-Output 'MAC地址修改成功'; }}"
-                    
-                    result = subprocess.run(
-                        ['powershell', '-ExecutionPolicy', 'Bypass', '-Command', ps_mac_script],
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        encoding='utf-8',
-                        errors='ignore'
-                    )
-                    
-                    # 启用网卡
-                    cmd = f"netsh interface set interface \"{card}\" admin=enable"
-                    subprocess.run(cmd, shell=True, check=True)
-                    
-                    # 等待网卡完全启用
-                    time.sleep(3)
-                    
-                except Exception as e:
-                    print(f"修改MAC地址失败: {str(e)}")
-                    # MAC地址修改失败不影响其他配置
-                    # 尝试重新启用网卡
-                    try:
-                        cmd = f"netsh interface set interface \"{card}\" admin=enable"
-                        subprocess.run(cmd, shell=True, check=True)
-                    except:
-                        pass
-                
-                # 验证MAC地址
-                ps_mac_check = f"Get-NetAdapter -Name '{card}' | Select-Object Name, MacAddress"
-                result = subprocess.run(
-                    ['powershell', '-ExecutionPolicy', 'Bypass', '-Command', ps_mac_check],
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    encoding='utf-8',
-                    errors='ignore'
-                )
-            else:
-                print("MAC地址为空，跳过修改")
-            
+            # 只执行与网卡当前配置不同的步骤
+            plan = functools.partial(network_apply.plan_steps, card, ip, netmask, gateway, dns, s_dns,
+                                     mac, mac_name, system)
+        return self.start_apply(plan)
+    
+    def start_apply(self, plan, title="应用配置"):
+        """在工作线程中生成并执行步骤，plan为返回步骤列表的函数"""
+        from apply_worker import ApplyWorker
+        
+        self.confirm_button.setEnabled(False)
+        if self.revert_action is not None:
+            self.revert_action.setEnabled(False)
+        
+        # 进度对话框，读取网卡当前配置期间显示为忙碌状态
+        self.apply_progress = QProgressDialog(f"正在{title}...", "取消", 0, 0, self)
+        self.apply_progress.setWindowTitle(title)
+        self.apply_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.apply_progress.setMinimumDuration(0)
+        self.apply_progress.setAutoClose(False)
+        self.apply_progress.setAutoReset(False)
+        
+        # 工作线程
+        self.apply_thread = QThread(self)
+        self.apply_worker = ApplyWorker(plan)
+        self.apply_worker.moveToThread(self.apply_thread)
+        self.apply_thread.started.connect(self.apply_worker.run)
+        self.apply_worker.progress.connect(self.on_apply_progress)
+        self.apply_worker.succeeded.connect(self.on_apply_succeeded)
+        self.apply_worker.failed.connect(self.on_apply_failed)
+        self.apply_worker.cancelled.connect(self.on_apply_cancelled)
+        self.apply_worker.unchanged.connect(self.on_apply_unchanged)
+        for signal in (self.apply_worker.succeeded, self.apply_worker.failed, self.apply_worker.cancelled,
+                       self.apply_worker.unchanged):
+            signal.connect(self.apply_thread.quit)
+        self.apply_thread.finished.connect(self.apply_worker.deleteLater)
+        self.apply_thread.finished.connect(self.on_apply_finished)
+        # 直接在界面线程设置取消标记，工作线程忙于执行步骤时也能及时生效
+        self.apply_progress.canceled.connect(self.apply_worker.cancel_event.set)
+        
+        self.apply_thread.start()
+        self.apply_progress.show()
+        return True
+    
+    def on_apply_progress(self, index, total, title):
+        """更新应用配置进度"""
+        self.apply_progress.setMaximum(total)
+        self.apply_progress.setValue(index)
+        if total:
+            self.apply_progress.setLabelText(f"正在应用配置 ({min(index + 1, total)}/{total}): {title}")
+        else:
+            self.apply_progress.setLabelText(f"{title}...")
+    
+    def on_apply_succeeded(self, timings):
+        """应用配置成功"""
+        self.apply_progress.close()
+        elapsed = sum(seconds for _, seconds in timings)
+        if platform.system() == "Windows":
             # 提示用户可能需要重启网卡
             QMessageBox.information(self, "提示", "网络配置已应用，某些更改可能需要重启网卡才能完全生效。")
-            
-            return True
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"应用配置失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return False
+        QMessageBox.information(self, "成功", f"网络配置修改成功（耗时 {elapsed:.1f} 秒）")
     
-    def apply_config_macos(self, card, ip, netmask, gateway, dns, s_dns, mac, mac_name):
-        """在macOS上应用配置"""
-        # 设置IP地址和子网掩码
-        cmd = f"networksetup -setmanual '{card}' {ip} {netmask} {gateway}"
-        subprocess.run(cmd, shell=True, check=True)
-        
-        # 设置DNS
-        if dns and dns.strip():
-            if s_dns and s_dns.strip():
-                cmd = f"networksetup -setdnsservers '{card}' {dns} {s_dns}"
-            else:
-                cmd = f"networksetup -setdnsservers '{card}' {dns}"
-            subprocess.run(cmd, shell=True, check=True)
-        
-        # 设置MAC地址
-        # 注意：macOS下修改MAC地址需要root权限
-        return True
+    def on_apply_failed(self, error):
+        """应用配置失败"""
+        self.apply_progress.close()
+        QMessageBox.critical(self, "失败", f"网络配置修改失败: {error}")
     
-    def apply_config_linux(self, card, ip, netmask, gateway, dns, s_dns, mac, mac_name):
-        """在Linux上应用配置"""
-        # 禁用网卡
-        subprocess.run(['sudo', 'ifconfig', card, 'down'], shell=True, check=True)
-        
-        # 设置IP地址和子网掩码
-        subprocess.run(['sudo', 'ifconfig', card, ip, 'netmask', netmask], 
-                      shell=True, check=True)
-        
-        # 设置网关
-        subprocess.run(['sudo', 'route', 'add', 'default', 'gw', gateway, card], 
-                      shell=True, check=True)
+    def on_apply_unchanged(self):
+        """网卡当前配置已与所选配置一致"""
+        self.apply_progress.close()
+        QMessageBox.information(self, "提示", "网卡当前配置与所选配置一致，无需修改")
+    
+    def on_apply_cancelled(self, message):
+        """应用配置已取消，已执行的步骤已按保存的快照恢复"""
+        self.apply_progress.close()
+        QMessageBox.information(self, "提示", message)
+    
+    def on_apply_finished(self):
+        """工作线程结束后恢复界面"""
+        self.apply_thread.deleteLater()
+        self.apply_thread = None
+        self.apply_worker = None
+        self.confirm_button.setEnabled(True)
+        if self.revert_action is not None:
+            self.revert_action.setEnabled(True)
+    
+    def revert_network(self):
+        """恢复到最近一次应用配置前保存的网络配置"""
+        import apply_helper
+        import snapshots
         
-        # 设置DNS
-        if dns and dns.strip():
-            with open('/etc/resolv.conf', 'w') as f:
-                f.write(f'nameserver {dns}\n')
-                if s_dns and s_dns.strip():
-                    f.write(f'nameserver {s_dns}\n')
+        if self.apply_thread is not None:
+            QMessageBox.information(self, "提示", "正在应用配置，请稍后再试")
+            return
         
-        # 设置MAC地址
-        subprocess.run(['sudo', 'ifconfig', card, 'hw', 'ether', mac], 
-                      shell=True, check=True)
+        # 特权助手运行时配置由助手修改，快照也保存在助手一侧
+        if apply_helper.helper_available():
+            question = "确定要恢复到上一次应用配置前的网络配置吗？"
+            plan = functools.partial(apply_helper.helper_revert_steps)
+        else:
+            snapshot = snapshots.get_ring().latest()
+            if snapshot is None:
+                QMessageBox.information(self, "提示", "没有可恢复的网络配置")
+                return
+            question = f"确定要恢复网卡 {snapshot.describe()} 的配置吗？"
+            plan = functools.partial(snapshots.revert_steps, snapshot.card)
+        
+        reply = QMessageBox.question(self, "恢复网络配置", question,
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_apply(plan, "恢复网络配置")
+    
+    def show_apply_timings(self):
+        """显示最近一次应用配置中各步骤和外部命令的耗时，可导出为Chrome trace文件"""
+        events = tracing.last_apply()
+        if not events:
+            QMessageBox.information(self, "提示", "本次运行中还没有应用过配置")
+            return
         
-        # 启用网卡
-        subprocess.run(['sudo', 'ifconfig', card, 'up'], shell=True, check=True)
+        dialog = QDialog(self)
+        dialog.setWindowTitle("上次应用耗时")
+        dialog.resize(520, 360)
+        layout = QVBoxLayout(dialog)
+        text = QPlainTextEdit(tracing.format_spans(events))
+        text.setReadOnly(True)
+        layout.addWidget(text)
+        if tracing.trace_path():
+            layout.addWidget(QLabel(f"跟踪文件: {tracing.trace_path()}"))
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Save | QDialogButtonBox.StandardButton.Close,
+                                   dialog)
+        buttons.button(QDialogButtonBox.StandardButton.Save).setText("导出...")
+        buttons.rejected.connect(dialog.reject)
         
-        return True
+        def export():
+            path, _ = QFileDialog.getSaveFileName(dialog, "导出跟踪文件", "ncmtool-apply.json", "JSON (*.json)")
+            if not path:
+                return
+            try:
+                tracing.write_trace(path, events)
+            except OSError as e:
+                QMessageBox.critical(dialog, "失败", f"导出失败: {str(e)}")
+        buttons.accepted.connect(export)
+        layout.addWidget(buttons)
+        dialog.exec()
     
     def init_tray(self):
         """初始化系统托盘图标"""
@@ -702,6 +900,16 @@ class NetworkConfigTool(QMainWindow):
         show_action.triggered.connect(self.show_window)
         self.tray_menu.addAction(show_action)
         
+        # 恢复上一个网络配置
+        self.revert_action = QAction("恢复上一个网络配置", self)
+        self.revert_action.triggered.connect(self.revert_network)
+        self.tray_menu.addAction(self.revert_action)
+        
+        # 上次应用配置各步骤的耗时
+        timings_action = QAction("上次应用耗时", self)
+        timings_action.triggered.connect(self.show_apply_timings)
+        self.tray_menu.addAction(timings_action)
+        
         # 退出操作
         exit_action = QAction("退出", self)
         exit_action.triggered.connect(self.exit_app)
@@ -723,7 +931,23 @@ class NetworkConfigTool(QMainWindow):
     
     def exit_app(self):
         """退出应用程序"""
-        self.tray_icon.hide()
+        if self.tray_icon is not None:
+            self.tray_icon.hide()
+        if self.apply_thread is not None:
+            # 等待当前步骤完成，避免网卡停留在中间状态
+            self.apply_worker.cancel()
+            self.apply_thread.wait()
+        if self.dns_probe_thread is not None:
+            # 测速最多持续数秒
+            self.dns_probe_thread.wait()
+        if self.config_reload_thread is not None:
+            self.config_reload_thread.wait()
+        if self.nic_thread is not None:
+            self.nic_watcher.stop()
+            self.nic_thread.quit()
+            self.nic_thread.wait()
+        self.search_thread.quit()
+        self.search_thread.wait()
         self.close()
         QApplication.instance().quit()
     
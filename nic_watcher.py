@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台网卡监听线程
+Linux订阅rtnetlink的RTMGRP_LINK多播组，只在内核通知网卡增删或改名时更新；
+其他平台定时刷新网卡注册表并比较前后结果。变化通过信号逐项通知界面
+"""
+
+import errno
+import platform
+import select
+import socket
+import threading
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+# 非Linux平台轮询网卡列表的间隔（秒）
+POLL_INTERVAL = 3.0
+
+
+class NicWatcher(QObject):
+    """网卡监听工作对象，需移动到独立的QThread中运行"""
+
+    card_added = pyqtSignal(str)
+    card_removed = pyqtSignal(str)
+    # 原名称、新名称
+    card_renamed = pyqtSignal(str, str)
+
+    def __init__(self, registry, system=None):
+        """registry为网卡注册表，非Linux平台定时刷新其中的网卡列表"""
+        super().__init__()
+        self.registry = registry
+        self.system = system or platform.system()
+        self._stop = threading.Event()
+        # 用于在stop时唤醒select
+        self._wake_r, self._wake_w = socket.socketpair()
+
+    @pyqtSlot()
+    def run(self):
+        """开始监听，直到调用stop"""
+        try:
+            if self.system == "Linux":
+                self._watch_netlink()
+            else:
+                self._watch_polling()
+        except Exception as e:
+            print(f"监听网卡变化失败: {str(e)}")
+        finally:
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def stop(self):
+        """停止监听（可在任意线程调用）"""
+        self._stop.set()
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _watch_polling(self):
+        """定时获取网卡列表，与上次结果比较"""
+        known = []
+        while not self._stop.is_set():
+            try:
+                self.registry.refresh()
+                cards = self.registry.card_names()
+            except Exception as e:
+                print(f"获取网卡信息失败: {str(e)}")
+                cards = known
+            for card in known:
+                if card not in cards:
+                    self.card_removed.emit(card)
+            for card in cards:
+                if card not in known:
+                    self.card_added.emit(card)
+            known = cards
+            self._stop.wait(POLL_INTERVAL)
+
+    def _watch_netlink(self):
+        """订阅网卡变化事件，先订阅再读取当前列表，避免遗漏期间发生的变化"""
+        import rtnetlink
+
+        # {索引: 名称}
+        names = {}
+
+        def update(link):
+            if link.name == 'lo':
+                return
+            old = names.get(link.index)
+            if old is None:
+                self.card_added.emit(link.name)
+            elif old != link.name:
+                self.card_renamed.emit(old, link.name)
+            names[link.index] = link.name
+
+        def resync(netlink):
+            links = netlink.list_links()
+            current = {link.index for link in links}
+            for index in [index for index in names if index not in current]:
+                self.card_removed.emit(names.pop(index))
+            for link in links:
+                update(link)
+
+        with rtnetlink.RtNetlink(groups=rtnetlink.RTMGRP_LINK) as events, rtnetlink.RtNetlink() as netlink:
+            resync(netlink)
+            while not self._stop.is_set():
+                readable, _, _ = select.select([events, self._wake_r], [], [])
+                if events not in readable:
+                    continue
+                try:
+                    messages = events.recv_events()
+                except OSError as e:
+                    if e.errno != errno.ENOBUFS:
+                        raise
+                    # 事件过多导致接收缓冲区溢出，重新读取完整列表
+                    self.registry.invalidate()
+                    resync(netlink)
+                    continue
+                # 网卡发生变化，注册表中的缓存失效
+                self.registry.invalidate()
+                for msg_type, payload in messages:
+                    link = rtnetlink.parse_link(payload)
+                    if msg_type == rtnetlink.RTM_NEWLINK:
+                        update(link)
+                    elif msg_type == rtnetlink.RTM_DELLINK and link.index in names:
+                        self.card_removed.emit(names.pop(link.index))
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NetworkManager连接配置
+在由NetworkManager管理网络的Linux桌面上，直接修改网卡地址和/etc/resolv.conf
+经常被NetworkManager改回。这里把config.json中的每个用户预先编译为绑定到指定网卡的
+keyfile连接配置（地址、网关、DNS、克隆MAC地址），切换配置只需激活一次连接：
+
+    nmcli connection up uuid <uuid>
+
+编译是增量的：目录中的清单文件记录每条用户配置的内容哈希，只重新生成哈希变化的记录，
+并删除已不存在的用户对应的连接文件。同一输入总是生成相同的文件内容，
+可以生成到临时目录后与预先保存的文件逐字节比较
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+import command_runner
+import validators
+from search_index import normalize_mac
+
+# NetworkManager读取keyfile连接配置的目录
+SYSTEM_CONNECTIONS = '/etc/NetworkManager/system-connections'
+
+# 记录各连接文件对应用户配置哈希的清单文件
+MANIFEST_NAME = '.ncmtool-manifest.json'
+
+# 生成格式变化时修改版本号，使已生成的文件全部重新生成
+FORMAT_VERSION = 1
+
+# nmcli命令的超时时间（秒），激活连接时需要等待网卡启用
+NMCLI_TIMEOUT = 90.0
+
+# 连接UUID的命名空间，同一部门、用户和网卡总是得到同一个UUID
+_UUID_NAMESPACE = uuid.UUID('6f1c0a52-8d3e-4c57-9b1e-2f4a5c7d9e01')
+
+# 参与编译的用户配置字段
+_PROFILE_KEYS = ('ip', 'netmask', 'gateway', 'dns', 's_dns', 'mac')
+
+
+def connection_uuid(department, name, card):
+    """用户配置在指定网卡上对应的连接UUID"""
+    return str(uuid.uuid5(_UUID_NAMESPACE, f"{department}\0{name}\0{card}"))
+
+
+def connection_id(department, name):
+    """nmcli connection show中显示的连接名称"""
+    return f"ncmtool {department}/{name}"
+
+
+def connection_filename(department, name, card):
+    """连接文件名，使用UUID以避免部门和用户名中的特殊字符"""
+    return f"ncmtool-{connection_uuid(department, name, card)}.nmconnection"
+
+
+def record_hash(department, user, card):
+    """用户配置的内容哈希，只包含影响连接文件内容的字段"""
+    record = [FORMAT_VERSION, department, user.get('name', ''), card]
+    record.extend(str(user.get(key) or '') for key in _PROFILE_KEYS)
+    return hashlib.sha256(json.dumps(record, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _escape(value):
+    """按keyfile格式转义值"""
+    value = value.replace('\\', '\\\\').replace('\n', '\\n').replace('\t', '\\t').replace('\r', '\\r')
+    if value.startswith(' '):
+        value = '\\s' + value[1:]
+    return value
+
+
+def format_mac(mac):
+    """NetworkManager要求MAC地址为冒号分隔的格式，不是12位十六进制数时抛出ValueError"""
+    text = normalize_mac(mac) if isinstance(mac, str) else ''
+    if len(text) != 12 or not all(c in '0123456789ABCDEF' for c in text):
+        raise ValueError(f"MAC地址格式不正确: {mac!r}")
+    return ':'.join(text[i:i + 2] for i in range(0, len(text), 2))
+
+
+def _dns_servers(user):
+    """首选和备用DNS，去掉空值和重复的地址，格式不正确时抛出ValueError"""
+    servers = []
+    for key, title in (('dns', "首选DNS"), ('s_dns', "备用DNS")):
+        server = user.get(key) or ''
+        if isinstance(server, str):
+            server = server.strip()
+            if not server:
+                continue
+        if not isinstance(server, str) or validators.parse_address(server, 'ip')[0] is None:
+            raise ValueError(f"{title}格式不正确: {user.get(key)!r}")
+        if server not in servers:
+            servers.append(server)
+    return servers
+
+
+def _up_to_date(directory, manifest, filename, digest):
+    """连接文件是否已按当前内容生成"""
+    entry = manifest.get(filename)
+    return (isinstance(entry, dict) and entry.get('hash') == digest
+            and os.path.exists(os.path.join(directory, filename)))
+
+
+def render_keyfile(department, user, card):
+    """生成用户配置的keyfile内容，配置无效时抛出ValueError"""
+    errors = validators.validate_profile(user)
+    if errors:
+        raise ValueError("; ".join(message for _, message in errors))
+    name = user.get('name', '')
+    prefixlen = validators.mask_to_cidr(validators.parse_netmask(user['netmask'])[0])
+    # 地址写入keyfile前校验，换行等字符不能进入连接文件
+    dns = _dns_servers(user)
+    mac = format_mac(user['mac']) if user.get('mac') else None
+
+    lines = [
+        "[connection]",
+        f"id={_escape(connection_id(department, name))}",
+        f"uuid={connection_uuid(department, name, card)}",
+        "type=ethernet",
+        f"interface-name={_escape(card)}",
+        # 只在切换配置时激活，不自动连接
+        "autoconnect=false",
+        "",
+        "[ethernet]",
+    ]
+    if mac:
+        lines.append(f"cloned-mac-address={mac}")
+    lines.extend([
+        "",
+        "[ipv4]",
+        "method=manual",
+        f"address1={user['ip']}/{prefixlen},{user['gateway']}",
+    ])
+    if dns:
+        lines.extend([f"dns={';'.join(dns)};", "ignore-auto-dns=true"])
+    lines.extend([
+        "",
+        "[ipv6]",
+        "method=auto",
+        "",
+    ])
+    return '\n'.join(lines)
+
+
+def read_manifest(directory):
+    """读取清单文件，返回{文件名: {'card': 网卡, 'hash': 内容哈希}}"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _write_private(path, text):
+    """写入只有所有者可读写的文件，NetworkManager会忽略权限更宽的连接文件"""
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class CompileResult:
+    """一次编译的结果"""
+
+    def __init__(self):
+        # 新生成或重新生成的文件路径
+        self.written = []
+        # 删除的文件路径
+        self.removed = []
+        # 内容未变化而跳过的记录数
+        self.unchanged = 0
+        # 无效的记录[(部门, 用户名, 错误信息)]
+        self.skipped = []
+
+    @property
+    def changed(self):
+        return bool(self.written or self.removed)
+
+
+def compile_profiles(departments, card, directory=SYSTEM_CONNECTIONS):
+    """将全部用户配置编译为绑定到card的连接文件，只重新生成内容变化的记录"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    old_manifest = read_manifest(directory)
+    manifest = {}
+    result = CompileResult()
+
+    for dept in departments:
+        department = dept.get('department', '')
+        for user in dept.get('users') or []:
+            name = user.get('name', '')
+            filename = connection_filename(department, name, card)
+            digest = record_hash(department, user, card)
+            if _up_to_date(directory, old_manifest, filename, digest):
+                manifest[filename] = old_manifest[filename]
+                result.unchanged += 1
+                continue
+            try:
+                text = render_keyfile(department, user, card)
+            except ValueError as e:
+                result.skipped.append((department, name, str(e)))
+                continue
+            path = os.path.join(directory, filename)
+            _write_private(path, text)
+            manifest[filename] = {'card': card, 'hash': digest}
+            result.written.append(path)
+
+    # 清单中同一网卡上本次没有生成的文件对应已删除的用户，其他网卡的文件保持不变
+    for filename, entry in old_manifest.items():
+        if filename in manifest:
+            continue
+        if isinstance(entry, dict) and entry.get('card') != card:
+            manifest[filename] = entry
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            os.unlink(path)
+            result.removed.append(path)
+        except FileNotFoundError:
+            pass
+
+    if manifest != old_manifest:
+        _write_private(os.path.join(directory, MANIFEST_NAME),
+                       json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+    return result
+
+
+def compile_profile(department, user, card, directory=SYSTEM_CONNECTIONS):
+    """只编译一个用户配置，内容未变化时不写文件，返回(文件路径, 是否重新生成)"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    manifest = read_manifest(directory)
+    filename = connection_filename(department, user.get('name', ''), card)
+    digest = record_hash(department, user, card)
+    path = os.path.join(directory, filename)
+    if _up_to_date(directory, manifest, filename, digest):
+        return path, False
+    _write_private(path, render_keyfile(department, user, card))
+    manifest[filename] = {'card': card, 'hash': digest}
+    _write_private(os.path.join(directory, MANIFEST_NAME),
+                   json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+    return path, True
+
+
+def _nmcli(*args):
+    """执行nmcli，失败时抛出RuntimeError"""
+    result = command_runner.run(['nmcli', *args], NMCLI_TIMEOUT, encoding='utf-8')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"nmcli 返回 {result.returncode}")
+    return result.stdout
+
+
+def reload_connections(result):
+    """让NetworkManager读取编译结果，有文件删除时重新读取整个目录，否则只加载新文件"""
+    if result.removed:
+        _nmcli('connection', 'reload')
+    elif result.written:
+        _nmcli('connection', 'load', *result.written)
+
+
+def nm_available():
+    """NetworkManager是否正在运行"""
+    try:
+        return _nmcli('-t', '-f', 'RUNNING', 'general').strip() == 'running'
+    except (command_runner.CommandError, RuntimeError):
+        return False
+
+
+def activation_steps(department, user, card, directory=SYSTEM_CONNECTIONS):
+    """通过NetworkManager切换到用户配置的步骤，已预先编译时只需激活一次连接"""
+    from network_apply import ApplyStep
+
+    steps = []
+    name = user.get('name', '')
+    if not _up_to_date(directory, read_manifest(directory), connection_filename(department, name, card),
+                       record_hash(department, user, card)):
+        def compile_one():
+            path, _ = compile_profile(department, user, card, directory)
+            _nmcli('connection', 'load', path)
+        steps.append(ApplyStep("生成连接配置", compile_one))
+
+    uuid_text = connection_uuid(department, name, card)
+    steps.append(ApplyStep("激活连接", lambda: _nmcli('connection', 'up', 'uuid', uuid_text)))
+    return steps
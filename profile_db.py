@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite配置库
+可选的配置存储方式：把config.json导入为SQLite数据库（config.db），部门、姓名、IP和MAC
+均建有索引。界面打开配置库时只读取部门列表，用户在展开部门、点击或搜索时按需查询，
+启动耗时与用户数量无关。
+
+    python ncmtool.py db-import --output config.db      # 由 --config 指定的JSON导入
+    python ncmtool.py --config config.db db-export --output config.json
+
+用户行号按部门顺序连续编号，与ProfileTable一致，配置树模型和搜索线程可以直接使用
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from profile_records import DEFAULTS, ProfileRecord
+
+# 数据库格式版本，保存在PRAGMA user_version中
+SCHEMA_VERSION = 1
+DB_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+_SQLITE_MAGIC = b'SQLite format 3\0'
+
+# 界面按块读取用户姓名，缓存的块数
+NAME_BLOCK = 256
+NAME_CACHE_BLOCKS = 64
+
+_FIELDS = tuple(DEFAULTS)
+
+_SCHEMA = f"""
+CREATE TABLE departments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    first_row INTEGER NOT NULL,
+    user_count INTEGER NOT NULL
+);
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY,
+    dept_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    {', '.join(f'{field} TEXT' for field in _FIELDS)},
+    mac_key TEXT,
+    extra TEXT
+);
+-- 搜索使用的前缀键：小写的姓名、设备名称及其拼音首字母
+CREATE TABLE search_keys (
+    key TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (key, user_id)
+) WITHOUT ROWID;
+CREATE INDEX departments_name ON departments (name);
+CREATE INDEX users_dept_name ON users (dept_id, name);
+CREATE INDEX users_name ON users (name);
+CREATE INDEX users_ip ON users (ip);
+CREATE INDEX users_mac ON users (mac_key);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+
+def is_database(path):
+    """根据扩展名或文件头判断配置文件是否为SQLite配置库"""
+    if path.lower().endswith(DB_SUFFIXES):
+        return True
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(_SQLITE_MAGIC)) == _SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def import_json(json_path, db_path):
+    """把JSON配置导入为配置库，写入临时文件后替换，返回用户数量"""
+    from config_loader import ConfigFormatError, iter_json_departments
+    from search_index import normalize_mac, pinyin_initials
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        row = 0
+        insert_user = (f"INSERT INTO users (id, dept_id, position, {', '.join(_FIELDS)}, mac_key, extra) "
+                       f"VALUES ({', '.join('?' * (len(_FIELDS) + 5))})")
+        with conn:
+            for dept_row, dept in enumerate(iter_json_departments(json_path)):
+                if not isinstance(dept, dict):
+                    raise ConfigFormatError("配置文件格式不正确，列表元素应为部门对象")
+                users = dept.get('users') or []
+                conn.execute("INSERT INTO departments VALUES (?, ?, ?, ?)",
+                             (dept_row, str(dept.get('department', '')), row, len(users)))
+                user_rows = []
+                key_rows = []
+                for position, user in enumerate(users):
+                    # 非字符串的值保存在extra中，导出时保持原类型
+                    extra = {key: value for key, value in user.items()
+                             if key not in DEFAULTS or not isinstance(value, str)}
+                    mac = user.get('mac')
+                    user_rows.append((row, dept_row, position,
+                                      *(None if field in extra else user.get(field) for field in _FIELDS),
+                                      normalize_mac(mac) if isinstance(mac, str) and mac else None,
+                                      json.dumps(extra, ensure_ascii=False) if extra else None))
+                    keys = set()
+                    for field in ('name', 'deviceName'):
+                        value = str(user.get(field) or '').strip()
+                        if value:
+                            keys.add(value.lower())
+                            keys.add(pinyin_initials(value))
+                    key_rows.extend((key, row) for key in keys if key)
+                    row += 1
+                conn.executemany(insert_user, user_rows)
+                conn.executemany("INSERT INTO search_keys VALUES (?, ?)", key_rows)
+        conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return row
+
+
+def export_json(db_path, json_path):
+    """把配置库导出为config.json格式，返回用户数量"""
+    database = ProfileDatabase(db_path)
+    count = 0
+    tmp_path = json_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for index, dept in enumerate(database.iter_departments()):
+                f.write(',\n ' if index else '\n ')
+                json.dump(dept, f, ensure_ascii=False, indent=1)
+                count += len(dept['users'])
+            f.write('\n]\n')
+        os.replace(tmp_path, json_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        database.close()
+    return count
+
+
+class ProfileDatabase:
+    """只读的配置库，接口与ProfileTable一致，用户字段在需要时才查询
+
+    每个线程使用各自的连接，界面线程和搜索线程可以同时读取
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # 姓名块缓存 {块号: [姓名]}，按加入顺序淘汰
+        self._names = {}
+        conn = self._connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            from config_loader import ConfigFormatError
+            raise ConfigFormatError(f"配置库版本不正确: {version}，请重新导入")
+        departments = conn.execute("SELECT name, first_row, user_count FROM departments ORDER BY id").fetchall()
+        self._departments = [name for name, _, _ in departments]
+        self._rows = [range(first, first + count) for _, first, count in departments]
+        self._count = sum(len(rows) for rows in self._rows)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = 'file:' + os.path.abspath(self.path).replace('?', '%3F').replace('#', '%23') + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def __len__(self):
+        return self._count
+
+    def department_count(self):
+        return len(self._departments)
+
+    def department_name(self, dept_row):
+        return self._departments[dept_row]
+
+    def department_rows(self, dept_row):
+        return self._rows[dept_row]
+
+    def locate(self, row):
+        """行号对应的(部门行号, 部门中的用户行号)"""
+        dept_row, position = self._connection().execute(
+            "SELECT dept_id, position FROM users WHERE id = ?", (row,)).fetchone()
+        return dept_row, position
+
+    def row_of(self, dept_row, user_row):
+        return self._rows[dept_row].start + user_row
+
+    def name(self, row):
+        """用户姓名，按块读取并缓存，视图绘制时不逐行查询"""
+        block = row // NAME_BLOCK
+        names = self._names.get(block)
+        if names is None:
+            start = block * NAME_BLOCK
+            names = [name or '' for name, in self._connection().execute(
+                "SELECT name FROM users WHERE id >= ? AND id < ? ORDER BY id", (start, start + NAME_BLOCK))]
+            if len(self._names) >= NAME_CACHE_BLOCKS:
+                del self._names[next(iter(self._names))]
+            self._names[block] = names
+        return names[row - block * NAME_BLOCK]
+
+    def _fetch(self, row):
+        result = self._connection().execute(
+            f"SELECT dept_id, {', '.join(_FIELDS)}, extra FROM users WHERE id = ?", (row,)).fetchone()
+        if result is None:
+            raise IndexError(row)
+        return result
+
+    def record(self, row):
+        """读取一个用户的全部字段，缺少的字段填入默认值"""
+        dept_row, *values, _ = self._fetch(row)
+        record = ProfileRecord()
+        record.row = row
+        record.department = self._departments[dept_row]
+        for field, value in zip(_FIELDS, values):
+            setattr(record, field, DEFAULTS[field] if value is None else value)
+        return record
+
+    def to_dict(self, row):
+        """转换为配置文件中的用户字典，包括其他字段"""
+        _, *values, extra = self._fetch(row)
+        return _user_dict(values, extra)
+
+    def iter_departments(self):
+        """按配置文件的格式逐个产出部门字典"""
+        conn = self._connection()
+        for dept_row, name in enumerate(self._departments):
+            rows = self._rows[dept_row]
+            cursor = conn.execute(f"SELECT {', '.join(_FIELDS)}, extra FROM users "
+                                  f"WHERE id >= ? AND id < ? ORDER BY id", (rows.start, rows.stop))
+            yield {'department': name, 'users': [_user_dict(values, extra) for *values, extra in cursor]}
+
+    def department_values(self, dept_row):
+        """部门中各用户全部字段的值，用于比较两份配置"""
+        rows = self._rows[dept_row]
+        return self._connection().execute(f"SELECT {', '.join(_FIELDS)}, extra FROM users "
+                                          f"WHERE id >= ? AND id < ? ORDER BY id", (rows.start, rows.stop)).fetchall()
+
+    def find(self, department, name):
+        """按部门和姓名查找用户字典，返回(部门是否存在, 用户字典或None)"""
+        conn = self._connection()
+        dept = conn.execute("SELECT id FROM departments WHERE name = ? ORDER BY id LIMIT 1",
+                            (department,)).fetchone()
+        if dept is None:
+            return False, None
+        found = conn.execute("SELECT id FROM users WHERE dept_id = ? AND name = ? ORDER BY id LIMIT 1",
+                             (dept[0], name)).fetchone()
+        return True, self.to_dict(found[0]) if found else None
+
+    def search(self, query, limit=500):
+        """与SearchIndex.search相同：先精确匹配IP/MAC，再按姓名、设备名称和拼音首字母前缀匹配"""
+        from search_index import normalize_mac
+
+        query = query.strip()
+        if not query:
+            return []
+        conn = self._connection()
+        ids = []
+        seen = set()
+
+        def add(rows):
+            for user_id, in rows:
+                if user_id not in seen and len(ids) < limit:
+                    seen.add(user_id)
+                    ids.append(user_id)
+
+        add(conn.execute("SELECT id FROM users WHERE ip = ? ORDER BY id", (query,)))
+        add(conn.execute("SELECT id FROM users WHERE mac_key IN (?, ?) ORDER BY id", (query, normalize_mac(query))))
+        prefix = query.lower()
+        add(conn.execute("SELECT user_id FROM search_keys WHERE key >= ? AND key < ? ORDER BY key, user_id LIMIT ?",
+                         (prefix, prefix + '\U0010ffff', limit + len(ids))))
+        if not ids:
+            return []
+        placeholders = ', '.join('?' * len(ids))
+        located = dict((user_id, (dept_row, position)) for user_id, dept_row, position in conn.execute(
+            f"SELECT id, dept_id, position FROM users WHERE id IN ({placeholders})", ids))
+        return [located[user_id] for user_id in ids]
+
+
+def _user_dict(values, extra):
+    """由数据库中的值还原用户字典，未填写的字段不出现"""
+    user = {field: value for field, value in zip(_FIELDS, values) if value is not None}
+    if extra:
+        user.update(json.loads(extra))
+    return user
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的用户配置表
+加载配置时把每个部门的用户字典转换为按列保存的数组：IP、子网掩码、网关和DNS保存为整数，
+MAC地址保存为48位整数，姓名和设备名称按部门拼接为一个字符串，设备类型和物理地址名称只保存
+一份并按序号引用，缺少的字段在转换时填入默认值。树节点只记录行号，需要时再读取对应的记录。
+
+无法按上述方式表示的值（如"24"形式的子网掩码、带分隔符的MAC）原样保存在单独的字典中，
+读取结果与配置文件一致
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+# 用户配置的字段及缺少时使用的默认值
+DEFAULTS = {
+    'name': '',
+    'deviceName': '',
+    'ip': '',
+    'deviceType': '',
+    'netmask': '',
+    'gateway': '',
+    'dns': '',
+    's_dns': '',
+    'mac': '',
+    'mac_name': 'Network Address',
+}
+
+_KNOWN = DEFAULTS.keys()
+_ADDRESS_FIELDS = ('ip', 'netmask', 'gateway', 'dns', 's_dns')
+# 按部门拼接保存的字段（各用户的取值基本不重复）
+_TEXT_FIELDS = ('name', 'deviceName')
+# 只保存一份并按序号引用的字段（取值只有少数几种）
+_INTERNED_FIELDS = ('deviceType', 'mac_name')
+
+# 整数列中表示空值和需要到_irregular中读取原值的标记
+_EMPTY = -1
+_IRREGULAR = -2
+_MISSING = object()
+
+
+def pack_ip(text):
+    """点分十进制地址转为整数，不是规范写法时返回None"""
+    parts = text.split('.')
+    if len(parts) != 4:
+        return None
+    value = 0
+    for part in parts:
+        # 拒绝前导零、空段和非数字，保证转换回字符串后与原值一致
+        if not part.isdigit() or not part.isascii() or (len(part) > 1 and part[0] == '0'):
+            return None
+        octet = int(part)
+        if octet > 255:
+            return None
+        value = (value << 8) | octet
+    return value
+
+
+def unpack_ip(value):
+    return f"{value >> 24}.{(value >> 16) & 0xFF}.{(value >> 8) & 0xFF}.{value & 0xFF}"
+
+
+def pack_mac(text):
+    """12位大写十六进制MAC转为整数，其他写法返回None"""
+    if len(text) != 12 or not text.isascii():
+        return None
+    try:
+        value = int(text, 16)
+    except ValueError:
+        return None
+    return value if f"{value:012X}" == text else None
+
+
+def unpack_mac(value):
+    return f"{value:012X}"
+
+
+class ProfileRecord:
+    """一个用户的配置，字段缺少时已填入默认值"""
+
+    __slots__ = ('row', 'department') + tuple(DEFAULTS)
+
+    def to_dict(self):
+        """转换为配置文件中的用户字典"""
+        return {field: getattr(self, field) for field in DEFAULTS}
+
+    def __repr__(self):
+        return f"ProfileRecord({self.row}, {self.department!r}, {self.name!r})"
+
+
+class _TextColumn:
+    """按部门拼接保存的字符串列，每行只记录在所属部门字符串中的起始位置"""
+
+    __slots__ = ('blobs', 'offsets')
+
+    def __init__(self):
+        self.blobs = []
+        self.offsets = array('I')
+
+    def append_department(self, values):
+        position = 0
+        for value in values:
+            self.offsets.append(position)
+            position += len(value)
+        self.blobs.append(''.join(values))
+
+    def get(self, dept_row, row, start, stop):
+        blob = self.blobs[dept_row]
+        begin = self.offsets[row]
+        end = self.offsets[row + 1] if row + 1 < stop else len(blob)
+        return blob[begin:end]
+
+
+class ProfileTable:
+    """按列保存的全部用户配置，行号按部门顺序连续编号
+
+    只追加不修改，加载完成后可在其他线程中读取
+    """
+
+    def __init__(self):
+        self._departments = []
+        # 各部门第一个用户的行号
+        self._starts = array('I')
+        self._count = 0
+        self._addresses = {field: array('q') for field in _ADDRESS_FIELDS}
+        self._mac = array('q')
+        self._texts = {field: _TextColumn() for field in _TEXT_FIELDS}
+        self._interned = {field: array('I') for field in _INTERNED_FIELDS}
+        # 设备类型、物理地址名称等共用的字符串表
+        self._strings = []
+        self._string_ids = {}
+        # {(字段, 行号): 原值}，无法按列保存的值
+        self._irregular = {}
+        # {行号: {字段: 值}}，配置中的其他字段
+        self._extra = {}
+        # 在_irregular或_extra中有值的行号（升序）
+        self._special_rows = array('I')
+
+    @classmethod
+    def from_departments(cls, departments):
+        table = cls()
+        for dept in departments:
+            table.append_department(dept)
+        return table
+
+    def __len__(self):
+        return self._count
+
+    def department_count(self):
+        return len(self._departments)
+
+    def department_name(self, dept_row):
+        return self._departments[dept_row]
+
+    def department_rows(self, dept_row):
+        """部门中全部用户的行号"""
+        start = self._starts[dept_row]
+        stop = self._starts[dept_row + 1] if dept_row + 1 < len(self._starts) else self._count
+        return range(start, stop)
+
+    def locate(self, row):
+        """行号对应的(部门行号, 部门中的用户行号)"""
+        dept_row = bisect_right(self._starts, row) - 1
+        return dept_row, row - self._starts[dept_row]
+
+    def row_of(self, dept_row, user_row):
+        return self._starts[dept_row] + user_row
+
+    def _intern(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def append_department(self, dept):
+        """追加一个部门的全部用户，返回部门行号"""
+        dept_row = len(self._departments)
+        users = dept.get('users') or []
+        first = self._count
+        self._departments.append(str(dept.get('department', '')))
+        self._starts.append(first)
+
+        texts = {field: [] for field in _TEXT_FIELDS}
+        irregular = self._irregular
+        # 同一部门的子网掩码、网关和DNS大多相同，按原值缓存转换结果
+        packed_cache = {'': _EMPTY}
+        irregular_count = len(irregular)
+        for offset, user in enumerate(users):
+            row = first + offset
+            for field in _ADDRESS_FIELDS:
+                value = user.get(field, '')
+                packed = packed_cache.get(value) if isinstance(value, str) else None
+                if packed is None:
+                    packed = pack_ip(value) if isinstance(value, str) else None
+                    if packed is None:
+                        packed = _IRREGULAR
+                    else:
+                        packed_cache[value] = packed
+                if packed == _IRREGULAR:
+                    irregular[(field, row)] = value
+                self._addresses[field].append(packed)
+
+            value = user.get('mac', '')
+            if value == '':
+                packed = _EMPTY
+            else:
+                packed = pack_mac(value) if isinstance(value, str) else None
+                if packed is None:
+                    packed = _IRREGULAR
+                    irregular[('mac', row)] = value
+            self._mac.append(packed)
+
+            for field in _TEXT_FIELDS:
+                value = user.get(field, '')
+                if not isinstance(value, str):
+                    irregular[(field, row)] = value
+                    value = ''
+                texts[field].append(value)
+
+            for field in _INTERNED_FIELDS:
+                value = user.get(field, DEFAULTS[field])
+                if not isinstance(value, str):
+                    irregular[(field, row)] = value
+                    value = ''
+                self._interned[field].append(self._intern(value))
+
+            if not user.keys() <= _KNOWN:
+                extra = {key: value for key, value in user.items() if key not in DEFAULTS}
+                if extra:
+                    self._extra[row] = extra
+            if len(irregular) != irregular_count or row in self._extra:
+                self._special_rows.append(row)
+                irregular_count = len(irregular)
+
+        for field in _TEXT_FIELDS:
+            self._texts[field].append_department(texts[field])
+        self._count = first + len(users)
+        return dept_row
+
+    def value(self, row, field, dept_row=None):
+        """读取一个字段，dept_row为行号所属的部门（已知时可省去查找）"""
+        if field in self._addresses:
+            packed = self._addresses[field][row]
+            if packed >= 0:
+                return unpack_ip(packed)
+        elif field == 'mac':
+            packed = self._mac[row]
+            if packed >= 0:
+                return unpack_mac(packed)
+        elif field in self._texts:
+            irregular = self._irregular.get((field, row), _MISSING)
+            if irregular is not _MISSING:
+                return irregular
+            if dept_row is None:
+                dept_row = self.locate(row)[0]
+            return self._texts[field].get(dept_row, row, self._starts[dept_row],
+                                          self.department_rows(dept_row).stop)
+        elif field in self._interned:
+            irregular = self._irregular.get((field, row), _MISSING)
+            if irregular is not _MISSING:
+                return irregular
+            return self._strings[self._interned[field][row]]
+        elif field == 'department':
+            return self._departments[self.locate(row)[0]]
+        else:
+            return self._extra.get(row, {}).get(field)
+        if packed == _EMPTY:
+            return ''
+        return self._irregular[(field, row)]
+
+    def name(self, row):
+        return self.value(row, 'name')
+
+    def record(self, row):
+        """读取一个用户的全部字段"""
+        dept_row = self.locate(row)[0]
+        record = ProfileRecord()
+        record.row = row
+        record.department = self._departments[dept_row]
+        for field in DEFAULTS:
+            setattr(record, field, self.value(row, field, dept_row))
+        return record
+
+    def to_dict(self, row):
+        """转换为配置文件中的用户字典，包括其他字段"""
+        user = dict(self._extra.get(row, {}))
+        user.update(self.record(row).to_dict())
+        return user
+
+    def department_values(self, dept_row):
+        """部门中各用户全部字段的值，用于比较两份配置"""
+        values = []
+        for row in self.department_rows(dept_row):
+            values.append(tuple(self.value(row, field, dept_row) for field in DEFAULTS) + (self._extra.get(row),))
+        return values
+
+    def _has_special(self, rows):
+        position = bisect_left(self._special_rows, rows.start)
+        return position < len(self._special_rows) and self._special_rows[position] < rows.stop
+
+    def same_department(self, dept_row, other, other_dept_row):
+        """直接比较两份配置表中部门的各列，相同时返回True
+
+        有需要原样保存的值时返回False，由调用方逐个用户比较
+        """
+        rows = self.department_rows(dept_row)
+        other_rows = other.department_rows(other_dept_row)
+        if len(rows) != len(other_rows) or self._has_special(rows) or other._has_special(other_rows):
+            return False
+        a, b = slice(rows.start, rows.stop), slice(other_rows.start, other_rows.stop)
+        for field in _ADDRESS_FIELDS:
+            if self._addresses[field][a] != other._addresses[field][b]:
+                return False
+        if self._mac[a] != other._mac[b]:
+            return False
+        for field in _TEXT_FIELDS:
+            if (self._texts[field].blobs[dept_row] != other._texts[field].blobs[other_dept_row]
+                    or self._texts[field].offsets[a] != other._texts[field].offsets[b]):
+                return False
+        for field in _INTERNED_FIELDS:
+            strings, other_strings = self._strings, other._strings
+            if ([strings[i] for i in self._interned[field][a]]
+                    != [other_strings[i] for i in other._interned[field][b]]):
+                return False
+        return True
+
+    def search_fields(self):
+        """逐个返回(部门行号, 用户行号, IP, MAC, 姓名, 设备名称)，供建立搜索索引"""
+        for dept_row in range(len(self._departments)):
+            rows = self.department_rows(dept_row)
+            for row in rows:
+                yield (dept_row, row - rows.start, self.value(row, 'ip'), self.value(row, 'mac'),
+                       self.value(row, 'name', dept_row), self.value(row, 'deviceName', dept_row))
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Linux rtnetlink后端
+通过AF_NETLINK套接字直接与内核通信：列出网卡、地址和默认路由，设置IP地址、
+默认网关和MAC地址。同一批修改合并为一次send发送，不再逐条启动sudo/ifconfig/route进程。
+FakeSocket在内存中模拟内核的应答，可在没有权限的环境下验证消息的编码和解析
+"""
+
+import errno
+import os
+import socket
+import struct
+
+from search_index import normalize_mac
+import validators
+import tracing
+
+NETLINK_ROUTE = 0
+
+# 消息类型
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+
+# 消息标志
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_CREATE = 0x400
+
+# 多播组，订阅后内核主动推送网卡变化
+RTMGRP_LINK = 0x1
+
+# 属性类型
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_TABLE = 15
+
+IFF_UP = 0x1
+RT_TABLE_MAIN = 254
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RTN_UNICAST = 1
+
+# IF_OPER_*取值对应的名称，与/sys/class/net/<if>/operstate一致
+OPERSTATES = ('unknown', 'notpresent', 'down', 'lowerlayerdown', 'testing', 'dormant', 'up')
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTMSG = struct.Struct('=BBBBBBBBI')
+_RTATTR = struct.Struct('=HH')
+_NLMSGERR = struct.Struct('=i')
+
+_RECV_SIZE = 65536
+
+
+class NetlinkError(OSError):
+    """内核返回的错误应答"""
+
+
+class Link:
+    """网卡信息"""
+
+    __slots__ = ('index', 'name', 'flags', 'mac', 'operstate')
+
+    def __init__(self, index, name, flags=0, mac=None, operstate='unknown'):
+        self.index = index
+        self.name = name
+        self.flags = flags
+        self.mac = mac
+        self.operstate = operstate
+
+    @property
+    def up(self):
+        return bool(self.flags & IFF_UP)
+
+    def __repr__(self):
+        return f"Link({self.index}, {self.name!r}, flags={self.flags:#x}, mac={self.mac!r}, {self.operstate})"
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def pack_attr(attr_type, payload):
+    """编码一个rtattr属性（含对齐填充）"""
+    length = _RTATTR.size + len(payload)
+    return _RTATTR.pack(length, attr_type) + payload + b'\0' * (_align(length) - length)
+
+
+def parse_attrs(data, offset=0):
+    """解析rtattr属性列表，返回{类型: 原始数据}"""
+    attrs = {}
+    end = len(data)
+    while offset + _RTATTR.size <= end:
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        # 高位为NLA_F_NESTED等标志
+        attrs[attr_type & 0x3FFF] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def pack_message(msg_type, flags, seq, payload):
+    """编码一条netlink消息"""
+    return _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type, flags, seq, 0) + payload
+
+
+def iter_messages(data):
+    """拆分一次recv得到的数据，逐条产出(类型, 标志, 序号, 消息体)"""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, seq, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield msg_type, flags, seq, data[offset + _NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def _ip_bytes(ip):
+    return socket.inet_aton(ip)
+
+
+def _mac_bytes(mac):
+    return bytes.fromhex(normalize_mac(mac))
+
+
+def _format_mac(data):
+    return ':'.join(f'{b:02x}' for b in data)
+
+
+def parse_link(payload):
+    """解析RTM_NEWLINK消息体"""
+    _, _, index, flags, _ = _IFINFOMSG.unpack_from(payload)
+    attrs = parse_attrs(payload, _IFINFOMSG.size)
+    name = attrs.get(IFLA_IFNAME, b'').split(b'\0', 1)[0].decode('utf-8', 'replace')
+    mac = _format_mac(attrs[IFLA_ADDRESS]) if IFLA_ADDRESS in attrs else None
+    operstate = 'unknown'
+    if IFLA_OPERSTATE in attrs:
+        value = attrs[IFLA_OPERSTATE][0]
+        operstate = OPERSTATES[value] if value < len(OPERSTATES) else 'unknown'
+    return Link(index, name, flags, mac, operstate)
+
+
+def parse_address(payload):
+    """解析RTM_NEWADDR消息体，返回(网卡索引, IP地址, 前缀长度)，非IPv4时返回None"""
+    family, prefixlen, _, _, index = _IFADDRMSG.unpack_from(payload)
+    if family != socket.AF_INET:
+        return None
+    attrs = parse_attrs(payload, _IFADDRMSG.size)
+    # 点对点网卡的IFA_ADDRESS是对端地址，IFA_LOCAL才是本机地址
+    raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+    if raw is None:
+        return None
+    return index, socket.inet_ntoa(raw), prefixlen
+
+
+def parse_route(payload):
+    """解析RTM_NEWROUTE消息体，返回(出口网卡索引, 网关, 目标前缀长度, 路由表)，非IPv4时返回None"""
+    family, dst_len, _, _, table, _, _, _, _ = _RTMSG.unpack_from(payload)
+    if family != socket.AF_INET:
+        return None
+    attrs = parse_attrs(payload, _RTMSG.size)
+    if RTA_TABLE in attrs:
+        table = struct.unpack('=I', attrs[RTA_TABLE][:4])[0]
+    oif = struct.unpack('=i', attrs[RTA_OIF][:4])[0] if RTA_OIF in attrs else 0
+    gateway = socket.inet_ntoa(attrs[RTA_GATEWAY]) if RTA_GATEWAY in attrs else None
+    return oif, gateway, dst_len, table
+
+
+def link_message(index, flags=0, change=0, mac=None):
+    """编码RTM_NEWLINK消息体，用于修改网卡状态或MAC地址"""
+    payload = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+    if mac is not None:
+        payload += pack_attr(IFLA_ADDRESS, _mac_bytes(mac))
+    return payload
+
+
+def address_message(index, ip, prefixlen):
+    """编码RTM_NEWADDR/RTM_DELADDR消息体"""
+    payload = _IFADDRMSG.pack(socket.AF_INET, prefixlen, 0, RT_SCOPE_UNIVERSE, index)
+    payload += pack_attr(IFA_LOCAL, _ip_bytes(ip)) + pack_attr(IFA_ADDRESS, _ip_bytes(ip))
+    if prefixlen < 31:
+        host_bits = ~validators.cidr_to_mask(prefixlen) & 0xFFFFFFFF
+        broadcast = validators.parse_address(ip, 'ip')[0] | host_bits
+        payload += pack_attr(IFA_BROADCAST, struct.pack('!I', broadcast))
+    return payload
+
+
+def default_route_message(index, gateway):
+    """编码默认路由的RTM_NEWROUTE消息体"""
+    payload = _RTMSG.pack(socket.AF_INET, 0, 0, 0, RT_TABLE_MAIN, RTPROT_STATIC,
+                          RT_SCOPE_UNIVERSE, RTN_UNICAST, 0)
+    payload += pack_attr(RTA_GATEWAY, _ip_bytes(gateway)) + pack_attr(RTA_OIF, struct.pack('=i', index))
+    return payload
+
+
+class Batch:
+    """一批修改请求，execute时合并为一次send发送，再依次读取每条请求的应答"""
+
+    def __init__(self, netlink):
+        self.netlink = netlink
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, msg_type, flags, payload):
+        self.messages.append((msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, payload))
+        return self
+
+    def set_link_up(self, index, up=True):
+        """启用或禁用网卡"""
+        return self.add(RTM_NEWLINK, 0, link_message(index, IFF_UP if up else 0, IFF_UP))
+
+    def set_hwaddr(self, index, mac):
+        """设置MAC地址，多数驱动要求网卡处于禁用状态"""
+        return self.add(RTM_NEWLINK, 0, link_message(index, mac=mac))
+
+    def add_address(self, index, ip, prefixlen):
+        """添加IPv4地址，已存在时替换"""
+        return self.add(RTM_NEWADDR, NLM_F_CREATE | NLM_F_REPLACE, address_message(index, ip, prefixlen))
+
+    def delete_address(self, index, ip, prefixlen):
+        """删除IPv4地址"""
+        return self.add(RTM_DELADDR, 0, address_message(index, ip, prefixlen))
+
+    def replace_default_route(self, index, gateway):
+        """设置默认路由，已存在时替换"""
+        return self.add(RTM_NEWROUTE, NLM_F_CREATE | NLM_F_REPLACE, default_route_message(index, gateway))
+
+    def execute(self):
+        """发送全部请求，任一请求失败时抛出第一个错误"""
+        if self.messages:
+            with tracing.span("rtnetlink", 'netlink', messages=len(self.messages)):
+                self.netlink.transact(self.messages)
+        self.messages = []
+
+
+class RtNetlink:
+    """rtnetlink连接"""
+
+    def __init__(self, sock=None, groups=0):
+        """groups为要订阅的多播组，如RTMGRP_LINK"""
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            sock.bind((0, groups))
+        self.sock = sock
+        self.seq = 0
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def transact(self, messages):
+        """发送[(类型, 标志, 消息体)]并读取应答，返回各个dump请求的消息体列表"""
+        data = bytearray()
+        pending = {}
+        for msg_type, flags, payload in messages:
+            seq = self._next_seq()
+            pending[seq] = []
+            data += pack_message(msg_type, flags, seq, payload)
+        self.sock.send(bytes(data))
+
+        results = dict(pending)
+        first_error = None
+        while pending:
+            for msg_type, flags, seq, payload in iter_messages(self.sock.recv(_RECV_SIZE)):
+                if seq not in pending:
+                    continue
+                if msg_type == NLMSG_ERROR:
+                    code = -_NLMSGERR.unpack_from(payload)[0]
+                    if code and first_error is None:
+                        first_error = NetlinkError(code, os.strerror(code))
+                    del pending[seq]
+                elif msg_type == NLMSG_DONE:
+                    del pending[seq]
+                else:
+                    pending[seq].append((msg_type, payload))
+        if first_error is not None:
+            raise first_error
+        return [results[seq] for seq in sorted(results)]
+
+    def dump(self, msg_type, payload):
+        """执行一次dump请求，返回全部应答的消息体"""
+        return [body for _, body in self.transact([(msg_type, NLM_F_REQUEST | NLM_F_DUMP, payload)])[0]]
+
+    def batch(self):
+        return Batch(self)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_events(self):
+        """读取一次内核推送的消息，返回[(类型, 消息体)]，需在订阅多播组后使用"""
+        return [(msg_type, payload) for msg_type, _, seq, payload in iter_messages(self.sock.recv(_RECV_SIZE))
+                if seq == 0]
+
+    def list_links(self):
+        """列出全部网卡"""
+        return [parse_link(body) for body in self.dump(RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0))]
+
+    def get_link(self, name):
+        """按名称查找网卡，不存在时返回None"""
+        for link in self.list_links():
+            if link.name == name:
+                return link
+        return None
+
+    def list_addresses(self, index=None):
+        """列出IPv4地址[(网卡索引, IP地址, 前缀长度)]"""
+        addresses = []
+        for body in self.dump(RTM_GETADDR, _IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)):
+            address = parse_address(body)
+            if address and (index is None or address[0] == index):
+                addresses.append(address)
+        return addresses
+
+    def default_gateways(self, index=None):
+        """列出主路由表中的默认网关[(网卡索引, 网关)]"""
+        gateways = []
+        for body in self.dump(RTM_GETROUTE, _RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)):
+            route = parse_route(body)
+            if route is None:
+                continue
+            oif, gateway, dst_len, table = route
+            if dst_len == 0 and table == RT_TABLE_MAIN and gateway and (index is None or oif == index):
+                gateways.append((oif, gateway))
+        return gateways
+
+
+class FakeSocket:
+    """模拟内核rtnetlink应答的套接字
+
+    维护网卡、地址和路由的内存状态，按收到的请求修改状态并返回与内核相同格式的应答，
+    sent中记录收到的全部请求，用于在没有权限的环境下验证后端
+    """
+
+    def __init__(self, links=(), addresses=(), gateways=()):
+        # {索引: Link}
+        self.links = {link.index: link for link in links}
+        # [(网卡索引, IP地址, 前缀长度)]
+        self.addresses = list(addresses)
+        # [(网卡索引, 网关)]
+        self.gateways = list(gateways)
+        self.sent = []
+        self._replies = []
+
+    def close(self):
+        pass
+
+    def _reply(self, msg_type, flags, seq, payload):
+        self._replies.append(pack_message(msg_type, flags, seq, payload))
+
+    def _ack(self, seq, code=0):
+        # 错误应答的消息体为错误码加上原请求的消息头
+        self._reply(NLMSG_ERROR, 0, seq, _NLMSGERR.pack(-code) + _NLMSGHDR.pack(0, 0, 0, seq, 0))
+
+    def _dump(self, msg_type, seq):
+        if msg_type == RTM_GETLINK:
+            for link in self.links.values():
+                payload = _IFINFOMSG.pack(socket.AF_UNSPEC, 1, link.index, link.flags, 0)
+                payload += pack_attr(IFLA_IFNAME, link.name.encode() + b'\0')
+                if link.mac:
+                    payload += pack_attr(IFLA_ADDRESS, _mac_bytes(link.mac))
+                payload += pack_attr(IFLA_OPERSTATE, bytes([OPERSTATES.index(link.operstate)]))
+                self._reply(RTM_NEWLINK, NLM_F_MULTI, seq, payload)
+        elif msg_type == RTM_GETADDR:
+            for index, ip, prefixlen in self.addresses:
+                self._reply(RTM_NEWADDR, NLM_F_MULTI, seq, address_message(index, ip, prefixlen))
+        elif msg_type == RTM_GETROUTE:
+            for index, gateway in self.gateways:
+                self._reply(RTM_NEWROUTE, NLM_F_MULTI, seq, default_route_message(index, gateway))
+        self._reply(NLMSG_DONE, NLM_F_MULTI, seq, struct.pack('=i', 0))
+
+    def _apply(self, msg_type, flags, payload):
+        """按请求修改状态，返回错误码"""
+        if msg_type == RTM_NEWLINK:
+            _, _, index, ifi_flags, change = _IFINFOMSG.unpack_from(payload)
+            link = self.links.get(index)
+            if link is None:
+                return errno.ENODEV
+            attrs = parse_attrs(payload, _IFINFOMSG.size)
+            if IFLA_ADDRESS in attrs:
+                if link.up:
+                    # 与多数物理网卡驱动一致，启用状态下不允许修改MAC地址
+                    return errno.EBUSY
+                link.mac = _format_mac(attrs[IFLA_ADDRESS])
+            link.flags = (link.flags & ~change) | (ifi_flags & change)
+            link.operstate = 'up' if link.up else 'down'
+            if not link.up:
+                # 禁用网卡时内核删除经过该网卡的路由
+                self.gateways = [g for g in self.gateways if g[0] != index]
+        elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            index, ip, prefixlen = parse_address(payload)
+            if index not in self.links:
+                return errno.ENODEV
+            exists = any(a[0] == index and a[1] == ip for a in self.addresses)
+            if msg_type == RTM_DELADDR:
+                if not exists:
+                    return errno.EADDRNOTAVAIL
+                self.addresses = [a for a in self.addresses if not (a[0] == index and a[1] == ip)]
+            else:
+                self.addresses = [a for a in self.addresses if not (a[0] == index and a[1] == ip)]
+                self.addresses.append((index, ip, prefixlen))
+        elif msg_type == RTM_NEWROUTE:
+            oif, gateway, _, _ = parse_route(payload)
+            if oif not in self.links:
+                return errno.ENODEV
+            if not flags & NLM_F_REPLACE and self.gateways:
+                return errno.EEXIST
+            self.gateways = [(oif, gateway)]
+        else:
+            return errno.EOPNOTSUPP
+        return 0
+
+    def send(self, data):
+        for msg_type, flags, seq, payload in iter_messages(bytes(data)):
+            self.sent.append((msg_type, flags, payload))
+            if flags & NLM_F_DUMP == NLM_F_DUMP:
+                self._dump(msg_type, seq)
+            else:
+                code = self._apply(msg_type, flags, payload)
+                if flags & NLM_F_ACK or code:
+                    self._ack(seq, code)
+        return len(data)
+
+    def recv(self, bufsize):
+        replies, self._replies = self._replies, []
+        return b''.join(replies)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户搜索索引
+预先建立IP/MAC精确索引、名称/设备名称前缀索引和拼音首字母索引，不依赖Qt
+"""
+
+from bisect import bisect_left
+
+try:
+    # 安装了pypinyin时使用其完整的汉字拼音表
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+# GB2312一级汉字按拼音排序，各声母首字的区位码（缺少i/u/v）
+_GB2312_INITIALS = (
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+)
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+_GB2312_LEVEL1_END = 0xD7F9
+
+_initial_cache = {}
+
+
+def _char_initial(char):
+    """返回单个字符的拼音首字母，非汉字原样返回小写"""
+    initial = _initial_cache.get(char)
+    if initial is not None:
+        return initial
+    initial = char.lower()
+    if '一' <= char <= '鿿':
+        try:
+            encoded = char.encode('gb2312')
+        except UnicodeEncodeError:
+            encoded = b''
+        if len(encoded) == 2:
+            code = (encoded[0] << 8) | encoded[1]
+            if _GB2312_CODES[0] <= code <= _GB2312_LEVEL1_END:
+                initial = _GB2312_INITIALS[bisect_left(_GB2312_CODES, code + 1) - 1][1]
+    _initial_cache[char] = initial
+    return initial
+
+
+def pinyin_initials(text):
+    """返回文本的拼音首字母串，如"杨益文"返回"yyw" """
+    if not text:
+        return ''
+    if lazy_pinyin is not None:
+        return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors=lambda s: s)).lower()
+    return ''.join(_char_initial(char) for char in text)
+
+
+def normalize_mac(mac):
+    """统一MAC地址格式：去除分隔符并转为大写"""
+    return ''.join(c for c in str(mac) if c not in ':-. ').upper()
+
+
+def _search_fields(config_data):
+    """逐个返回部门列表中用户的(部门行号, 用户行号, IP, MAC, 姓名, 设备名称)"""
+    for dept_row, dept in enumerate(config_data):
+        for user_row, user in enumerate(dept.get('users') or []):
+            yield dept_row, user_row, user.get('ip'), user.get('mac'), user.get('name'), user.get('deviceName')
+
+
+class SearchIndex:
+    """用户搜索索引，结果为(部门行号, 用户行号)元组"""
+
+    def __init__(self, config_data=()):
+        self.records = []
+        self._exact = {}
+        self._prefix_keys = []
+        self._prefix_ids = []
+        self.build(config_data)
+
+    def build(self, config_data):
+        """根据配置数据重建全部索引，config_data为部门列表或ProfileTable"""
+        records = []
+        exact = {}
+        prefix = []
+        if hasattr(config_data, 'search_fields'):
+            fields = config_data.search_fields()
+        else:
+            fields = _search_fields(config_data)
+        for dept_row, user_row, ip, mac, *names in fields:
+            record_id = len(records)
+            records.append((dept_row, user_row))
+
+            ip = str(ip or '').strip()
+            if ip:
+                exact.setdefault(ip, []).append(record_id)
+            mac = normalize_mac(mac or '')
+            if mac:
+                exact.setdefault(mac, []).append(record_id)
+
+            for value in names:
+                value = str(value or '').strip()
+                if value:
+                    prefix.append((value.lower(), record_id))
+                    initials = pinyin_initials(value)
+                    if initials and initials != value.lower():
+                        prefix.append((initials, record_id))
+
+        prefix.sort()
+        self.records = records
+        self._exact = exact
+        self._prefix_keys = [key for key, _ in prefix]
+        self._prefix_ids = [record_id for _, record_id in prefix]
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, query, limit=500):
+        """搜索用户，精确匹配IP/MAC的结果排在前缀匹配之前"""
+        query = query.strip()
+        if not query:
+            return []
+
+        seen = set()
+        ids = []
+        for key in (query, normalize_mac(query)):
+            for record_id in self._exact.get(key, ()):
+                if record_id not in seen:
+                    seen.add(record_id)
+                    ids.append(record_id)
+
+        query = query.lower()
+        keys = self._prefix_keys
+        pos = bisect_left(keys, query)
+        while pos < len(keys) and len(ids) < limit and keys[pos].startswith(query):
+            record_id = self._prefix_ids[pos]
+            if record_id not in seen:
+                seen.add(record_id)
+                ids.append(record_id)
+            pos += 1
+
+        return [self.records[record_id] for record_id in ids[:limit]]
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台搜索线程
+在工作线程中建立搜索索引并执行查询，避免输入时阻塞界面
+"""
+
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from search_index import SearchIndex
+
+
+class SearchWorker(QObject):
+    """搜索工作对象，需移动到独立的QThread中运行"""
+
+    # 查询序号、命中的(部门行号, 用户行号)列表
+    results_ready = pyqtSignal(int, object)
+    # 索引中的用户数量
+    index_ready = pyqtSignal(int)
+
+    def __init__(self):
+        super().__init__()
+        self.index = SearchIndex()
+        # 界面线程写入的最新查询序号，用于跳过已过期的查询
+        self.latest_seq = 0
+
+    @pyqtSlot(object)
+    def build_index(self, config_data):
+        """重建搜索索引，SQLite配置库已有索引，直接在库中查询"""
+        self.index = config_data if hasattr(config_data, 'search') else SearchIndex(config_data)
+        self.index_ready.emit(len(self.index))
+
+    @pyqtSlot(int, str)
+    def search(self, seq, query):
+        """执行查询，排队期间已被新输入取代的查询直接丢弃"""
+        if seq != self.latest_seq:
+            return
+        self.results_ready.emit(seq, self.index.search(query))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网卡配置快照
+应用配置前保存网卡当前的地址、默认网关、DNS、MAC地址和启用状态，应用失败、超时或被取消时
+按快照一次性恢复。最近的快照保存在磁盘上的环形记录中，托盘菜单的"恢复上一个网络配置"
+直接使用其中最新的快照，不需要重新查找网卡
+"""
+
+import json
+import os
+import platform
+import threading
+import time
+
+from interface_state import read_interface_state, diff_state
+from search_index import normalize_mac
+import validators
+
+# 环形记录保存的快照数量
+RING_SIZE = 10
+
+RESOLV_CONF = '/etc/resolv.conf'
+
+
+def state_dir():
+    """保存快照等运行状态的目录，可通过环境变量NCMTOOL_STATE_DIR修改"""
+    return os.environ.get('NCMTOOL_STATE_DIR') or os.path.join(os.path.expanduser('~'), '.ncmtool')
+
+
+class Snapshot:
+    """网卡配置快照，未能读取的字段为None"""
+
+    __slots__ = ('card', 'system', 'addresses', 'gateways', 'dns', 'mac', 'up', 'resolv_conf', 'taken_at',
+                 'dhcp', 'dhcp_dns', 'mac_override')
+
+    def __init__(self, card, system, addresses=None, gateways=None, dns=None, mac=None, up=None,
+                 resolv_conf=None, taken_at=None, dhcp=None, dhcp_dns=None, mac_override=None):
+        self.card = card
+        self.system = system
+        # [(IP地址, 子网掩码)]
+        self.addresses = addresses
+        self.gateways = gateways
+        self.dns = dns
+        self.mac = mac
+        # 网卡是否已启用
+        self.up = up
+        # Linux上resolv.conf的原始内容，恢复时原样写回
+        self.resolv_conf = resolv_conf
+        self.taken_at = taken_at if taken_at is not None else time.time()
+        # Windows和macOS上地址和DNS是否通过DHCP获取，旧版本保存的快照中为None
+        self.dhcp = dhcp
+        self.dhcp_dns = dhcp_dns
+        # Windows网卡高级属性中设置的网络地址，未设置时为空字符串，恢复时清除该属性
+        self.mac_override = mac_override
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        snapshot = cls(**{name: data.get(name) for name in cls.__slots__})
+        if snapshot.addresses is not None:
+            snapshot.addresses = [tuple(address) for address in snapshot.addresses]
+        return snapshot
+
+    def profile(self):
+        """快照中的首个地址、网关和DNS，按用户配置的字段返回"""
+        ip, netmask = self.addresses[0] if self.addresses else ('', '')
+        dns = self.dns or []
+        return {
+            'ip': ip, 'netmask': netmask,
+            'gateway': self.gateways[0] if self.gateways else '',
+            'dns': dns[0] if dns else '', 's_dns': dns[1] if len(dns) > 1 else '',
+            'mac': self.mac or '',
+        }
+
+    def describe(self):
+        """用于提示信息的简短描述"""
+        taken = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.taken_at))
+        addresses = 'DHCP' if self.dhcp else ', '.join(ip for ip, _ in self.addresses or ()) or '无地址'
+        return f"{self.card}（{addresses}，保存于 {taken}）"
+
+    def __repr__(self):
+        return f"Snapshot({self.card!r}, addresses={self.addresses!r}, gateways={self.gateways!r}, up={self.up!r})"
+
+
+def take_snapshot(card, system=None):
+    """读取网卡当前配置作为快照"""
+    from link_state import link_up
+    system = system or platform.system()
+    state = read_interface_state(card, system)
+    resolv_conf = None
+    if system == "Linux":
+        try:
+            with open(RESOLV_CONF) as f:
+                resolv_conf = f.read()
+        except OSError:
+            pass
+    try:
+        # 保存管理状态，没有连接网线的网卡恢复时同样保持启用
+        up = link_up(card, system, admin=True)
+    except Exception:
+        up = None
+    return Snapshot(card, system, state.addresses, state.gateways, state.dns, state.mac, up, resolv_conf,
+                    dhcp=state.dhcp, dhcp_dns=state.dhcp_dns, mac_override=state.mac_override)
+
+
+class SnapshotRing:
+    """磁盘上的快照环形记录，只保留最近的RING_SIZE个，最新的在最后"""
+
+    def __init__(self, path=None, size=RING_SIZE):
+        self.path = path or os.path.join(state_dir(), 'snapshots.json')
+        self.size = size
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return data if isinstance(data, list) else []
+
+    def push(self, snapshot):
+        """保存快照，超出数量时丢弃最早的快照"""
+        with self._lock:
+            records = self._read()
+            records.append(snapshot.to_dict())
+            records = records[-self.size:]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def snapshots(self):
+        """全部快照，最新的在最后"""
+        with self._lock:
+            records = self._read()
+        result = []
+        for record in records:
+            try:
+                result.append(Snapshot.from_dict(record))
+            except (TypeError, AttributeError):
+                # 跳过损坏的记录
+                continue
+        return result
+
+    def latest(self, card=None):
+        """最新的快照，指定card时只查找该网卡的快照，没有时返回None"""
+        for snapshot in reversed(self.snapshots()):
+            if card is None or snapshot.card == card:
+                return snapshot
+        return None
+
+
+_ring = None
+_ring_lock = threading.Lock()
+
+
+def get_ring():
+    """获取全局共享的快照记录"""
+    global _ring
+    with _ring_lock:
+        if _ring is None:
+            _ring = SnapshotRing()
+        return _ring
+
+
+def _restore_linux(snapshot):
+    """在一批rtnetlink请求中恢复MAC地址、地址、启用状态和默认网关，再写回resolv.conf"""
+    import rtnetlink
+    with rtnetlink.RtNetlink() as netlink:
+        link = netlink.get_link(snapshot.card)
+        if link is None:
+            raise RuntimeError(f"找不到网卡: {snapshot.card}")
+        batch = netlink.batch()
+        restart = snapshot.mac and link.mac and normalize_mac(snapshot.mac) != normalize_mac(link.mac)
+        if restart:
+            batch.set_link_up(link.index, False).set_hwaddr(link.index, snapshot.mac)
+        if snapshot.addresses is not None:
+            wanted = [(ip, validators.mask_to_cidr(validators.parse_netmask(mask)[0]))
+                      for ip, mask in snapshot.addresses]
+            # 删除快照中没有的地址，按相反顺序先删除从地址
+            for _, address, length in reversed(netlink.list_addresses(link.index)):
+                if (address, length) not in wanted:
+                    batch.delete_address(link.index, address, length)
+            for ip, prefixlen in wanted:
+                batch.add_address(link.index, ip, prefixlen)
+        up = snapshot.up if snapshot.up is not None else link.up or restart
+        batch.set_link_up(link.index, up)
+        # 禁用网卡或替换地址会删除默认路由，网卡启用时重新设置
+        if up and snapshot.gateways:
+            batch.replace_default_route(link.index, snapshot.gateways[0])
+        batch.execute()
+
+    if snapshot.resolv_conf is not None and snapshot.resolv_conf != _read_text(RESOLV_CONF):
+        with open(RESOLV_CONF, 'w') as f:
+            f.write(snapshot.resolv_conf)
+
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def restore_steps(snapshot):
+    """按快照恢复网卡配置的步骤
+
+    Linux上为一批rtnetlink请求；其他系统与应用配置一样编译为合并后的命令批次，
+    只恢复与网卡当前配置不同的字段。快照中的地址通过DHCP获取时重新启用DHCP，
+    DNS按快照中的获取方式和完整的服务器列表恢复
+    """
+    from network_apply import ApplyStep, batch_steps
+    import command_plan
+
+    if snapshot.system == "Linux":
+        return [ApplyStep("恢复网络配置", lambda: _restore_linux(snapshot), cancellable=False)]
+
+    profile = snapshot.profile()
+    state = read_interface_state(snapshot.card, snapshot.system)
+    changes = diff_state(state, profile['ip'], profile['netmask'], profile['gateway'], '', '', profile['mac'])
+    if snapshot.dhcp or not profile['ip']:
+        # 地址通过DHCP获取或快照中没有地址时不恢复静态地址
+        changes -= {'ip', 'gateway'}
+    elif state.dhcp:
+        # 地址相同但当前通过DHCP获取时同样改回静态地址
+        changes.add('ip')
+    reset_mac = False
+    if snapshot.system == "Windows" and snapshot.mac_override == '':
+        # 原来没有设置网络地址时清除该属性，恢复网卡出厂地址，而不是把当前地址固定下来
+        changes.discard('mac')
+        reset_mac = state.mac_override != ''
+
+    dhcp = bool(snapshot.dhcp) and state.dhcp is not True
+    if snapshot.dhcp_dns:
+        dns = None
+        dhcp_dns = state.dhcp_dns is not True
+    else:
+        dhcp_dns = False
+        # 旧版本的快照中没有记录DNS获取方式，DNS为空时不修改
+        dns = snapshot.dns if snapshot.dns or snapshot.dhcp_dns is False else None
+        if dns is not None and not state.dhcp_dns and state.dns == dns:
+            dns = None
+
+    commands = []
+    if snapshot.system == "Windows" and snapshot.up:
+        commands.append(command_plan.Command(
+            'netsh', f"interface set interface name=\"{snapshot.card}\" admin=enabled", "启用网卡", key='admin'))
+    compile_steps = command_plan.compile_windows if snapshot.system == "Windows" else command_plan.compile_macos
+    commands.extend(compile_steps(snapshot.card, profile['ip'], profile['netmask'], profile['gateway'],
+                                  '', '', profile['mac'], '', changes))
+    commands.extend(command_plan.compile_restore(snapshot.system, snapshot.card, dhcp, dns, dhcp_dns, reset_mac))
+    steps = batch_steps(command_plan.merge(command_plan.dedupe(commands)))
+    for step in steps:
+        # 恢复过程中不允许取消
+        step.cancellable = False
+    return steps
+
+
+def snapshot_step(card, system=None, ring=None):
+    """应用配置前保存快照的步骤，之后的步骤失败时按快照恢复"""
+    from network_apply import ApplyStep
+    taken = []
+
+    def take():
+        snapshot = take_snapshot(card, system)
+        (ring or get_ring()).push(snapshot)
+        taken.append(snapshot)
+
+    def restore():
+        if not taken:
+            return
+        print(f"正在恢复网卡原配置: {taken[0].describe()}")
+        for step in restore_steps(taken[0]):
+            step.action()
+
+    # 无法保存快照时仍然应用配置，只是失败时无法恢复
+    return ApplyStep("保存当前配置", take, optional=True, undo=restore)
+
+
+def revert_steps(card=None, ring=None):
+    """恢复到最近一次应用配置前的快照，恢复前同样保存当前配置，可以再次恢复"""
+    snapshot = (ring or get_ring()).latest(card)
+    if snapshot is None:
+        return None
+    steps = restore_steps(snapshot)
+    if steps:
+        steps.insert(0, snapshot_step(snapshot.card, snapshot.system, ring))
+    return steps
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特权助手测试
+在临时的Unix域套接字上运行使用FakeBackend的助手，检查请求/应答往返、套接字权限和
+服务端对客户端输入的校验
+"""
+
+import json
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import apply_helper
+from apply_helper import FakeBackend, HelperClient, HelperError, HelperServer
+
+pytestmark = pytest.mark.skipif(not apply_helper.SUPPORTED, reason="特权助手不支持Windows")
+
+PROFILE = {'ip': '10.0.1.5', 'netmask': '255.255.255.0', 'gateway': '10.0.1.1', 'dns': '10.0.0.53',
+           's_dns': '', 'mac': '02:00:00:00:00:02', 'mac_name': 'Network Address'}
+
+
+@pytest.fixture
+def helper(tmp_path):
+    address = str(tmp_path / 'helper.sock')
+    backend = FakeBackend(adapters=['eth0', 'Wi-Fi'])
+    server = HelperServer(backend, address)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    # 套接字文件在bind时即已创建，listener赋值后才开始监听
+    while server.listener is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    yield address, backend
+    server.stop()
+    thread.join(10)
+    assert not thread.is_alive()
+
+
+def test_apply_query_revert_round_trip(helper):
+    address, backend = helper
+    progress = []
+    with HelperClient(address) as client:
+        assert client.ping()['ok']
+        changed, timings = client.apply('eth0', PROFILE, progress=lambda *args: progress.append(args))
+        assert changed == ['ip', 'gateway', 'dns', 'mac']
+        assert [title for title, _ in timings] == changed
+        assert progress[-1] == (4, 4, "完成")
+        # 配置相同时不修改
+        assert client.apply('eth0', PROFILE) == ([], [])
+
+        state = client.query('eth0')
+        assert state['addresses'] == [['10.0.1.5', '255.255.255.0']]
+        assert state['dns'] == ['10.0.0.53']
+
+        assert client.revert('eth0')[0] == 'eth0'
+        assert client.query('eth0')['addresses'] is None
+    assert backend.calls == [('eth0', PROFILE), ('eth0', PROFILE)]
+
+
+def test_socket_is_private(helper):
+    address, _ = helper
+    assert stat.S_ISSOCK(os.stat(address).st_mode)
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    # 创建套接字时修改的umask已恢复
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert umask != 0o177
+
+
+@pytest.mark.parametrize('card, profile, error', [
+    ('eth1', {}, "网卡不存在"),
+    ('eth0"\nexit', {}, "网卡名称不正确"),
+    ('eth0', {'dns': '10.0.0.53\nnameserver 6.6.6.6'}, "首选DNS格式不正确"),
+    ('eth0', {'s_dns': '8.8.8.8; reboot'}, "备用DNS格式不正确"),
+    ('eth0', {'ip': '10.0.1.5 && reboot'}, "IP地址格式不正确"),
+    ('eth0', {'gateway': '10.0.2.1'}, "不在 10.0.1.0/24 子网内"),
+    ('eth0', {'mac': "02:00:00:00:00:02' }; Restart-Computer; {'"}, "MAC地址格式不正确"),
+    ('eth0', {'mac': '02:00-00:00:00:02'}, "MAC地址格式不正确"),
+    ('eth0', {'mac_name': "Network Address' -DisplayValue x; Restart-Computer #"}, "物理地址名称"),
+    ('eth0', {'netmask': 24}, "应为字符串"),
+])
+def test_invalid_apply_is_rejected(helper, card, profile, error):
+    address, backend = helper
+    with HelperClient(address) as client:
+        with pytest.raises(HelperError, match=error):
+            client.apply(card, dict(PROFILE, **profile))
+        # 连接和工作线程在拒绝请求后仍可使用
+        assert client.apply('Wi-Fi', PROFILE)[0]
+    assert backend.calls == [('Wi-Fi', PROFILE)]
+
+
+def test_malformed_requests_are_rejected(helper):
+    address, backend = helper
+    with HelperClient(address) as client:
+        # 不可哈希的网卡名称在排队前拒绝，不影响工作线程
+        client.conn.send_bytes(b'{"op": "apply", "card": ["eth0"], "profile": {}}')
+        assert json.loads(client.conn.recv_bytes()) == {'ok': False, 'error': "请求格式不正确"}
+        with pytest.raises(HelperError, match="网卡不存在"):
+            client.query('../../etc/passwd')
+        with pytest.raises(HelperError, match="配置格式不正确"):
+            client.request({'op': 'apply', 'card': 'eth0', 'profile': 'ip=10.0.0.1'})
+        assert client.apply('eth0', PROFILE)[0]
+    assert len(backend.calls) == 1
+
+
+def test_connect_without_helper_returns_none(tmp_path):
+    assert apply_helper.connect(str(tmp_path / 'missing.sock')) is None
+    assert not apply_helper.helper_available(str(tmp_path / 'missing.sock'))
+
+
+def test_worker_reports_unchanged_helper_apply(helper):
+    """助手没有修改任何字段时界面与直接应用一样提示无需修改，而不是提示应用成功"""
+    from apply_worker import ApplyWorker
+    address, _ = helper
+    results = []
+    for _ in range(2):
+        worker = ApplyWorker(lambda: apply_helper.helper_steps('eth0', PROFILE, address=address))
+        worker.succeeded.connect(lambda timings: results.append('succeeded'))
+        worker.unchanged.connect(lambda: results.append('unchanged'))
+        worker.failed.connect(results.append)
+        worker.run()
+    assert results == ['succeeded', 'unchanged']
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台应用配置线程测试
+步骤之间取消、执行中取消外部命令以及失败或中断时按相反顺序撤销
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+import command_runner
+from apply_worker import ApplyWorker
+import network_apply
+from network_apply import ApplyStep
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+
+def _connect(worker):
+    results = []
+    for name in ('succeeded', 'failed', 'cancelled', 'unchanged'):
+        getattr(worker, name).connect(lambda *args, name=name: results.append((name,) + args))
+    return results
+
+
+def test_cancel_between_steps_rolls_back(app):
+    calls = []
+    worker = ApplyWorker(lambda: [
+        ApplyStep("第一步", lambda: (calls.append('第一步'), worker.cancel()),
+                  undo=lambda: calls.append('撤销第一步')),
+        ApplyStep("第二步", lambda: calls.append('第二步'), undo=lambda: calls.append('撤销第二步')),
+    ])
+    results = _connect(worker)
+    worker.run()
+    assert calls == ['第一步', '撤销第一步']
+    assert results == [('cancelled', "已取消应用配置，已恢复原配置")]
+
+
+def test_non_cancellable_step_still_runs(app):
+    """不可取消的步骤（如网卡关闭后重新启用）在取消后仍然执行"""
+    calls = []
+    worker = ApplyWorker(lambda: [
+        ApplyStep("禁用网卡", lambda: (calls.append('禁用网卡'), worker.cancel())),
+        ApplyStep("启用网卡", lambda: calls.append('启用网卡'), cancellable=False),
+        ApplyStep("设置DNS", lambda: calls.append('设置DNS')),
+    ])
+    results = _connect(worker)
+    worker.run()
+    assert calls == ['禁用网卡', '启用网卡']
+    assert results == [('cancelled', "已取消应用配置")]
+
+
+def test_cancel_stops_running_command(app):
+    """取消时结束正在执行的外部命令，不等待其超时"""
+    calls = []
+    command = [sys.executable, '-c', 'import time; time.sleep(30)']
+    worker = ApplyWorker(lambda: [
+        ApplyStep("设置IP", lambda: calls.append('设置IP'), undo=lambda: calls.append('撤销设置IP')),
+        ApplyStep("设置DNS", lambda: command_runner.run(command, timeout=60)),
+    ])
+    results = _connect(worker)
+    progress = []
+
+    def on_progress(index, total, title):
+        progress.append(title)
+        # 命令开始执行后由其他线程取消
+        if title == "设置DNS":
+            threading.Timer(0.5, worker.cancel).start()
+
+    worker.progress.connect(on_progress)
+    start = time.perf_counter()
+    worker.run()
+    assert time.perf_counter() - start < 10
+
+    assert calls == ['设置IP', '撤销设置IP']
+    assert results == [('cancelled', "已取消应用配置，已恢复原配置")]
+    assert progress[:3] == ["读取网卡当前配置", "设置IP", "设置DNS"]
+
+
+def test_failure_rolls_back_in_reverse_order(app):
+    calls = []
+
+    def fail():
+        raise RuntimeError("命令返回1")
+
+    worker = ApplyWorker(lambda: [
+        ApplyStep("设置IP", lambda: None, undo=lambda: calls.append('撤销设置IP')),
+        ApplyStep("设置网关", lambda: None, undo=lambda: calls.append('撤销设置网关')),
+        ApplyStep("设置DNS", fail),
+    ])
+    results = _connect(worker)
+    worker.run()
+    assert calls == ['撤销设置网关', '撤销设置IP']
+    assert results == [('failed', "设置DNS失败: 命令返回1，已恢复原配置")]
+
+
+def test_no_steps_reports_unchanged(app):
+    worker = ApplyWorker(lambda: [])
+    results = _connect(worker)
+    worker.run()
+    assert results == [('unchanged',)]
+
+
+def test_interrupt_rolls_back_and_propagates():
+    """Ctrl-C等中断在恢复原配置后继续向上抛出"""
+    calls = []
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    steps = [ApplyStep("保存当前配置", lambda: calls.append('保存'), undo=lambda: calls.append('恢复')),
+             ApplyStep("设置IP地址", interrupt)]
+    with pytest.raises(KeyboardInterrupt):
+        network_apply.run_steps(steps)
+    assert calls == ['保存', '恢复']
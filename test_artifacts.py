@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量生成部署文件测试
+检查生成的脚本不会因为配置中的DNS、MAC地址、名称和网卡名称执行额外的命令，
+以及清单文件跳过未变化的用户、删除已从配置中删除的用户
+"""
+
+import os
+import tarfile
+
+import pytest
+
+import artifacts
+
+USER = {'name': '张三', 'ip': '192.168.107.49', 'netmask': '255.255.255.0', 'gateway': '192.168.107.1',
+        'dns': '192.168.100.40', 's_dns': '8.8.8.8', 'mac': '00-50-56-C0-00-08'}
+
+SCRIPTS = ('netsh', 'networksetup')
+
+
+def _departments(*users, department='信息中心'):
+    return [{'department': department, 'users': list(users)}]
+
+
+def _export(tmp_path, departments, formats=artifacts.FORMATS, **kwargs):
+    return artifacts.export(departments, str(tmp_path / 'out'), formats, jobs=1, **kwargs)
+
+
+def test_scripts_quote_every_value():
+    user = dict(USER, mac_name="Bob's Network Address")
+    netsh = artifacts.render_netsh('信息中心', user, "Bob's LAN").split('\r\n')
+    assert netsh[4:6] == ['netsh interface ip set dns "Bob\'s LAN" static 192.168.100.40 primary',
+                          'netsh interface ip add dns "Bob\'s LAN" 8.8.8.8 index=2']
+    assert netsh[7] == ("powershell -ExecutionPolicy Bypass -Command \"Set-NetAdapterAdvancedProperty "
+                        "-Name 'Bob''s LAN' -DisplayName 'Bob''s Network Address' -DisplayValue '005056C00008'\"")
+    script = artifacts.render_networksetup('信息中心', user, "Bob's Wi-Fi").split('\n')
+    assert script[3:5] == ["networksetup -setmanual 'Bob'\"'\"'s Wi-Fi' 192.168.107.49 255.255.255.0 192.168.107.1",
+                           "networksetup -setdnsservers 'Bob'\"'\"'s Wi-Fi' 192.168.100.40 8.8.8.8"]
+
+
+@pytest.mark.parametrize('field, value, error', [
+    ('dns', '1.1.1.1; touch /tmp/pwned', "首选DNS格式不正确"),
+    ('s_dns', '8.8.8.8 & del C:\\x', "备用DNS格式不正确"),
+    ('dns', 53, "首选DNS格式不正确"),
+    ('mac', "00'; Remove-Item C:\\x; '", "MAC地址格式不正确"),
+    ('mac_name', "网络地址\" & del C:\\x & \"", "物理地址名称包含不允许的字符"),
+    ('mac_name', "%COMSPEC%", "物理地址名称包含不允许的字符"),
+    ('ip', '192.168.107.49 && reboot', "IP地址格式不正确"),
+])
+def test_invalid_values_are_skipped_for_script_formats(tmp_path, field, value, error):
+    """只生成脚本格式时同样校验，不依赖nm格式先检查"""
+    result = _export(tmp_path, _departments(dict(USER, **{field: value})), SCRIPTS)
+    assert [(d, n) for d, n, _ in result.skipped] == [('信息中心', '张三')]
+    assert error in result.skipped[0][2]
+    assert result.written == 0
+    assert not os.path.exists(tmp_path / 'out' / '信息中心')
+
+
+def test_names_stay_in_comment_lines():
+    user = dict(USER, name='张三\r\ntouch /tmp/pwned\ndel C:\\x^')
+    netsh = artifacts.render_netsh('信息\n中心', user, '以太网').split('\r\n')
+    assert netsh[2] == 'rem ncmtool 信息 中心/张三  touch /tmp/pwned del C:\\x_'
+    assert not any(line.startswith(('touch', 'del')) for line in netsh)
+    for text in (artifacts.render_networksetup('信息\n中心', user, 'Wi-Fi'),
+                 artifacts.render_netplan('信息\n中心', user, 'eth0')):
+        lines = text.split('\n')
+        assert [line for line in lines if 'pwned' in line] == [
+            '# ncmtool 信息 中心/张三  touch /tmp/pwned del C:\\x^']
+
+
+@pytest.mark.parametrize('cards', [{'windows': '以太网" & del C:\\x & "'}, {'windows': '%COMSPEC%'},
+                                   {'macos': 'Wi-Fi\nreboot'}, {'linux': 'eth0\nreboot'}])
+def test_invalid_card_is_rejected(tmp_path, cards):
+    with pytest.raises(ValueError, match="网卡名称包含不允许的字符"):
+        _export(tmp_path, _departments(USER), cards=cards)
+
+
+def test_manifest_skips_unchanged_and_removes_deleted(tmp_path):
+    other = dict(USER, name='李四', ip='192.168.107.50', mac='')
+    result = _export(tmp_path, _departments(USER, other))
+    assert (result.total, result.written, result.unchanged, result.skipped) == (2, 2, 0, [])
+    record_dir = tmp_path / 'out' / '信息中心' / '李四'
+    assert sorted(os.listdir(record_dir)) == sorted(artifacts.FILENAMES.values())
+    assert oct(os.stat(record_dir / 'networksetup.sh').st_mode & 0o777) == oct(0o755)
+
+    again = _export(tmp_path, _departments(USER, other))
+    assert (again.written, again.unchanged, again.removed) == (0, 2, [])
+
+    changed = _export(tmp_path, _departments(USER, dict(other, dns='10.0.0.53')))
+    assert (changed.written, changed.unchanged) == (1, 1)
+
+    removed = _export(tmp_path, _departments(USER))
+    assert removed.removed == ['信息中心/李四']
+    assert not record_dir.exists()
+    assert (tmp_path / 'out' / '信息中心' / '张三' / 'netsh.cmd').exists()
+
+    # 无效的用户不写入清单，修正后重新生成
+    invalid = _export(tmp_path, _departments(USER, dict(other, dns='bad dns')))
+    assert invalid.written == 0 and len(invalid.skipped) == 1
+    fixed = _export(tmp_path, _departments(USER, other))
+    assert (fixed.written, fixed.unchanged) == (1, 1)
+
+
+def test_archive_contains_only_changed_records(tmp_path):
+    output = str(tmp_path / 'out.tar.gz')
+    other = dict(USER, name='李四', ip='192.168.107.50')
+    artifacts.export(_departments(USER, other), output, ('netsh',), jobs=1)
+    with tarfile.open(output) as tar:
+        assert sorted(tar.getnames()) == ['信息中心/张三/netsh.cmd', '信息中心/李四/netsh.cmd']
+    result = artifacts.export(_departments(USER, dict(other, s_dns='')), output, ('netsh',), jobs=1)
+    assert (result.written, result.unchanged) == (1, 1)
+    with tarfile.open(output) as tar:
+        assert tar.getnames() == ['信息中心/李四/netsh.cmd']
+        assert 'index=2' not in tar.extractfile('信息中心/李四/netsh.cmd').read().decode('utf-8')
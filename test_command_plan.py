@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令计划测试
+各系统编译并合并后的预览文本与testdata/plans中保存的文件逐字节比较；修改命令格式后用
+NCMTOOL_UPDATE_GOLDEN=1 python -m pytest test_command_plan.py 重新生成并检查差异
+"""
+
+import os
+
+import pytest
+
+import command_plan
+import network_apply
+from command_plan import Command
+from interface_state import FIELDS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'plans')
+
+PROFILE = {'ip': '192.168.107.49', 'netmask': '255.255.255.0', 'gateway': '192.168.107.1',
+           'dns': '192.168.100.40', 's_dns': '8.8.8.8', 'mac': '00-50-56-C0-00-08', 'mac_name': ''}
+
+# 用例名: (系统, 网卡, 配置中修改的字段, 需要修改的字段, 网卡当前的IPv4地址)
+CASES = {
+    'windows_full': ('Windows', '以太网 3', {}, FIELDS, None),
+    # 首选和备用DNS相同时只设置一次
+    'windows_duplicate_dns': ('Windows', '以太网', {'s_dns': ' 192.168.100.40 '}, {'dns'}, None),
+    # 网卡名称中的单引号在PowerShell字符串中转义
+    'windows_mac_only': ('Windows', "Bob's LAN", {'mac_name': 'Network Address'}, {'mac'}, None),
+    # 网卡名称和每个参数都经过shell转义
+    'macos_full': ('Darwin', "Bob's USB 10/100 LAN", {'netmask': '24'}, FIELDS, None),
+    # 先按相反顺序删除其他地址再设置新地址，目标地址已存在时不删除
+    'linux_full': ('Linux', 'enp0s31f6', {}, FIELDS,
+                   [('192.168.107.49', 24), ('10.0.0.5', 8), ('10.0.0.6', 8)]),
+    'linux_unknown_addresses': ('Linux', 'eth0', {'mac': ''}, {'ip', 'gateway'}, None),
+    'linux_dns_only': ('Linux', 'eth0', {'s_dns': ''}, {'dns'}, [('192.168.107.49', 24)]),
+}
+
+
+def _plan_text(case):
+    system, card, profile, changes, addresses = CASES[case]
+    fields = dict(PROFILE, **profile)
+    return command_plan.format_plan(command_plan.compile_plan(system, card, changes=changes, addresses=addresses,
+                                                              **fields))
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_plan_matches_golden(case):
+    text = _plan_text(case)
+    path = os.path.join(GOLDEN_DIR, f'{case}.txt')
+    if os.environ.get('NCMTOOL_UPDATE_GOLDEN'):
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+    with open(path, encoding='utf-8', newline='') as f:
+        assert text == f.read()
+
+
+def test_no_changes():
+    assert command_plan.compile_plan('Windows', 'eth0', changes=set(), **PROFILE) == []
+    assert command_plan.format_plan([]) == "网卡当前配置与所选配置一致，无需执行任何命令\n"
+
+
+def test_dedupe_keeps_last_command_per_key():
+    commands = [
+        Command('netsh', "set address A", "设置IP地址", key='address'),
+        Command('netsh', "set dns 1", "设置DNS", key='dns'),
+        Command('netsh', "show config", "查看配置"),
+        Command('netsh', "set address B", "设置IP地址", key='address'),
+        Command('netsh', "show config", "查看配置"),
+    ]
+    assert [c.line for c in command_plan.dedupe(commands)] == ["set dns 1", "set address B", "show config"]
+
+
+def test_merge_groups_adjacent_commands_of_same_tool():
+    commands = [Command('netsh', "a", "设置IP地址"), Command('netsh', "b", "设置DNS"),
+                Command('powershell', "c", "修改MAC地址", optional=True), Command('netsh', "d", "设置DNS")]
+    batches = command_plan.merge(commands)
+    assert [(b.tool, b.lines, b.title, b.optional) for b in batches] == [
+        ('netsh', ["a", "b"], "设置IP地址、设置DNS", False),
+        ('powershell', ["c"], "修改MAC地址", True),
+        ('netsh', ["d"], "设置DNS", False),
+    ]
+
+
+@pytest.mark.parametrize('system', ['Windows', 'Darwin', 'Linux'])
+@pytest.mark.parametrize('card, profile, error', [
+    ('eth0\ninterface ip set address name="eth1" dhcp', {}, "网卡名称包含不允许的字符"),
+    ('eth0', {'ip': '192.168.107.49\nexit'}, "IP地址格式不正确"),
+    ('eth0', {'gateway': '192.168.107.1; reboot'}, "网关地址格式不正确"),
+    ('eth0', {'netmask': '255.255.255.0 $(reboot)'}, "子网掩码格式不正确"),
+    ('eth0', {'dns': '1.1.1.1 && reboot'}, "首选DNS格式不正确"),
+    ('eth0', {'s_dns': "8.8.8.8'; reboot; '"}, "备用DNS格式不正确"),
+    ('eth0', {'mac': "005056C00008' -DisplayName x; Restart-Computer; '"}, "MAC地址格式不正确"),
+])
+def test_injection_is_rejected(system, card, profile, error):
+    with pytest.raises(ValueError, match=error):
+        command_plan.compile_plan(system, card, **dict(PROFILE, **profile))
+
+
+def test_windows_rejects_double_quote_in_card():
+    with pytest.raises(ValueError, match="网卡名称包含不允许的字符"):
+        command_plan.compile_plan('Windows', 'eth0" static 1.2.3.4', **PROFILE)
+    # macOS的服务名称可以包含双引号，经过shell转义
+    batches = command_plan.compile_plan('Darwin', 'eth0" x', changes={'dns'}, **PROFILE)
+    assert batches[0].lines == ["networksetup -setdnsservers 'eth0\" x' 192.168.100.40 8.8.8.8"]
+
+
+@pytest.mark.parametrize('profile, error', [
+    ({'dns': '1.1.1.1\nnameserver 6.6.6.6'}, "首选DNS格式不正确"),
+    ({'s_dns': '8.8.8.8\noptions debug'}, "备用DNS格式不正确"),
+    ({'mac': '00:50:56:C0:00'}, "MAC地址格式不正确"),
+    ({'ip': '192.168.107.49; reboot'}, "IP地址格式不正确"),
+])
+def test_linux_apply_rejects_what_preview_rejects(profile, error):
+    """Linux上实际应用与预览使用相同的校验，不会把无效的DNS写入resolv.conf"""
+    fields = dict(PROFILE, **profile)
+    with pytest.raises(ValueError, match=error):
+        command_plan.compile_plan('Linux', 'eth0', **fields)
+    with pytest.raises(ValueError, match=error):
+        network_apply.build_steps('eth0', system='Linux', **fields)
+    with pytest.raises(ValueError, match="网卡名称包含不允许的字符"):
+        network_apply.linux_steps('eth0\nlo', **PROFILE)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部命令执行测试
+在PATH最前面放置一个临时的桩命令netstub，按参数输出、退出、休眠或启动子进程，
+检查超时、非零退出码、并发执行和取消时的行为
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import command_runner
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="桩命令使用#!解释器行")
+
+STUB = '''#!{python}
+import os, subprocess, sys, time
+op, args = sys.argv[1], sys.argv[2:]
+if op == 'echo':
+    print(' '.join(args))
+elif op == 'fail':
+    sys.stderr.write('error: ' + args[1] + '\\n')
+    sys.exit(int(args[0]))
+elif op == 'sleep':
+    # 记录进程号，测试据此检查进程已被结束
+    with open(args[1], 'w') as f:
+        f.write(str(os.getpid()))
+    time.sleep(float(args[0]))
+    print('done')
+elif op == 'spawn':
+    # 子进程继承输出管道，只结束本进程时读取输出不会结束
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    with open(args[0], 'w') as f:
+        f.write(str(child.pid))
+    time.sleep(60)
+elif op == 'cat':
+    sys.stdout.write(sys.stdin.read().upper())
+elif op == 'flood':
+    sys.stdout.write('x' * int(args[0]))
+'''
+
+
+@pytest.fixture(autouse=True)
+def stub(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    path = bin_dir / 'netstub'
+    path.write_text(STUB.format(python=sys.executable), encoding='utf-8')
+    path.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    return path
+
+
+def _alive(pid):
+    """进程是否仍在运行，僵尸进程视为已结束"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def _wait_dead(pid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while _alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def _read_pid(path):
+    deadline = time.monotonic() + 5
+    while not path.exists() or not path.read_text():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return int(path.read_text())
+
+
+def test_output_and_input():
+    result = command_runner.run(['netstub', 'echo', '以太网', '3'], timeout=10, encoding='utf-8')
+    assert (result.returncode, result.stdout, result.stderr, result.truncated) == (0, "以太网 3\n", "", False)
+    assert result.argv == ['netstub', 'echo', '以太网', '3']
+    result = command_runner.run(['netstub', 'cat'], timeout=10, input="nameserver\n", encoding='utf-8')
+    assert result.stdout == "NAMESERVER\n"
+
+
+def test_nonzero_exit_is_returned_not_raised():
+    result = command_runner.run(['netstub', 'fail', '3', '找不到网卡'], timeout=10, encoding='utf-8')
+    assert result.returncode == 3
+    assert result.stderr == "error: 找不到网卡\n"
+
+
+def test_missing_command_raises_command_error():
+    with pytest.raises(command_runner.CommandError, match="无法执行"):
+        command_runner.run(['netstub-missing'], timeout=10)
+
+
+def test_output_is_capped():
+    result = command_runner.run(['netstub', 'flood', '100000'], timeout=10, max_output=1000)
+    assert len(result.stdout) == 1000
+    assert result.truncated
+
+
+def test_timeout_kills_process_group(tmp_path):
+    """超时时连同继承了输出管道的子进程一起结束，不等待子进程退出"""
+    pid_file = tmp_path / 'child.pid'
+    start = time.monotonic()
+    with pytest.raises(command_runner.CommandTimeout, match="超过 0.5 秒未结束"):
+        command_runner.run(['netstub', 'spawn', str(pid_file)], timeout=0.5)
+    assert time.monotonic() - start < 5
+    if os.path.exists('/proc'):
+        assert _wait_dead(_read_pid(pid_file))
+
+
+def test_concurrent_fan_out(tmp_path):
+    """并发执行的总耗时接近最慢的一条命令，结果按提交顺序返回，失败的命令不影响其他命令"""
+    commands = [['netstub', 'sleep', '0.5', str(tmp_path / f'{i}.pid')] for i in range(6)]
+    commands.insert(2, ['netstub-missing'])
+    commands.append(['netstub', 'fail', '1', 'x'])
+    start = time.monotonic()
+    results = command_runner.run_concurrently(commands, timeout=10, encoding='utf-8')
+    elapsed = time.monotonic() - start
+    assert elapsed < 2.5, elapsed
+    assert [r.stdout for i, r in enumerate(results) if i not in (2, 7)] == ["done\n"] * 6
+    assert isinstance(results[2], command_runner.CommandError)
+    assert results[7].returncode == 1
+
+
+def test_concurrent_timeout_is_per_command(tmp_path):
+    results = command_runner.run_concurrently(
+        [['netstub', 'echo', 'fast'], ['netstub', 'sleep', '30', str(tmp_path / 'slow.pid')]], timeout=0.5)
+    assert results[0].stdout.strip() == 'fast'
+    assert isinstance(results[1], command_runner.CommandTimeout)
+
+
+def test_cancel_event_kills_running_command(tmp_path):
+    pid_file = tmp_path / 'sleep.pid'
+    event = threading.Event()
+    threading.Timer(0.3, event.set).start()
+    start = time.monotonic()
+    with pytest.raises(command_runner.CommandCancelled):
+        command_runner.run(['netstub', 'sleep', '30', str(pid_file)], timeout=60, cancel_event=event)
+    assert time.monotonic() - start < 5
+    if os.path.exists('/proc'):
+        assert _wait_dead(_read_pid(pid_file))
+
+
+def test_cancel_scope_applies_to_concurrent_commands(tmp_path):
+    """在cancel_scope中执行的命令使用其取消标记，已设置时立即结束"""
+    event = threading.Event()
+    threading.Timer(0.3, event.set).start()
+    start = time.monotonic()
+    with command_runner.cancel_scope(event), pytest.raises(command_runner.CommandCancelled):
+        command_runner.run_concurrently([['netstub', 'sleep', '30', str(tmp_path / f'{i}.pid')] for i in range(3)])
+    assert time.monotonic() - start < 5
+    # 离开cancel_scope后不再使用其取消标记
+    assert command_runner.run(['netstub', 'echo', 'ok'], timeout=10).stdout.strip() == 'ok'
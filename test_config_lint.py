@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置检查测试
+部门子网重叠与逐对比较的标量实现对照
+"""
+
+import random
+
+import config_lint
+import validators
+
+
+def _user(name, ip, netmask, gateway=None):
+    return {'name': name, 'ip': ip, 'netmask': netmask, 'gateway': gateway or ip.rsplit('.', 1)[0] + '.1'}
+
+
+def _overlap_pairs(issues):
+    return {frozenset(record['department'] for record in issue['records'])
+            for issue in issues if issue['type'] == 'overlapping_subnets'}
+
+
+def _scalar_overlap_pairs(config_data):
+    """逐对比较各部门子网的参考实现"""
+    subnets = []
+    for dept in config_data:
+        found = set()
+        for user in dept['users']:
+            errors = dict(validators.validate_profile(user))
+            if 'ip' in errors or 'netmask' in errors:
+                continue
+            ip, _ = validators.parse_address(user['ip'], 'ip')
+            mask, _ = validators.parse_netmask(user['netmask'])
+            if ip is not None and mask is not None:
+                found.add((ip & mask, validators.mask_to_cidr(mask)))
+        subnets.append((dept['department'], found))
+    pairs = set()
+    for i, (name_a, found_a) in enumerate(subnets):
+        for name_b, found_b in subnets[i + 1:]:
+            for net_a, prefix_a in found_a:
+                for net_b, prefix_b in found_b:
+                    shorter = min(prefix_a, prefix_b)
+                    mask = validators.cidr_to_mask(shorter)
+                    if net_a & mask == net_b & mask:
+                        pairs.add(frozenset((name_a, name_b)))
+    return pairs
+
+
+def test_same_subnet_in_three_departments():
+    """三个部门使用同一子网时报告全部三对，而不只是排序后相邻的两对"""
+    config = [{'department': name, 'users': [_user(name, f'10.0.0.{i + 10}', '255.255.255.0')]}
+              for i, name in enumerate(('A', 'B', 'C'))]
+    assert _overlap_pairs(config_lint.lint_config(config)) == {
+        frozenset('AB'), frozenset('AC'), frozenset('BC')}
+
+
+def test_nested_prefix_overlapping_three_departments():
+    """较长前缀落在三个部门共同使用的较短前缀内"""
+    config = [{'department': name, 'users': [_user(name, f'10.0.{i}.10', '255.255.0.0', '10.0.0.1')]}
+              for i, name in enumerate(('A', 'B', 'C'))]
+    config.append({'department': 'D', 'users': [_user('D', '10.0.5.10', '255.255.255.0')]})
+    pairs = _overlap_pairs(config_lint.lint_config(config))
+    assert {frozenset('AD'), frozenset('BD'), frozenset('CD')} <= pairs
+    assert pairs == _scalar_overlap_pairs(config)
+
+
+def test_overlapping_subnets_match_scalar_implementation():
+    # 整数形式的子网掩码无效，与validators一样不参与比较
+    masks = ['255.255.0.0', '255.255.252.0', '255.255.255.0', '255.255.255.128', '255.255.255.252', '16', '23', 24]
+    rng = random.Random(20261016)
+    for _ in range(200):
+        config = []
+        for d in range(rng.randint(2, 7)):
+            users = [_user(f'u{d}-{u}', f'10.{rng.randint(0, 1)}.{rng.randint(0, 7)}.{rng.randint(1, 254)}',
+                           rng.choice(masks)) for u in range(rng.randint(0, 4))]
+            config.append({'department': f'部门{d}', 'users': users})
+        assert _overlap_pairs(config_lint.lint_config(config)) == _scalar_overlap_pairs(config)
+
+
+def test_duplicate_ip_and_mac():
+    config = [{'department': 'A', 'users': [dict(_user('a', '10.0.0.5', '24'), mac='02AABBCCDDEE'),
+                                            dict(_user('b', '10.0.0.5', '24'), mac='02-aa-bb-cc-dd-ee')]}]
+    kinds = [issue['type'] for issue in config_lint.lint_config(config)]
+    assert 'duplicate_ip' in kinds and 'duplicate_mac' in kinds
+
+
+def test_non_string_netmask_is_invalid():
+    """整数形式的子网掩码与validators一样报告为无效，而不是按CIDR表示法接受"""
+    config = [{'department': 'A', 'users': [_user('a', '10.0.0.5', 24), _user('b', '10.0.1.5', '24')]},
+              {'department': 'B', 'users': [_user('c', '10.0.0.6', '24')]}]
+    issues = config_lint.lint_config(config)
+    invalid = [issue for issue in issues if issue['type'] == 'invalid_netmask']
+    assert [issue['records'][0]['name'] for issue in invalid] == ['a']
+    assert "应为字符串" in invalid[0]['message']
+    assert _overlap_pairs(issues) == _scalar_overlap_pairs(config) == set()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置加载测试
+检查截断或损坏的预解析缓存按缓存缺失处理、改为解析源文件，以及没有读完时关闭内存映射
+"""
+
+import json
+import os
+import struct
+
+import config_loader
+
+CONFIG = [{'department': f'部门{d}', 'users': [{'name': f'用户{d}', 'ip': f'10.0.{d}.2'}]} for d in range(3)]
+
+
+def _cached_config(tmp_path):
+    """写入配置文件并生成缓存，返回(配置文件路径, 缓存文件路径)"""
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(CONFIG, f, ensure_ascii=False)
+    assert config_loader.load_config_file(path) == CONFIG
+    return path, config_loader.cache_path_for(path)
+
+
+def _offsets(cache_path):
+    with open(cache_path, 'rb') as f:
+        data = f.read()
+    count = config_loader._HEADER.unpack_from(data, 0)[-1]
+    return struct.unpack_from(f'<{count + 1}Q', data, config_loader._HEADER.size)
+
+
+def test_truncated_cache_is_a_miss(tmp_path):
+    path, cache_path = _cached_config(tmp_path)
+    with open(cache_path, 'r+b') as f:
+        f.truncate(os.path.getsize(cache_path) - 5)
+    assert config_loader.read_cache(path) is None
+    assert not os.path.exists(cache_path)
+    assert config_loader.load_config_file(path) == CONFIG
+    # 重新写入的缓存可以正常读取
+    with config_loader.read_cache(path) as cached:
+        assert list(cached) == CONFIG
+
+
+def test_corrupted_department_falls_back_to_source(tmp_path, capsys):
+    """偏移表有效但某个部门的数据损坏时，已经产出的部门不重复产出"""
+    path, cache_path = _cached_config(tmp_path)
+    offsets = _offsets(cache_path)
+    with open(cache_path, 'r+b') as f:
+        f.seek(offsets[1])
+        f.write(b'\xff' * (offsets[2] - offsets[1]))
+    assert config_loader.load_config_file(path) == CONFIG
+    assert "配置缓存已损坏" in capsys.readouterr().out
+    with config_loader.read_cache(path) as cached:
+        assert list(cached) == CONFIG
+
+
+def test_unfinished_iteration_closes_mapping(tmp_path, monkeypatch):
+    path, _ = _cached_config(tmp_path)
+    opened = []
+    original = config_loader.read_cache
+
+    def read_cache(*args):
+        opened.append(original(*args))
+        return opened[-1]
+
+    monkeypatch.setattr(config_loader, 'read_cache', read_cache)
+    departments = config_loader.iter_departments(path)
+    assert next(departments) == CONFIG[0]
+    assert not opened[0].mm.closed
+    departments.close()
+    assert opened[0].mm.closed
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重新加载配置测试
+在工作线程中运行ConfigReloadWorker，检查JSON配置得到正确的差异，配置库文件被替换后
+不比较差异而由界面整体替换配置树
+"""
+
+import json
+import threading
+import types
+
+from config_reload_worker import ConfigReloadWorker
+from config_tree_model import ConfigTreeModel
+from network_config_tool import NetworkConfigTool
+from profile_db import ProfileDatabase, import_json
+from profile_records import ProfileTable
+
+OLD = [{'department': '信息中心', 'users': [{'name': '张三', 'ip': '10.0.0.2'}, {'name': '李四', 'ip': '10.0.0.3'}]},
+       {'department': '财务部', 'users': [{'name': '王五', 'ip': '10.0.1.2'}]}]
+NEW = [{'department': '信息中心', 'users': [{'name': '张三', 'ip': '10.0.0.20'}, {'name': '李四', 'ip': '10.0.0.3'},
+                                         {'name': '赵六', 'ip': '10.0.0.4'}]},
+       {'department': '财务部', 'users': [{'name': '王五', 'ip': '10.0.1.2'}]}]
+
+
+def _write_json(path, config):
+    path.write_text(json.dumps(config, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def _reload_in_thread(config_file, current):
+    """与界面一样在没有使用过当前配置的线程中重新加载"""
+    results = []
+
+    def run():
+        worker = ConfigReloadWorker(config_file, current)
+        worker.finished.connect(lambda table, diff: results.append((table, diff)))
+        worker.failed.connect(lambda error: results.append(error))
+        worker.run()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(30)
+    assert len(results) == 1
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0]
+
+
+def test_json_reload_diff(tmp_path):
+    path = tmp_path / 'config.json'
+    current = ProfileTable.from_departments(OLD)
+    table, diff = _reload_in_thread(_write_json(path, NEW), current)
+    assert len(table) == 4
+    assert [(d.removed, d.inserted, d.changed) for d in diff.kept] == [([], [2], [0]), ([], [], [])]
+
+
+def test_replaced_database_is_reloaded_whole(tmp_path):
+    """配置库文件被替换后，工作线程中读不到原来的内容，不能得到空的差异"""
+    db_path = str(tmp_path / 'config.db')
+    import_json(_write_json(tmp_path / 'old.json', OLD), db_path)
+    current = ProfileDatabase(db_path)
+    assert current.record(0).ip == '10.0.0.2'
+    import_json(_write_json(tmp_path / 'new.json', NEW), db_path)
+
+    table, diff = _reload_in_thread(db_path, current)
+    assert diff is None
+    assert len(table) == 4 and table.record(0).ip == '10.0.0.20'
+
+    # 界面用新的配置库重新创建配置树
+    model = ConfigTreeModel(current)
+    emitted = []
+    window = types.SimpleNamespace(profiles=current, tree_model=model,
+                                   index_requested=types.SimpleNamespace(emit=emitted.append))
+    window.populate_tree = lambda: NetworkConfigTool.populate_tree(window)
+    NetworkConfigTool.on_config_reloaded(window, table, diff)
+    assert window.profiles is table and emitted == [table]
+    assert model.table is table
+    assert model.rowCount() == 2
+    assert model.table.department_rows(0) == range(0, 3)
+    current.close()
+    table.close()
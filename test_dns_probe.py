@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DNS延迟检测测试
+使用本机上的StandInResolver和没有监听的UDP端口，检查超时、丢包、迟到的应答、
+并发测量、缓存以及首选DNS无应答时改用备用DNS的行为
+"""
+
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+import dns_probe
+from dns_probe import ProbeResult, RttCache, StandInResolver
+
+TIMEOUT = 0.2
+
+
+def _closed_port():
+    """一个当前没有监听的本机UDP端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _probe(port, server='127.0.0.1', attempts=3):
+    return asyncio.run(dns_probe.probe_server(server, attempts=attempts, timeout=TIMEOUT, port=port))
+
+
+def test_fast_resolver():
+    with StandInResolver() as resolver:
+        result = _probe(resolver.address[1])
+    assert (len(result.rtts), result.failures, result.error) == (3, 0, None)
+    assert result.reachable and result.rtt < TIMEOUT
+    assert resolver.queries == 3
+
+
+def test_dropped_query_counts_as_failure():
+    with StandInResolver(drop=1) as resolver:
+        result = _probe(resolver.address[1])
+    assert (len(result.rtts), result.failures) == (2, 1)
+    assert "丢失 1 次" in result.describe()
+
+
+def test_slow_resolver_times_out_and_late_answers_are_ignored():
+    """应答晚于超时时间时每次查询都算失败，之后到达的旧应答不会被当作新查询的应答"""
+    with StandInResolver(delay=TIMEOUT * 1.5) as resolver:
+        start = time.monotonic()
+        result = _probe(resolver.address[1])
+        elapsed = time.monotonic() - start
+    assert not result.reachable and result.rtt is None
+    assert result.failures == 3
+    assert elapsed < 3 * TIMEOUT + 1.0
+    assert result.describe().endswith("无应答")
+
+
+def test_unreachable_port_times_out():
+    start = time.monotonic()
+    result = _probe(_closed_port())
+    assert (result.rtts, result.failures) == ([], 3)
+    assert time.monotonic() - start < 3 * TIMEOUT + 1.0
+
+
+def test_probe_all_runs_concurrently():
+    """同时测量时总耗时接近单台服务器的耗时，结果按输入顺序返回"""
+    with StandInResolver() as fast:
+        port = fast.address[1]
+        servers = ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+        with StandInResolver(delay=0.05, host='127.0.0.2', port=port), \
+                StandInResolver(drop=1000, host='127.0.0.3', port=port):
+            start = time.monotonic()
+            results = asyncio.run(dns_probe.probe_all(servers, attempts=2, timeout=TIMEOUT, port=port))
+            elapsed = time.monotonic() - start
+    assert [result.server for result in results] == servers
+    assert [result.reachable for result in results] == [True, True, False]
+    assert elapsed < 2 * TIMEOUT + 0.5
+
+
+def test_measure_uses_cache_until_expired():
+    cache = RttCache(ttl=60)
+    with StandInResolver() as resolver:
+        port = resolver.address[1]
+        first = dns_probe.measure([' 127.0.0.1 ', '', '127.0.0.1'], attempts=1, timeout=TIMEOUT, port=port,
+                                  cache=cache)
+        assert list(first) == ['127.0.0.1']
+        assert resolver.queries == 1
+        # 未过期的结果不再发送查询，refresh时重新测量
+        again = dns_probe.measure(['127.0.0.1'], attempts=1, timeout=TIMEOUT, port=port, cache=cache)
+        assert again['127.0.0.1'] is first['127.0.0.1'] and resolver.queries == 1
+        dns_probe.measure(['127.0.0.1'], attempts=1, timeout=TIMEOUT, port=port, cache=cache, refresh=True)
+        assert resolver.queries == 2
+        # 缓存按端口区分，过期后重新测量
+        assert cache.get('127.0.0.1') is None
+        cache.get('127.0.0.1', port).measured_at -= 61
+        dns_probe.measure(['127.0.0.1'], attempts=1, timeout=TIMEOUT, port=port, cache=cache)
+        assert resolver.queries == 3
+
+
+def test_unreachable_primary_falls_back_to_backup():
+    port = _closed_port()
+    with StandInResolver(host='127.0.0.2', port=port):
+        results = dns_probe.measure(['127.0.0.1', '127.0.0.2'], attempts=1, timeout=TIMEOUT, port=port,
+                                    cache=RttCache())
+    assert not results['127.0.0.1'].reachable and results['127.0.0.2'].reachable
+    assert dns_probe.rank('127.0.0.1', '127.0.0.2', results) == ('127.0.0.2', '127.0.0.1')
+    assert dns_probe.warnings('127.0.0.1', '127.0.0.2', results) == ["首选DNS 127.0.0.1 无应答"]
+
+
+@pytest.mark.parametrize('primary, backup, swapped', [
+    # 备用DNS明显更快时交换
+    ([0.10], [0.02], True),
+    # 差距在测量误差范围内时保持原顺序
+    ([0.10], [0.09], False),
+    # 两台都无应答或备用DNS无应答时保持原顺序
+    ([], [], False),
+    ([0.10], [], False),
+])
+def test_rank(primary, backup, swapped):
+    results = {'10.0.0.1': ProbeResult('10.0.0.1', primary, 3 - len(primary)),
+               '10.0.0.2': ProbeResult('10.0.0.2', backup, 3 - len(backup))}
+    expected = ('10.0.0.2', '10.0.0.1') if swapped else ('10.0.0.1', '10.0.0.2')
+    assert dns_probe.rank('10.0.0.1', '10.0.0.2', results) == expected
+    # 没有备用DNS时不交换
+    assert dns_probe.rank('10.0.0.1', '', results) == ('10.0.0.1', '')
+
+
+def test_check_response():
+    query = dns_probe.build_query('example.com', 0x1234)
+    answer = dns_probe._build_answer(query)
+    assert dns_probe.check_response(answer, query)
+    # 查询ID不同、不是应答或服务器返回SERVFAIL时视为无效应答
+    assert not dns_probe.check_response(dns_probe._build_answer(dns_probe.build_query('example.com', 1)), query)
+    assert not dns_probe.check_response(query, query)
+    servfail = answer[:2] + struct.pack('!H', 0x8182) + answer[4:]
+    assert not dns_probe.check_response(servfail, query)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网卡链路状态测试
+在伪造的sysfs目录中设置flags和operstate，检查启用等待只看管理状态，没有载波的网卡不会等到超时
+"""
+
+import time
+
+import pytest
+
+import link_state
+import network_apply
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    card_dir = tmp_path / 'eth0'
+    card_dir.mkdir()
+
+    def set_state(flags, operstate):
+        (card_dir / 'flags').write_text(flags + '\n')
+        (card_dir / 'operstate').write_text(operstate + '\n')
+    set_state('0x1003', 'up')
+    return str(tmp_path), set_state
+
+
+@pytest.mark.parametrize('flags, operstate, admin, link', [
+    ('0x1003', 'up', True, True),
+    # 已启用但没有连接网线
+    ('0x1003', 'down', True, False),
+    ('0x1003', 'unknown', True, True),
+    ('0x1002', 'down', False, False),
+    ('xyz', 'up', None, True),
+])
+def test_admin_and_link_state(sysfs, flags, operstate, admin, link):
+    root, set_state = sysfs
+    set_state(flags, operstate)
+    assert link_state.link_up('eth0', 'Linux', root, admin=True) is admin
+    assert link_state.link_up('eth0', 'Linux', root) is link
+    assert link_state.link_up('eth1', 'Linux', root, admin=True) is None
+
+
+def test_enable_wait_ignores_missing_carrier(sysfs, capsys, monkeypatch):
+    root, set_state = sysfs
+    set_state('0x1003', 'down')
+    monkeypatch.setattr(network_apply, 'LINK_UP_TIMEOUT', 5.0)
+    start = time.monotonic()
+    network_apply._wait_linux_link('eth0', True, root)
+    assert time.monotonic() - start < 1.0
+    output = capsys.readouterr().out
+    assert "尚未连接" in output and "超时" not in output
+
+
+def test_disable_wait_uses_admin_state(sysfs, capsys, monkeypatch):
+    root, set_state = sysfs
+    monkeypatch.setattr(network_apply, 'LINK_DOWN_TIMEOUT', 0.2)
+    # 没有载波但仍处于启用状态时不算已禁用
+    set_state('0x1003', 'down')
+    network_apply._wait_linux_link('eth0', False, root)
+    assert "等待网卡禁用超时" in capsys.readouterr().out
+    set_state('0x1002', 'down')
+    network_apply._wait_linux_link('eth0', False, root)
+    assert capsys.readouterr().out == ""
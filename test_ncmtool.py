@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行工具测试
+检查apply对无效配置返回EXIT_INVALID和JSON格式的错误，预览与实际应用的退出码一致
+"""
+
+import json
+
+import pytest
+
+import ncmtool
+
+USER = {'name': '张三', 'ip': '192.168.107.49', 'netmask': '255.255.255.0', 'gateway': '192.168.107.1',
+        'dns': '192.168.100.40', 's_dns': '8.8.8.8', 'mac': ''}
+
+
+@pytest.fixture
+def config(tmp_path):
+    def write(**user):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps([{'department': '信息中心', 'users': [dict(USER, **user)]}], ensure_ascii=False),
+                        encoding='utf-8')
+        return str(path)
+    return write
+
+
+@pytest.mark.parametrize('user, card, error', [
+    ({'dns': 'bad dns'}, 'eth0', "首选DNS格式不正确: 'bad dns'"),
+    ({'s_dns': '8.8.8.8\nnameserver 6.6.6.6'}, 'eth0', "备用DNS格式不正确"),
+    ({'mac': '00:50:56'}, 'eth0', "MAC地址格式不正确"),
+    ({}, 'eth0\nlo', "网卡名称包含不允许的字符"),
+])
+@pytest.mark.parametrize('dry_run', [False, True])
+def test_apply_rejects_invalid_fields(config, capsys, user, card, error, dry_run):
+    argv = ['--json', '--config', config(**user), 'apply', '--department', '信息中心', '--user', '张三',
+            '--card', card, '--force', '--no-helper']
+    if dry_run:
+        argv.append('--dry-run')
+    assert ncmtool.main(argv) == ncmtool.EXIT_INVALID
+    result = json.loads(capsys.readouterr().out)
+    assert result['ok'] is False and result['exit_code'] == ncmtool.EXIT_INVALID
+    assert error in result['error']
+
+
+def test_validate_profile_errors_are_invalid(config, capsys):
+    argv = ['--json', '--config', config(gateway='10.0.0.1'), 'apply', '--department', '信息中心',
+            '--user', '张三', '--card', 'eth0', '--no-helper']
+    assert ncmtool.main(argv) == ncmtool.EXIT_INVALID
+    assert "子网内" in json.loads(capsys.readouterr().out)['error']
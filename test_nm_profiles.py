@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NetworkManager连接配置测试
+生成的keyfile与testdata/nm中保存的文件逐字节比较；修改生成格式后用
+NCMTOOL_UPDATE_GOLDEN=1 python -m pytest test_nm_profiles.py 重新生成并检查差异
+"""
+
+import os
+import stat
+
+import pytest
+
+import nm_profiles
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'nm')
+
+# 用例名: (部门, 用户配置, 网卡)
+CASES = {
+    'basic': ('信息中心', {'name': '张三', 'ip': '192.168.107.49', 'netmask': '255.255.255.0',
+                       'gateway': '192.168.107.1', 'dns': '192.168.100.40', 's_dns': '8.8.8.8',
+                       'mac': '00-50-56-C0-00-08'}, 'enp0s31f6'),
+    # CIDR掩码，没有MAC，首选和备用DNS相同时只写一次
+    'cidr_duplicate_dns': ('财务部', {'name': '李四', 'ip': '10.1.2.3', 'netmask': '16', 'gateway': '10.1.0.1',
+                                   'dns': '10.1.0.53', 's_dns': ' 10.1.0.53 ', 'mac': ''}, 'eth0'),
+    # 没有DNS，MAC为连续的小写十六进制
+    'no_dns': ('实验室', {'name': 'lab-01', 'ip': '172.16.5.20', 'netmask': '255.255.255.128',
+                       'gateway': '172.16.5.1', 'mac': '0050569a0b0c'}, 'eth1'),
+    # 部门、姓名和网卡中的特殊字符按keyfile格式转义，不会写出新的行或节
+    'escaped_names': (' 行政部\n[ipv4]', {'name': 'a\\b\tc\rmethod=auto', 'ip': '192.168.1.10',
+                                          'netmask': '24', 'gateway': '192.168.1.1', 'dns': '192.168.1.1'},
+                      'eth0\nautoconnect=true'),
+}
+
+
+def _golden_path(case):
+    return os.path.join(GOLDEN_DIR, f'{case}.nmconnection')
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_keyfile_matches_golden(case):
+    department, user, card = CASES[case]
+    text = nm_profiles.render_keyfile(department, user, card)
+    path = _golden_path(case)
+    if os.environ.get('NCMTOOL_UPDATE_GOLDEN'):
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+    with open(path, encoding='utf-8', newline='') as f:
+        assert text == f.read()
+
+
+def test_escaped_values_stay_in_their_lines():
+    department, user, card = CASES['escaped_names']
+    lines = nm_profiles.render_keyfile(department, user, card).split('\n')
+    assert [line for line in lines if line.startswith('[')] == ['[connection]', '[ethernet]', '[ipv4]', '[ipv6]']
+    assert [line for line in lines if line.startswith(('autoconnect=', 'method='))] == [
+        'autoconnect=false', 'method=manual', 'method=auto']
+
+
+@pytest.mark.parametrize('field, value, error', [
+    ('dns', '192.168.1.1\n[ipv4]\nmethod=auto', "首选DNS格式不正确"),
+    ('s_dns', '8.8.8.8;1.1.1.1', "备用DNS格式不正确"),
+    ('s_dns', 53, "备用DNS格式不正确"),
+    ('mac', '00:50:56:C0:00:08\n[802-1x]', "MAC地址格式不正确"),
+    ('mac', '00:50:56:C0:00', "MAC地址格式不正确"),
+    ('gateway', '192.168.2.1', "不在 192.168.1.0/24 子网内"),
+])
+def test_invalid_values_are_rejected(field, value, error):
+    user = {'name': '王五', 'ip': '192.168.1.10', 'netmask': '24', 'gateway': '192.168.1.1', field: value}
+    with pytest.raises(ValueError, match=error):
+        nm_profiles.render_keyfile('信息中心', user, 'eth0')
+
+
+def test_compile_profiles_writes_golden_files_incrementally(tmp_path):
+    directory = str(tmp_path)
+    departments = [{'department': '信息中心', 'users': [CASES['basic'][1],
+                                                    {'name': '坏配置', 'ip': '192.168.107.50', 'netmask': '24',
+                                                     'gateway': '192.168.107.1', 'dns': '1.1.1.1\nmethod=auto'}]}]
+    result = nm_profiles.compile_profiles(departments, 'enp0s31f6', directory)
+    assert [os.path.basename(path) for path in result.written] == [
+        nm_profiles.connection_filename('信息中心', '张三', 'enp0s31f6')]
+    assert [(dept, name) for dept, name, _ in result.skipped] == [('信息中心', '坏配置')]
+    path = result.written[0]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    with open(path, encoding='utf-8') as f, open(_golden_path('basic'), encoding='utf-8') as golden:
+        assert f.read() == golden.read()
+
+    # 内容未变化时不重新生成；删除的用户对应的文件被删除
+    again = nm_profiles.compile_profiles(departments, 'enp0s31f6', directory)
+    assert (again.written, again.unchanged) == ([], 1)
+    removed = nm_profiles.compile_profiles([{'department': '信息中心', 'users': []}], 'enp0s31f6', directory)
+    assert removed.removed == [path] and not os.path.exists(path)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rtnetlink测试
+通过FakeSocket执行地址、路由和网卡状态修改，并检查错误应答的解码
+"""
+
+import errno
+import socket
+import struct
+
+import pytest
+
+import rtnetlink
+from rtnetlink import FakeSocket, Link, NetlinkError, RtNetlink
+
+
+def _netlink():
+    sock = FakeSocket(
+        links=[Link(1, 'lo', rtnetlink.IFF_UP, '00:00:00:00:00:00', 'unknown'),
+               Link(2, 'eth0', rtnetlink.IFF_UP, '52:54:00:12:34:56', 'up')],
+        addresses=[(1, '127.0.0.1', 8), (2, '192.168.1.10', 24)],
+        gateways=[(2, '192.168.1.1')])
+    return RtNetlink(sock), sock
+
+
+def test_dump_links_addresses_and_routes():
+    netlink, _ = _netlink()
+    eth0 = netlink.get_link('eth0')
+    assert (eth0.index, eth0.mac, eth0.operstate, eth0.up) == (2, '52:54:00:12:34:56', 'up', True)
+    assert netlink.get_link('eth9') is None
+    assert netlink.list_addresses(2) == [(2, '192.168.1.10', 24)]
+    assert netlink.default_gateways() == [(2, '192.168.1.1')]
+
+
+def test_replace_and_delete_address():
+    netlink, sock = _netlink()
+    netlink.batch().add_address(2, '10.0.0.5', 16).delete_address(2, '192.168.1.10', 24).execute()
+    assert netlink.list_addresses(2) == [(2, '10.0.0.5', 16)]
+    # 已存在的地址替换前缀长度
+    netlink.batch().add_address(2, '10.0.0.5', 24).execute()
+    assert netlink.list_addresses(2) == [(2, '10.0.0.5', 24)]
+
+    msg_type, flags, payload = sock.sent[0]
+    assert msg_type == rtnetlink.RTM_NEWADDR
+    assert flags == (rtnetlink.NLM_F_REQUEST | rtnetlink.NLM_F_ACK
+                     | rtnetlink.NLM_F_CREATE | rtnetlink.NLM_F_REPLACE)
+    attrs = rtnetlink.parse_attrs(payload, rtnetlink._IFADDRMSG.size)
+    assert socket.inet_ntoa(attrs[rtnetlink.IFA_BROADCAST]) == '10.0.255.255'
+
+
+def test_replace_default_route():
+    netlink, sock = _netlink()
+    netlink.batch().replace_default_route(2, '192.168.1.254').execute()
+    assert netlink.default_gateways(2) == [(2, '192.168.1.254')]
+    assert rtnetlink.parse_route(sock.sent[0][2]) == (2, '192.168.1.254', 0, rtnetlink.RT_TABLE_MAIN)
+
+
+def test_set_link_down_mac_and_up():
+    netlink, sock = _netlink()
+    (netlink.batch()
+     .set_link_up(2, False)
+     .set_hwaddr(2, '02-11-22-33-44-55')
+     .set_link_up(2)
+     .execute())
+    eth0 = netlink.get_link('eth0')
+    assert (eth0.mac, eth0.up, eth0.operstate) == ('02:11:22:33:44:55', True, 'up')
+    # 禁用网卡时删除了经过该网卡的默认路由
+    assert netlink.default_gateways() == []
+    # 合并为一次send发送
+    assert [msg_type for msg_type, _, _ in sock.sent[:3]] == [rtnetlink.RTM_NEWLINK] * 3
+
+
+def test_error_reply_raises_first_error_after_all_replies():
+    netlink, _ = _netlink()
+    batch = (netlink.batch()
+             .delete_address(2, '172.16.0.1', 24)
+             .set_hwaddr(2, '021122334455')
+             .add_address(2, '10.0.0.5', 24))
+    with pytest.raises(NetlinkError) as info:
+        batch.execute()
+    assert info.value.errno == errno.EADDRNOTAVAIL
+    # 出错后其余请求仍已执行
+    assert (2, '10.0.0.5', 24) in netlink.list_addresses(2)
+    assert netlink.get_link('eth0').mac == '52:54:00:12:34:56'
+
+
+def test_unknown_link_returns_enodev():
+    netlink, _ = _netlink()
+    with pytest.raises(NetlinkError) as info:
+        netlink.batch().set_link_up(9).execute()
+    assert info.value.errno == errno.ENODEV
+
+
+class _ScriptedSocket:
+    """按预先给定的数据逐次返回recv结果的套接字"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sent = b''
+
+    def send(self, data):
+        self.sent += data
+        return len(data)
+
+    def recv(self, bufsize):
+        return self.chunks.pop(0)
+
+
+def _error_message(seq, code):
+    payload = rtnetlink._NLMSGERR.pack(-code) + rtnetlink._NLMSGHDR.pack(0, 0, 0, seq, 0)
+    return rtnetlink.pack_message(rtnetlink.NLMSG_ERROR, 0, seq, payload)
+
+
+def test_decode_ack_and_error_across_recv_calls():
+    """应答分多次到达，忽略其他请求的序号，错误码按errno解码"""
+    sock = _ScriptedSocket([
+        _error_message(99, errno.EPERM) + _error_message(1, 0),
+        _error_message(2, errno.EEXIST),
+    ])
+    netlink = RtNetlink(sock)
+    with pytest.raises(NetlinkError) as info:
+        netlink.transact([(rtnetlink.RTM_NEWLINK, rtnetlink.NLM_F_REQUEST | rtnetlink.NLM_F_ACK, b''),
+                          (rtnetlink.RTM_NEWROUTE, rtnetlink.NLM_F_REQUEST | rtnetlink.NLM_F_ACK, b'')])
+    assert info.value.errno == errno.EEXIST
+    assert sock.chunks == []
+    assert [seq for _, _, seq, _ in rtnetlink.iter_messages(sock.sent)] == [1, 2]
+
+
+def test_ack_only_returns_empty_results():
+    sock = _ScriptedSocket([_error_message(1, 0)])
+    assert RtNetlink(sock).transact([(rtnetlink.RTM_NEWLINK, rtnetlink.NLM_F_REQUEST | rtnetlink.NLM_F_ACK, b'')]) == [[]]
+
+
+def test_parse_attrs_alignment_and_nested_flag():
+    data = (rtnetlink.pack_attr(rtnetlink.IFLA_IFNAME, b'eth0\0')
+            + struct.pack('=HH', 8, rtnetlink.IFLA_OPERSTATE | 0x8000) + b'\x06\0\0\0')
+    assert rtnetlink.parse_attrs(data) == {rtnetlink.IFLA_IFNAME: b'eth0\0', rtnetlink.IFLA_OPERSTATE: b'\x06\0\0\0'}
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快照恢复测试
+用给定的网卡当前配置代替实际读取，检查Windows和macOS上按快照恢复时生成的命令：
+通过DHCP获取的地址和DNS重新启用DHCP，静态DNS按原来的完整列表恢复
+"""
+
+import pytest
+
+import command_runner
+import interface_state
+import snapshots
+from interface_state import InterfaceState
+from snapshots import Snapshot
+
+STATIC = InterfaceState(addresses=[('192.168.107.49', '255.255.255.0')], gateways=['192.168.107.1'],
+                        dns=['192.168.100.40'], mac='00-50-56-C0-00-08', dhcp=False, dhcp_dns=False)
+
+
+def _restore_lines(monkeypatch, snapshot, state):
+    monkeypatch.setattr(snapshots, 'read_interface_state', lambda card, system: state)
+    steps = snapshots.restore_steps(snapshot)
+    assert all(not step.cancellable for step in steps)
+    return [line for step in steps for line in step.action.args[0].lines]
+
+
+def test_windows_dhcp_snapshot_restores_dhcp(monkeypatch):
+    snapshot = Snapshot('以太网', 'Windows', addresses=[('10.0.0.23', '255.255.255.0')], gateways=['10.0.0.1'],
+                        dns=['10.0.0.1'], mac='00-50-56-C0-00-08', up=True, dhcp=True, dhcp_dns=True)
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == [
+        'interface set interface name="以太网" admin=enabled',
+        'interface ip set address name="以太网" source=dhcp',
+        'interface ip set dnsservers name="以太网" source=dhcp',
+    ]
+
+
+def test_windows_static_snapshot_restores_all_dns(monkeypatch):
+    snapshot = Snapshot('以太网', 'Windows', addresses=[('192.168.107.49', '255.255.255.0')],
+                        gateways=['192.168.107.1'], dns=['10.0.0.53', '10.0.0.54', '8.8.8.8'],
+                        mac='00-50-56-C0-00-08', dhcp=False, dhcp_dns=False)
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == [
+        'interface ip set dnsservers name="以太网" static 10.0.0.53 primary',
+        'interface ip add dnsservers name="以太网" 10.0.0.54 index=2',
+        'interface ip add dnsservers name="以太网" 8.8.8.8 index=3',
+    ]
+    # 原来没有DNS时清除应用配置时设置的DNS
+    snapshot.dns = []
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == ['interface ip set dnsservers name="以太网" static none']
+
+
+def test_windows_static_snapshot_leaves_dhcp(monkeypatch):
+    """当前通过DHCP获取到相同的地址时同样改回静态地址"""
+    snapshot = Snapshot('以太网', 'Windows', addresses=[('192.168.107.49', '255.255.255.0')],
+                        gateways=['192.168.107.1'], dns=['192.168.100.40'], dhcp=False, dhcp_dns=False)
+    state = InterfaceState(addresses=STATIC.addresses, gateways=STATIC.gateways, dns=STATIC.dns,
+                           dhcp=True, dhcp_dns=True)
+    assert _restore_lines(monkeypatch, snapshot, state) == [
+        'interface ip set address name="以太网" static 192.168.107.49 255.255.255.0 192.168.107.1',
+        'interface ip set dnsservers name="以太网" static 192.168.100.40 primary',
+    ]
+
+
+def test_macos_dhcp_snapshot_restores_dhcp(monkeypatch):
+    snapshot = Snapshot("Bob's Wi-Fi", 'Darwin', addresses=[('10.0.0.23', '255.255.255.0')],
+                        gateways=['10.0.0.1'], dns=[], dhcp=True, dhcp_dns=True)
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == [
+        "networksetup -setdhcp 'Bob'\"'\"'s Wi-Fi'",
+        "networksetup -setdnsservers 'Bob'\"'\"'s Wi-Fi' Empty",
+    ]
+    # 已经通过DHCP获取地址和DNS时无需恢复
+    state = InterfaceState(addresses=[('10.0.0.23', '255.255.255.0')], gateways=['10.0.0.1'], dns=[],
+                           dhcp=True, dhcp_dns=True)
+    assert _restore_lines(monkeypatch, snapshot, state) == []
+
+
+def test_macos_manual_dns_with_dhcp_address(monkeypatch):
+    snapshot = Snapshot('Wi-Fi', 'Darwin', addresses=[('10.0.0.23', '255.255.255.0')], gateways=['10.0.0.1'],
+                        dns=['1.1.1.1', '9.9.9.9'], dhcp=True, dhcp_dns=False)
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == [
+        "networksetup -setdhcp Wi-Fi",
+        "networksetup -setdnsservers Wi-Fi 1.1.1.1 9.9.9.9",
+    ]
+
+
+def test_old_snapshot_without_dhcp_fields(monkeypatch):
+    """旧版本保存的快照按静态配置恢复，没有DNS时不修改DNS"""
+    record = {'card': 'Wi-Fi', 'system': 'Darwin', 'addresses': [['192.168.1.20', '255.255.255.0']],
+              'gateways': ['192.168.1.1'], 'dns': [], 'mac': None, 'up': True, 'resolv_conf': None,
+              'taken_at': 0}
+    snapshot = Snapshot.from_dict(record)
+    assert (snapshot.dhcp, snapshot.dhcp_dns) == (None, None)
+    assert _restore_lines(monkeypatch, snapshot, STATIC) == [
+        "networksetup -setmanual Wi-Fi 192.168.1.20 255.255.255.0 192.168.1.1"]
+
+
+def test_snapshot_ring_keeps_dhcp(tmp_path):
+    ring = snapshots.SnapshotRing(str(tmp_path / 'snapshots.json'))
+    ring.push(Snapshot('以太网', 'Windows', addresses=[], dns=['10.0.0.1'], dhcp=True, dhcp_dns=True))
+    latest = ring.latest('以太网')
+    assert (latest.dhcp, latest.dhcp_dns, latest.dns) == (True, True, ['10.0.0.1'])
+    assert 'DHCP' in latest.describe()
+
+
+@pytest.mark.parametrize('info, dns_output, dhcp, dhcp_dns, dns', [
+    ("DHCP Configuration\nIP address: 10.0.0.23\nSubnet mask: 255.255.255.0\nRouter: 10.0.0.1\n",
+     "There aren't any DNS Servers set on Wi-Fi.\n", True, True, []),
+    ("Manual Configuration\nIP address: 10.0.0.23\nSubnet mask: 255.255.255.0\nRouter: 10.0.0.1\n",
+     "1.1.1.1\n9.9.9.9\n", False, False, ['1.1.1.1', '9.9.9.9']),
+])
+def test_read_macos_state_records_dhcp(monkeypatch, info, dns_output, dhcp, dhcp_dns, dns):
+    results = [command_runner.CommandResult(['networksetup'], 0, info, '', False, 0.1),
+               command_runner.CommandResult(['networksetup'], 0, dns_output, '', False, 0.1)]
+    monkeypatch.setattr(command_runner, 'run_concurrently', lambda commands, timeout: results)
+    state = interface_state.read_macos_state('Wi-Fi')
+    assert (state.dhcp, state.dhcp_dns, state.dns) == (dhcp, dhcp_dns, dns)
+    assert state.addresses == [('10.0.0.23', '255.255.255.0')]
+
+
+def test_windows_restore_clears_mac_override(monkeypatch):
+    """原来没有设置网络地址时清除该属性，而不是把当前地址写回为固定地址"""
+    snapshot = Snapshot('以太网', 'Windows', addresses=[('192.168.107.49', '255.255.255.0')],
+                        gateways=['192.168.107.1'], dns=['192.168.100.40'], mac='00-50-56-C0-00-01',
+                        dhcp=False, dhcp_dns=False, mac_override='')
+    state = InterfaceState(addresses=STATIC.addresses, gateways=STATIC.gateways, dns=STATIC.dns,
+                           mac='00-50-56-C0-00-08', dhcp=False, dhcp_dns=False, mac_override='005056C00008')
+    assert _restore_lines(monkeypatch, snapshot, state) == [
+        "try { Disable-NetAdapter -Name '以太网' -Confirm:$false; Reset-NetAdapterAdvancedProperty -Name '以太网' "
+        "-RegistryKeyword 'NetworkAddress' } finally { Enable-NetAdapter -Name '以太网' -Confirm:$false }"]
+    # 当前同样没有设置网络地址时不修改
+    state.mac_override = ''
+    assert _restore_lines(monkeypatch, snapshot, state) == []
+
+
+def test_windows_restore_keeps_previous_mac_override(monkeypatch):
+    snapshot = Snapshot('以太网', 'Windows', addresses=[('192.168.107.49', '255.255.255.0')],
+                        gateways=['192.168.107.1'], dns=['192.168.100.40'], mac='00-50-56-C0-00-01',
+                        dhcp=False, dhcp_dns=False, mac_override='005056C00001')
+    lines = _restore_lines(monkeypatch, snapshot, STATIC)
+    assert len(lines) == 1 and "-DisplayValue '005056C00001'" in lines[0]
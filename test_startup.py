@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动流程测试
+在offscreen平台上创建主窗口，检查配置加载在窗口首次绘制之后开始，且每批加载不长时间阻塞事件循环
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtWidgets import QApplication
+
+import config_loader
+import network_config_tool
+from network_config_tool import NetworkConfigTool
+
+# 每批解析和转换的时间上限为10毫秒，通常的批次另留出更新树形结构的余量，
+# 单个批次另允许垃圾回收等偶发的停顿
+BATCH_LIMIT = 0.015
+BATCH_MAX = 0.05
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    config = [{'department': f'部门{d}',
+               'users': [{'name': f'用户{d}-{u}', 'deviceName': f'PC-{d}-{u}',
+                          'ip': f'10.{d // 256}.{d % 256}.{u + 2}', 'netmask': '255.255.255.0',
+                          'gateway': f'10.{d // 256}.{d % 256}.1', 'dns': '10.0.0.53',
+                          'mac': f'0050{d:04X}{u:04X}'} for u in range(20)]}
+              for d in range(2000)]
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+class _PaintRecorder(QObject):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint and 'paint' not in self.events:
+            self.events.append('paint')
+        return False
+
+
+def test_config_loads_after_first_paint_in_short_batches(app, config_file, monkeypatch):
+    events = []
+    batches = []
+    start_loading = NetworkConfigTool.start_config_loading
+    load_batch = NetworkConfigTool.load_config_batch
+
+    def record_start(self):
+        events.append('start_config_loading')
+        start_loading(self)
+
+    def timed_batch(self):
+        start = time.perf_counter()
+        load_batch(self)
+        batches.append(time.perf_counter() - start)
+
+    monkeypatch.setattr(NetworkConfigTool, 'start_config_loading', record_start)
+    monkeypatch.setattr(NetworkConfigTool, 'load_config_batch', timed_batch)
+    # 网卡监听和系统托盘与本测试无关
+    monkeypatch.setattr(NetworkConfigTool, 'load_network_cards', lambda self: events.append('load_network_cards'))
+    monkeypatch.setattr(NetworkConfigTool, 'init_tray', lambda self: None)
+    monkeypatch.setattr(network_config_tool.QMessageBox, 'warning', lambda *args: pytest.fail(args[2]))
+
+    window = NetworkConfigTool()
+    window.config_file = config_file
+    recorder = _PaintRecorder(events)
+    window.config_group.installEventFilter(recorder)
+    try:
+        # 创建窗口时不读取配置
+        assert events == []
+        assert len(window.profiles) == 0
+
+        window.show()
+        deadline = time.monotonic() + 30
+        while (not window.startup_finished or window._config_iter is not None
+               or 'start_config_loading' not in events):
+            assert time.monotonic() < deadline
+            app.processEvents()
+
+        assert events[:3] == ['paint', 'start_config_loading', 'load_network_cards']
+        assert window.profiles.department_count() == 2000
+        assert len(window.profiles) == 40000
+        assert window.tree_model.rowCount() == 2000
+        # 分多批加载，每批都在时间上限内返回事件循环
+        assert len(batches) > 1
+        timings = [f'{t * 1000:.1f}ms' for t in batches]
+        assert statistics.median(batches) < BATCH_LIMIT, timings
+        assert max(batches) < BATCH_MAX, timings
+        # 预解析缓存在后台线程中写入
+        cache_path = config_loader.cache_path_for(config_file)
+        while not os.path.exists(cache_path):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert config_loader.read_cache(config_file, os.stat(config_file)) is not None
+    finally:
+        window.config_group.removeEventFilter(recorder)
+        window.search_thread.quit()
+        window.search_thread.wait()
+        window.hide()
+        window.deleteLater()
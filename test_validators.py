@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置校验测试
+"""
+
+import validators
+
+
+def test_valid_profile():
+    user = {'ip': '192.168.107.49', 'netmask': '255.255.255.0', 'gateway': '192.168.107.1'}
+    assert validators.validate_profile(user) == []
+
+
+def test_cidr_netmask_and_gateway_outside_subnet():
+    user = {'ip': '10.0.0.5', 'netmask': '24', 'gateway': '10.0.1.1'}
+    assert [field for field, _ in validators.validate_profile(user)] == ['gateway']
+
+
+def test_non_string_values_are_reported():
+    """JSON中的数字、列表等值返回错误而不是抛出TypeError"""
+    user = {'ip': 19216801, 'netmask': 24, 'gateway': ['10.0.0.1']}
+    errors = dict(validators.validate_profile(user))
+    assert set(errors) == {'ip', 'netmask', 'gateway'}
+    assert "应为字符串" in errors['ip']
+    assert "24" in errors['netmask']
+
+
+def test_validate_config_with_non_string_values():
+    config = [{'department': '信息中心', 'users': [{'name': 'a', 'ip': 1, 'netmask': '24', 'gateway': '10.0.0.1'}]}]
+    assert [(d, n, f) for d, n, f, _ in validators.validate_config(config)] == [('信息中心', 'a', 'ip')]
+
+
+def test_missing_fields():
+    errors = dict(validators.validate_profile({}))
+    assert errors == {'ip': "IP地址不能为空", 'netmask': "子网掩码不能为空", 'gateway': "网关不能为空"}
+
+
+def test_parse_address_matches_dotted_decimal_rules():
+    """查表解析接受前导零，其他写法按原来的规则报告错误"""
+    assert validators.parse_address('010.0.0.001') == ((10 << 24) | 1, "")
+    assert validators.parse_address('256.1.1.1')[1] == "IP地址的每个部分应在 0-255 之间，当前值: 256"
+    for text in ('1.2.3', '1.2.3.4 ', '+1.2.3.4', '1.2.3.0004', '١.2.3.4'):
+        assert validators.parse_address(text) == (None, "IP地址格式不正确，应为 xxx.xxx.xxx.xxx")
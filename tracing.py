@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+耗时跟踪
+在加载配置、枚举网卡、应用配置的各步骤和每条外部命令外记录耗时区间（span），
+写入Chrome trace event格式的文件，可在chrome://tracing或Perfetto中按时间线查看。
+
+    with tracing.span("设置IP地址", card=card):
+        ...
+
+未启用时span直接返回共享的空上下文，几乎没有开销。设置环境变量NCMTOOL_TRACE=1时
+写入 ~/.ncmtool/traces/trace.json（NCMTOOL_TRACE也可以是文件路径），文件超过上限后
+轮换为trace.1.json、trace.2.json。应用配置期间总是在内存中记录本次的区间，
+供托盘菜单的"上次应用耗时"查看
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+# 跟踪文件的大小上限（字节）和保留的旧文件数量
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 2
+
+# perf_counter与Unix时间的差值，时间戳使用Unix时间以便对齐多个进程的跟踪文件
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+
+_lock = threading.Lock()
+_writer = None
+# [(线程ID, 区间列表)]，capture期间同一线程中结束的区间
+_collectors = []
+# 写入文件或有capture时为True，span据此决定是否记录
+_enabled = False
+_last_apply = []
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def _update():
+    global _enabled
+    _enabled = _writer is not None or bool(_collectors)
+
+
+class _Span:
+    """一个耗时区间，结束时生成一个完整事件（ph为X）"""
+
+    __slots__ = ('name', 'cat', 'args', 'start')
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = str(exc) or exc_type.__name__
+        _emit({
+            'name': self.name, 'cat': self.cat, 'ph': 'X',
+            'ts': round((_EPOCH_OFFSET + self.start) * 1e6, 1),
+            'dur': round((end - self.start) * 1e6, 1),
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+            'args': self.args,
+        })
+        return False
+
+
+def span(name, cat='ncmtool', **args):
+    """记录with块的耗时，args作为事件参数显示在时间线上"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def _emit(event):
+    with _lock:
+        for tid, events in _collectors:
+            if tid == event['tid']:
+                events.append(event)
+        if _writer is not None:
+            try:
+                _writer.write(event)
+            except OSError as e:
+                # 无法写入时停止写文件，不影响正常功能
+                print(f"写入跟踪文件失败: {str(e)}")
+                _close_writer()
+
+
+class TraceWriter:
+    """追加写入Chrome trace event格式（JSON数组）的文件，超过上限后轮换
+
+    JSON数组格式允许省略结尾的]，每个事件占一行，程序异常退出时已写入的事件仍可读取
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if self.file.tell() == 0:
+            self.file.write('[\n')
+            self.file.write(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                                        'args': {'name': 'ncmtool'}}) + ',\n')
+
+    def write(self, event):
+        if self.file is None:
+            self._open()
+        self.file.write(json.dumps(event, ensure_ascii=False) + ',\n')
+        self.file.flush()
+        if self.file.tell() > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """trace.json -> trace.1.json -> trace.2.json，超出数量的旧文件被覆盖"""
+        self.close()
+        root, ext = os.path.splitext(self.path)
+        for index in range(self.backup_count, 0, -1):
+            source = self.path if index == 1 else f"{root}.{index - 1}{ext}"
+            if os.path.exists(source):
+                os.replace(source, f"{root}.{index}{ext}")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def default_path():
+    """默认的跟踪文件路径"""
+    from snapshots import state_dir
+    return os.path.join(state_dir(), 'traces', 'trace.json')
+
+
+def enable(path=None, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """开始把区间写入跟踪文件"""
+    global _writer
+    path = path or default_path()
+    with _lock:
+        _close_writer()
+        _writer = TraceWriter(path, max_bytes, backup_count)
+        _update()
+    return path
+
+
+def _close_writer():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+    _update()
+
+
+def disable():
+    """停止写入跟踪文件"""
+    with _lock:
+        _close_writer()
+
+
+def trace_path():
+    """正在写入的跟踪文件路径，未启用时为None"""
+    writer = _writer
+    return writer.path if writer is not None else None
+
+
+@contextlib.contextmanager
+def capture():
+    """在内存中记录with块期间当前线程中结束的全部区间，未启用跟踪文件时也记录"""
+    entry = (threading.get_ident(), [])
+    with _lock:
+        _collectors.append(entry)
+        _update()
+    try:
+        yield entry[1]
+    finally:
+        with _lock:
+            _collectors.remove(entry)
+            _update()
+
+
+def set_last_apply(events):
+    """保存最近一次应用配置的区间"""
+    global _last_apply
+    _last_apply = list(events)
+
+
+def last_apply():
+    """最近一次应用配置的区间，按开始时间排序"""
+    return sorted(_last_apply, key=lambda event: (event['ts'], -event['dur']))
+
+
+def format_spans(events):
+    """按嵌套关系缩进显示区间的耗时"""
+    events = sorted(events, key=lambda event: (event['ts'], -event['dur']))
+    lines = []
+    # 尚未结束的外层区间的结束时间
+    stack = []
+    for event in events:
+        while stack and event['ts'] >= stack[-1]:
+            stack.pop()
+        error = f"（失败: {event['args']['error']}）" if 'error' in event.get('args', {}) else ""
+        lines.append(f"{'  ' * len(stack)}{event['name']}: {event['dur'] / 1000:.1f} ms{error}")
+        stack.append(event['ts'] + event['dur'])
+    return '\n'.join(lines)
+
+
+def write_trace(path, events):
+    """把区间写成完整的Chrome trace event文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': list(events), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False, indent=1)
+
+
+# 通过环境变量启用时，进程中的全部区间都写入跟踪文件
+if os.environ.get('NCMTOOL_TRACE'):
+    _path = os.environ['NCMTOOL_TRACE']
+    enable(None if _path in ('1', 'true', 'yes') else _path)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络配置校验模块
+将IPv4地址一次解析为32位整数后完成全部校验，不依赖Qt，界面和批量校验共用。
+地址按查表直接解析，不经过缓存；取值很少的子网掩码缓存在有界LRU中
+"""
+
+import re
+from functools import lru_cache
+
+# 子网掩码解析结果缓存的最大条目数
+CACHE_SIZE = 4096
+
+_IPV4_PATTERN = re.compile(r'(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})', re.ASCII)
+
+# 各字段在提示信息中的名称
+_FIELD_NAMES = {
+    'ip': ("IP地址", "IP地址"),
+    'gateway': ("网关", "网关地址"),
+    'netmask': ("子网掩码", "子网掩码"),
+}
+
+
+# 0-255的各种写法（包括前导零）对应的值，有效地址的每个部分只需一次字典查找
+_OCTETS = {str(value).zfill(width): value for value in range(256) for width in (1, 2, 3)
+           if len(str(value)) <= width}
+
+
+def parse_address(text, field='ip'):
+    """解析点分十进制地址，返回(整数值, 错误信息)，无效时整数值为None
+
+    每条配置的地址各不相同，不使用缓存：上万个不同地址时有界LRU不断淘汰，
+    反而比直接解析更慢
+    """
+    if text:
+        parts = text.split('.')
+        if len(parts) == 4:
+            try:
+                return (_OCTETS[parts[0]] << 24) | (_OCTETS[parts[1]] << 16) | (_OCTETS[parts[2]] << 8) | \
+                    _OCTETS[parts[3]], ""
+            except KeyError:
+                pass
+    return None, _address_error(text, field)
+
+
+def _address_error(text, field):
+    """无效地址的错误信息"""
+    match = _IPV4_PATTERN.fullmatch(text) if text else None
+    short_name, long_name = _FIELD_NAMES[field]
+    if not text or not text.strip():
+        return f"{short_name}不能为空"
+    if not match:
+        if field == 'netmask':
+            return "子网掩码格式不正确，应为 xxx.xxx.xxx.xxx 或 CIDR表示法（如 24）"
+        return f"{long_name}格式不正确，应为 xxx.xxx.xxx.xxx"
+    for octet in match.groups():
+        if int(octet) > 255:
+            return f"{long_name}的每个部分应在 0-255 之间，当前值: {octet}"
+
+
+def _parse_netmask(text):
+    """解析子网掩码（支持CIDR表示法），返回(整数值, 错误信息)"""
+    if text and text.isascii() and text.isdigit():
+        cidr = int(text)
+        if cidr > 32:
+            return None, "CIDR表示法应在 0-32 之间"
+        return cidr_to_mask(cidr), ""
+
+    value, error = parse_address(text, 'netmask')
+    if value is None:
+        return None, error
+
+    # 有效的子网掩码取反后应为连续的低位1
+    host_bits = ~value & 0xFFFFFFFF
+    if host_bits & (host_bits + 1):
+        return None, "子网掩码格式不正确，应为连续的1后面跟着连续的0"
+    return value, ""
+
+
+def _check_gateway(gateway_value, ip_value, mask_value, gateway):
+    """检查网关是否与IP在同一子网内"""
+    if ip_value is None or mask_value is None:
+        # IP或掩码本身无效时由对应字段报告错误
+        return True, ""
+    if (gateway_value & mask_value) != (ip_value & mask_value):
+        return False, (f"网关 {gateway} 不在 {int_to_ip(ip_value & mask_value)}/"
+                       f"{mask_to_cidr(mask_value)} 子网内")
+    return True, ""
+
+
+# 配置中通常只有少数几种子网掩码，缓存几乎总能命中
+parse_netmask = lru_cache(maxsize=CACHE_SIZE)(_parse_netmask)
+
+
+def cidr_to_mask(cidr):
+    """将前缀长度转换为32位掩码"""
+    return (0xFFFFFFFF << (32 - cidr)) & 0xFFFFFFFF
+
+
+def mask_to_cidr(mask):
+    """将32位连续掩码转换为前缀长度"""
+    return bin(mask).count('1')
+
+
+def int_to_ip(value):
+    """将32位整数转换为点分十进制字符串"""
+    return f"{value >> 24 & 0xFF}.{value >> 16 & 0xFF}.{value >> 8 & 0xFF}.{value & 0xFF}"
+
+
+def validate_ip(ip):
+    """验证IPv4地址格式"""
+    value, error = parse_address(ip, 'ip')
+    return value is not None, error
+
+
+def validate_subnet_mask(subnet_mask):
+    """验证子网掩码格式（支持CIDR表示法）"""
+    value, error = parse_netmask(subnet_mask)
+    return value is not None, error
+
+
+def validate_gateway(gateway, ip=None, netmask=None):
+    """验证网关地址格式，给出IP和子网掩码时同时检查网关是否在同一子网内"""
+    gateway_value, error = parse_address(gateway, 'gateway')
+    if gateway_value is None:
+        return False, error
+    if ip is None or netmask is None:
+        return True, ""
+    return _check_gateway(gateway_value, parse_address(ip, 'ip')[0],
+                          parse_netmask(netmask)[0], gateway)
+
+
+def validate_profile(user):
+    """校验单个用户配置，返回[(字段, 错误信息)]
+
+    批量校验时每条记录的子网掩码也不经过LRU缓存，以免挤掉界面中使用的缓存
+    """
+    errors = []
+    ip, ip_value, error = _profile_field(user, 'ip', parse_address)
+    if ip_value is None:
+        errors.append(('ip', error))
+    _, mask_value, error = _profile_field(user, 'netmask', _parse_netmask)
+    if mask_value is None:
+        errors.append(('netmask', error))
+    gateway, gateway_value, error = _profile_field(user, 'gateway', parse_address)
+    if gateway_value is None:
+        errors.append(('gateway', error))
+    else:
+        valid, error = _check_gateway(gateway_value, ip_value, mask_value, gateway)
+        if not valid:
+            errors.append(('gateway', error))
+    return errors
+
+
+def _profile_field(user, field, parse):
+    """取出并解析配置中的地址字段，返回(文本, 整数值, 错误信息)
+
+    配置文件中的值可能是数字等非字符串类型，直接报告错误，不交给正则匹配
+    """
+    value = user.get(field) or ''
+    if not isinstance(value, str):
+        return '', None, f"{_FIELD_NAMES[field][0]}应为字符串，当前值: {value!r}"
+    if field == 'netmask':
+        return (value, *parse(value))
+    return (value, *parse(value, field))
+
+
+def validate_config(config_data):
+    """批量校验整个配置，逐条产出(部门, 用户名, 字段, 错误信息)"""
+    for dept in config_data:
+        department = dept.get('department', '')
+        for user in dept.get('users') or []:
+            for field, error in validate_profile(user):
+                yield department, user.get('name', ''), field, error